@@ -0,0 +1,147 @@
+"""Single-flight coalescing of identical concurrent requests.
+
+When a line trips, several engineers open the same alarm row within
+seconds. Identical requests that arrive while one is in flight wait for
+it and share its result instead of starting their own retrieval and
+generation. Nothing is cached: once a flight finishes, the next request
+starts a new one. Coalescing is per worker process.
+"""
+import asyncio
+import json
+import re
+import threading
+from typing import AsyncIterator, Awaitable, Callable, Iterator
+
+from prometheus_client import Counter
+
+COALESCED = Counter("coalesced_requests_total", "Requests served by another request's in-flight work", ["flight"])
+
+def request_key(query: str, **filters) -> str:
+    """Normalized query plus every parameter that changes the answer."""
+    normalized = re.sub(r"\s+", " ", query or "").strip().lower()
+    return json.dumps({"query": normalized, **filters}, sort_keys=True)
+
+_DONE = object()
+
+async def iterate_closing(iterator: Iterator) -> AsyncIterator:
+    """Iterates a blocking generator on a worker thread and closes it when we stop.
+
+    On cancellation (every subscriber of a stream left) the generator is
+    closed as soon as its current step returns, so e.g. the HTTP response
+    behind an Ollama stream is released instead of generating on.
+    """
+    loop = asyncio.get_running_loop()
+    lock = threading.Lock()
+
+    def step():
+        with lock:
+            return next(iterator, _DONE)
+
+    def close():
+        with lock:
+            iterator.close()
+
+    try:
+        while True:
+            item = await loop.run_in_executor(None, step)
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        # Not awaited: a cancelled producer must not wait for the model's next token
+        loop.run_in_executor(None, close)
+
+class SingleFlight:
+    """Runs one coroutine per key; concurrent callers with the same key share it."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.inflight: dict[str, asyncio.Task] = {}
+        self.coalesced = 0
+
+    async def run(self, key: str, fn: Callable[[], Awaitable]) -> tuple[object, bool]:
+        """Returns (result, shared); shared is True when another caller started the work."""
+        task = self.inflight.get(key)
+        shared = task is not None
+        if shared:
+            self.coalesced += 1
+            COALESCED.labels(flight=self.name).inc()
+        else:
+            # A task of its own, so a caller that disconnects does not cancel it for the rest
+            task = asyncio.ensure_future(fn())
+            self.inflight[key] = task
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        return await asyncio.shield(task), shared
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self.inflight), "coalesced": self.coalesced}
+
+class _Broadcast:
+    def __init__(self):
+        self.events: list[str] = []
+        self.done = False
+        self.subscribers = 0
+        self.changed = asyncio.Condition()
+        self.task: asyncio.Task = None
+
+class StreamFlight:
+    """Single-flight for streamed responses.
+
+    The first request starts the producer; requests that join later get
+    every event produced so far and then follow live. The producer is
+    cancelled once every subscriber has gone.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.inflight: dict[str, _Broadcast] = {}
+        self.coalesced = 0
+
+    def _forget(self, key: str, broadcast: _Broadcast):
+        if self.inflight.get(key) is broadcast:
+            del self.inflight[key]
+
+    async def _produce(self, key: str, broadcast: _Broadcast, source: Callable[[], AsyncIterator[str]]):
+        try:
+            async for event in source():
+                async with broadcast.changed:
+                    broadcast.events.append(event)
+                    broadcast.changed.notify_all()
+        finally:
+            self._forget(key, broadcast)
+            async with broadcast.changed:
+                broadcast.done = True
+                broadcast.changed.notify_all()
+
+    async def subscribe(self, key: str, source: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        broadcast = self.inflight.get(key)
+        if broadcast is None:
+            broadcast = _Broadcast()
+            self.inflight[key] = broadcast
+            broadcast.task = asyncio.ensure_future(self._produce(key, broadcast, source))
+        else:
+            self.coalesced += 1
+            COALESCED.labels(flight=self.name).inc()
+
+        broadcast.subscribers += 1
+        sent = 0
+        try:
+            while True:
+                async with broadcast.changed:
+                    await broadcast.changed.wait_for(lambda: broadcast.done or len(broadcast.events) > sent)
+                    pending = broadcast.events[sent:]
+                    finished = broadcast.done
+                for event in pending:
+                    yield event
+                sent += len(pending)
+                if finished and sent == len(broadcast.events):
+                    return
+        finally:
+            broadcast.subscribers -= 1
+            if broadcast.subscribers == 0 and not broadcast.done:
+                # Later requests must start afresh rather than join a cancelled stream
+                self._forget(key, broadcast)
+                broadcast.task.cancel()
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self.inflight), "coalesced": self.coalesced}
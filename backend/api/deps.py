@@ -0,0 +1,147 @@
+import os
+import threading
+import time
+
+from backend.api.startup import report
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+CHROMA_DIR = os.getenv("PLC_CHROMA_DIR", "./chroma_db")
+# When set, Chroma and the keyword/code indexes live in rag.index_service and
+# this process only holds a client, so several API workers can share them
+INDEX_SERVICE = os.getenv("PLC_INDEX_SERVICE")
+MANUALS_PATH = "data/auto_faults/knowledge_base.json"
+HISTORY_PATH = "data/query_history.json"
+# Streaming ingest (followed files, live events) writes every few seconds,
+# but rebuilding the keyword index reads the whole store, so it is refreshed
+# at most this often. New rows are reachable through the vector leg meanwhile.
+REINDEX_INTERVAL_S = float(os.getenv("PLC_REINDEX_INTERVAL_S", "30"))
+LIVE_QUEUE_SIZE = int(os.getenv("PLC_LIVE_QUEUE_SIZE", "10000"))
+# Retention sweeps run in whichever process owns the store
+RETENTION_SWEEP_S = float(os.getenv("PLC_RETENTION_SWEEP_S", "3600"))
+
+_cache = {}
+_built = {}
+_lock = threading.Lock()
+_trailing_invalidation = None
+
+def _load(key: str, factory):
+    """Builds a heavy dependency once, on first use, and records its cost."""
+    value = _cache.get(key)
+    if value is not None:
+        return value
+    with _lock:
+        if key not in _cache:
+            with report.stage(key, phase="lazy"):
+                _cache[key] = factory()
+                _built[key] = time.monotonic()
+        return _cache[key]
+
+def get_embeddings():
+    def factory():
+        from langchain_huggingface import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+    return _load("embeddings", factory)
+
+def get_index_client():
+    def factory():
+        from rag.index_service import IndexClient
+        return IndexClient(INDEX_SERVICE)
+    return _load("index_client", factory)
+
+def get_indexer():
+    if INDEX_SERVICE:
+        return get_index_client()
+
+    def factory():
+        from rag.embed import COLLECTION_NAME, Indexer
+        from rag.lifecycle import collection_metadata, load_config
+        return Indexer(persist_dir=CHROMA_DIR, embeddings=get_embeddings(),
+                       collection_metadata=collection_metadata(load_config(), COLLECTION_NAME))
+    return _load("indexer", factory)
+
+def get_retriever():
+    if INDEX_SERVICE:
+        return get_index_client()
+
+    def factory():
+        from rag.retrieve import Retriever
+        return Retriever(persist_dir=CHROMA_DIR, embeddings=get_embeddings())
+    return _load("retriever", factory)
+
+def invalidate_retriever(max_staleness_s: float = 0):
+    """Drops the cached retriever so the keyword index is rebuilt after ingest.
+
+    With max_staleness_s, a retriever built more recently than that is kept,
+    and dropped once it is that old, so the last write before a quiet
+    spell still becomes searchable.
+    """
+    global _trailing_invalidation
+    if INDEX_SERVICE:
+        # The service drops its own retriever after writes; see ingest_stream
+        return
+    with _lock:
+        age = time.monotonic() - _built.get("retriever", 0)
+        if age >= max_staleness_s:
+            _cache.pop("retriever", None)
+        elif _trailing_invalidation is None or not _trailing_invalidation.is_alive():
+            _trailing_invalidation = threading.Timer(max_staleness_s - age, invalidate_retriever)
+            _trailing_invalidation.daemon = True
+            _trailing_invalidation.start()
+
+def ingest_stream(texts: list[str], metadata: dict):
+    """Indexes rows from a followed file or live feed."""
+    if INDEX_SERVICE:
+        # The service applies the same staleness limit to its own retriever
+        get_index_client().ingest_logs(texts, metadata=metadata, max_staleness_s=REINDEX_INTERVAL_S)
+        return
+    get_indexer().ingest_logs(texts, metadata=metadata)
+    invalidate_retriever(max_staleness_s=REINDEX_INTERVAL_S)
+
+def get_live_ingestor():
+    def factory():
+        from ingest.live import LiveIngestor
+        ingestor = LiveIngestor(lambda texts: ingest_stream(texts, {"file": "live"}), max_queue=LIVE_QUEUE_SIZE)
+        ingestor.start()
+        return ingestor
+    return _load("live_ingestor", factory)
+
+def get_index_maintenance():
+    if INDEX_SERVICE:
+        from rag.index_service import MaintenanceClient
+        return MaintenanceClient(get_index_client())
+
+    def factory():
+        from rag.lifecycle import IndexMaintenance
+        return IndexMaintenance(get_indexer(), code_index=get_code_index(), on_change=invalidate_retriever)
+    return _load("index_maintenance", factory)
+
+def get_hub():
+    def factory():
+        from ingest.hub import SummaryHub
+        return SummaryHub()
+    return _load("hub", factory)
+
+def get_kb_ingestor():
+    def factory():
+        from ingest.parse_kb import KnowledgeBaseIngestor
+        return KnowledgeBaseIngestor()
+    return _load("kb_ingestor", factory)
+
+def loaded() -> list[str]:
+    return sorted(_cache)
+
+def get_code_index():
+    if INDEX_SERVICE:
+        from rag.index_service import CodeIndexClient
+        return CodeIndexClient(get_index_client())
+
+    def factory():
+        from rag.codes import CodeIndex
+        index = CodeIndex()
+        if not index.load():
+            index.add_history_file(HISTORY_PATH)
+        # Manual entries are de-duplicated, so re-reading picks up edits cheaply
+        index.add_manuals(MANUALS_PATH)
+        index.save()
+        return index
+    return _load("code_index", factory)
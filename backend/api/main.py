@@ -1,25 +1,101 @@
 import sys
 import os
+import asyncio
 import shutil
 import json
-import pandas as pd
+import threading
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime
 from typing import List, Optional
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from backend.api.startup import report
 
-from ingest.parse_logs import LogParser
-from ingest.textualize import Textualizer
-from ingest.parse_kb import KnowledgeBaseIngestor
-from rag.embed import Indexer
-from rag.retrieve import Retriever
-from rag.generate import Generator
+# Only light modules are imported here. pandas, the parsers, Chroma and the
+# embedding model are loaded by backend.api.deps on first use, so health and
+# history are served as soon as the process is up.
+with report.stage("fastapi"):
+    from fastapi import FastAPI, File, UploadFile, HTTPException, Request, WebSocket, WebSocketDisconnect
+    from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.responses import JSONResponse, StreamingResponse
+    from starlette.concurrency import run_in_threadpool
+    from pydantic import BaseModel
 
-app = FastAPI(title="PLC Fault Explainer API")
+with report.stage("prometheus_client"):
+    from prometheus_client import make_asgi_app
+
+with report.stage("rag"):
+    from rag.generate import Generator
+    from rag.context import ContextAssembler
+    from rag.schema import StructuredParser, parse_stats
+    from rag.session import get_session, all_sessions
+    from rag.router import ModelRouter
+    from rag.lifecycle import check_snapshot_name
+
+from backend.api import deps
+from backend.api import profiling
+from backend.api.coalesce import SingleFlight, StreamFlight, iterate_closing, request_key
+from backend.api.profiling import stage
+
+DEFAULT_MODEL = os.getenv("PLC_MODEL", "mistral")
+CANDIDATE_POOL = 10
+# Ollama serves OLLAMA_NUM_PARALLEL requests per model at once; anything
+# beyond that only queues inside Ollama, so queue here where it is visible.
+# Tune with benchmarks/loadgen.py.
+MAX_CONCURRENT_GENERATIONS = int(os.getenv("PLC_MAX_CONCURRENT_GENERATIONS", "2"))
+generation_slots = asyncio.Semaphore(MAX_CONCURRENT_GENERATIONS)
+generation_load = {"active": 0, "waiting": 0}
+followers = {}
+# Identical concurrent queries share one retrieval and generation
+query_flights = SingleFlight("query")
+retrieval_flights = SingleFlight("retrieval")
+stream_flights = StreamFlight("query_stream")
+# Start of the final /api/query/stream event
+RESULT_EVENT = '{"type": "result"'
+# Easy queries go to PLC_SMALL_MODEL when it is set
+router = ModelRouter(large_model=DEFAULT_MODEL)
+
+@asynccontextmanager
+async def generation_slot():
+    """Holds one of the generation slots for the duration of an LLM call."""
+    generation_load["waiting"] += 1
+    try:
+        with stage("wait_for_slot"):
+            await generation_slots.acquire()
+    finally:
+        generation_load["waiting"] -= 1
+    generation_load["active"] += 1
+    try:
+        yield
+    finally:
+        generation_load["active"] -= 1
+        generation_slots.release()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the model in the background so the API is reachable immediately
+    threading.Thread(target=lambda: get_session(DEFAULT_MODEL).warm_up(), daemon=True).start()
+    if router.enabled:
+        threading.Thread(target=lambda: get_session(router.small_model).warm_up(), daemon=True).start()
+    if os.getenv("PLC_PRELOAD_INDEX") == "1":
+        threading.Thread(target=deps.get_retriever, daemon=True).start()
+    if not deps.INDEX_SERVICE and deps.RETENTION_SWEEP_S > 0:
+        from rag.lifecycle import load_config
+        if load_config().get("retention"):
+            # The store is opened by the first sweep, not at startup
+            threading.Thread(target=lambda: deps.get_index_maintenance().start_sweeper(deps.RETENTION_SWEEP_S),
+                             daemon=True).start()
+    report.mark_ready()
+    yield
+    for follower in followers.values():
+        follower.stop()
+    if "live_ingestor" in deps.loaded():
+        deps.get_live_ingestor().stop()
+
+app = FastAPI(title="PLC Fault Explainer API", lifespan=lifespan)
+app.mount("/metrics", make_asgi_app())
 
 # CORS middleware for Next.js frontend
 app.add_middleware(
@@ -30,15 +106,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Profiles requests sent with X-Profile: 1 or ?profile=1
+app.add_middleware(profiling.ProfilingMiddleware)
+
 # Pydantic models
 class QueryRequest(BaseModel):
     query: str
     top_k: int = 3
+    max_context_tokens: Optional[int] = None
 
 class FeedbackRequest(BaseModel):
     query: str
     response: str
     rating: str
+    route: Optional[str] = None
+    model: Optional[str] = None
 
 class HistorySaveRequest(BaseModel):
     filename: str
@@ -48,6 +130,15 @@ class HistorySaveRequest(BaseModel):
 class KBProcessRequest(BaseModel):
     path: str = "data/knowledge_base"
 
+class IndexDeleteRequest(BaseModel):
+    source: Optional[str] = None
+    file: Optional[str] = None
+    content_type: Optional[str] = None
+    older_than_days: Optional[float] = None
+
+class IndexRebuildRequest(BaseModel):
+    hnsw: Optional[dict] = None
+
 @app.post("/api/upload")
 async def upload_file(file: UploadFile = File(...)):
     """Upload and save log file"""
@@ -82,71 +173,262 @@ async def upload_file(file: UploadFile = File(...)):
 async def process_logs(filename: str):
     """Process and index logs"""
     try:
+        from ingest.parse_logs import LogParser
+        from ingest.textualize import Textualizer
+
+        def index_file() -> int:
+            parser = LogParser(f"data/{filename}")
+            textualizer = Textualizer()
+
+            all_texts = []
+            chunks = parser.parse()
+            while True:
+                with stage("parse"):
+                    chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                with stage("textualize"):
+                    all_texts.extend(textualizer.process_chunk(chunk))
+
+            with stage("load_indexer"):
+                indexer = deps.get_indexer()
+            with stage("index"):
+                indexer.ingest_logs(all_texts, metadata={"file": filename})
+            deps.invalidate_retriever()
+            return len(all_texts)
+
+        count = await run_in_threadpool(index_file)
+        return {"message": f"Processed {count} log entries", "count": count}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/follow/start")
+async def start_follow(filename: str, poll_interval: float = 1.0, batch_rows: int = 500):
+    """Tail a growing log file and index rows as they are appended"""
+    try:
+        from ingest.follow import LogFollower
+
         file_path = f"data/{filename}"
-        parser = LogParser(file_path)
-        textualizer = Textualizer()
-        
-        all_texts = []
-        for chunk in parser.parse():
-            all_texts.extend(textualizer.process_chunk(chunk))
-        
-        indexer = Indexer()
-        indexer.ingest_logs(all_texts)
-        
-        return {"message": f"Processed {len(all_texts)} log entries", "count": len(all_texts)}
+        if not os.path.exists(file_path):
+            raise HTTPException(status_code=404, detail="File not found")
+        follower = followers.get(filename)
+        if follower is None:
+            follower = LogFollower(file_path, sink=lambda texts: deps.ingest_stream(texts, {"file": filename}),
+                                   poll_interval=poll_interval, batch_rows=batch_rows)
+        # False when another worker already follows it; its status is returned instead
+        if follower.start():
+            followers[filename] = follower
+        return follower.status()
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/follow/stop")
+async def stop_follow(filename: str):
+    """Stop following a file; its offset is kept for the next start"""
+    from ingest.follow import LogFollower
+
+    follower = followers.pop(filename, None)
+    if follower is not None:
+        await run_in_threadpool(follower.stop)
+        return follower.status()
+    # Followed by another worker, which sees the request at its next poll
+    follower = LogFollower(f"data/{filename}", sink=None)
+    if not follower.followed_elsewhere():
+        raise HTTPException(status_code=404, detail=f"{filename} is not being followed")
+    follower.request_stop()
+    return {**follower.status(), "stop_requested": True}
+
+@app.get("/api/follow/status")
+async def follow_status():
+    """Offsets, rows ingested and ingest lag of each followed file, in any worker"""
+    from ingest.follow import followed_files
+    return {"followers": await run_in_threadpool(
+        lambda: [followers[name].status() if name in followers else f.status() for name, f in followed_files()])}
+
+@app.post("/api/ingest/events")
+async def ingest_events(request: Request):
+    """Accept alarm events as NDJSON; answers 429 when the live queue is full.
+
+    The body is parsed and queued as it arrives, so a large upload never
+    sits in memory. Once the queue is full the rest of the body is left
+    unread; "truncated" tells the client to resend from the first event
+    that was not accepted.
+    """
+    from ingest.live import MAX_EVENT_BYTES, parse_ndjson
+
+    ingestor = deps.get_live_ingestor()
+    result = {"accepted": 0, "dropped": 0, "invalid": 0, "truncated": False}
+    if ingestor.events.full():
+        result.update(truncated=True, queue_depth=ingestor.events.qsize())
+        return JSONResponse(result, status_code=429, headers={"Retry-After": "1"})
+
+    def offer(lines: list[bytes]) -> bool:
+        events, invalid = parse_ndjson(l.decode("utf-8", errors="replace") for l in lines)
+        ingestor.count_invalid(invalid)
+        accepted, dropped = ingestor.offer(events)
+        result["accepted"] += accepted
+        result["dropped"] += dropped
+        result["invalid"] += invalid
+        return not dropped
+
+    buffer, oversized = b"", False
+    async for chunk in request.stream():
+        *lines, buffer = (buffer + chunk).split(b"\n")
+        if oversized and lines:
+            # The rest of an oversized line
+            lines, oversized = lines[1:], False
+        if len(buffer) > MAX_EVENT_BYTES:
+            ingestor.count_invalid(1)
+            result["invalid"] += 1
+            buffer, oversized = b"", True
+        if not offer(lines):
+            result["truncated"] = True
+            break
+    else:
+        if not oversized and not offer([buffer]):
+            result["truncated"] = True
+
+    result["queue_depth"] = ingestor.events.qsize()
+    if result["dropped"] or result["truncated"]:
+        # Events from the first dropped one onwards were not queued; resend them
+        return JSONResponse(result, status_code=429, headers={"Retry-After": "1"})
+    return result
+
+@app.websocket("/api/ingest/ws")
+async def ingest_websocket(websocket: WebSocket):
+    """Alarm events as NDJSON text frames; each frame is acknowledged.
+
+    A full queue holds the frame for up to PLC_LIVE_WS_WAIT_S before
+    dropping, and since the next frame is not read meanwhile the client
+    is slowed down by TCP flow control.
+    """
+    from ingest.live import parse_ndjson
+
+    ingestor = deps.get_live_ingestor()
+    wait_s = float(os.getenv("PLC_LIVE_WS_WAIT_S", "5"))
+    await websocket.accept()
+    try:
+        while True:
+            events, invalid = parse_ndjson((await websocket.receive_text()).splitlines())
+            ingestor.count_invalid(invalid)
+            accepted, dropped = await run_in_threadpool(ingestor.offer, events, wait_s)
+            await websocket.send_json({"accepted": accepted, "dropped": dropped, "invalid": invalid,
+                                       "queue_depth": ingestor.events.qsize()})
+    except WebSocketDisconnect:
+        pass
+
+@app.get("/api/ingest/stats")
+async def live_ingest_stats():
+    """Live queue depth, drop counts and the last micro-batch"""
+    if "live_ingestor" not in deps.loaded():
+        return {"running": False}
+    return deps.get_live_ingestor().stats()
+
+def retrieve_context(request: QueryRequest):
+    """Retrieves and assembles the evidence for a query.
+
+    Codes with a manual entry are answered from the code index and skip
+    semantic search; their manual entries are pinned into the context.
+    KB mentions and prior diagnoses of a code are always candidates.
+    """
+    assembler = ContextAssembler()
+    with stage("code_lookup"):
+        hits = deps.get_code_index().lookup(request.query)
+    if hits and hits.exact:
+        with stage("assemble"):
+            context = assembler.assemble(request.query, hits.related, max_tokens=request.max_context_tokens,
+                                         pinned=hits.manual)
+        return context, {"mode": "code_index", "codes": hits.codes, "tags": hits.tags}
+
+    with stage("retrieve"):
+        retriever = deps.get_retriever()
+        # Over-fetch; the assembler dedupes and trims to the token budget
+        results = retriever.search(request.query, k=max(request.top_k, CANDIDATE_POOL))
+    related = hits.related if hits else []
+    with stage("assemble"):
+        context = assembler.assemble(request.query, related + [doc for doc, _ in results],
+                                     max_tokens=request.max_context_tokens)
+    return context, {"mode": "hybrid", "codes": hits.codes if hits else [], "tags": hits.tags if hits else [],
+                     # Fused scores of the top candidates, for routing
+                     "scores": [round(score, 6) for _, score in results[:3]]}
+
+def query_key(request: QueryRequest) -> str:
+    return request_key(request.query, top_k=request.top_k, max_context_tokens=request.max_context_tokens,
+                       model=DEFAULT_MODEL)
+
+async def answer_query(request: QueryRequest) -> dict:
+    context, retrieval = await run_in_threadpool(retrieve_context, request)
+    decision = router.decide(retrieval, context.tokens_used)
+    generator = Generator(model=decision.model)
+    async with generation_slot():
+        with stage("generate"):
+            t0 = time.perf_counter()
+            structured = await run_in_threadpool(generator.generate_structured, request.query, context.docs)
+            router.record(decision, time.perf_counter() - t0)
+    return {
+        "query": request.query,
+        "structured": structured,
+        "evidence": context.docs,
+        "context": context.stats(),
+        "retrieval": retrieval,
+        "route": decision.as_dict()
+    }
+
 @app.post("/api/query")
 async def query_system(request: QueryRequest):
     """Query the RAG system"""
     try:
-        retriever = Retriever()
-        results = retriever.query(request.query, k=request.top_k)
-        context_docs = [r.page_content for r in results]
-        
-        generator = Generator(model="mistral")
-        explanation = generator.generate_explanation(request.query, context_docs)
-        
-        clean_explanation = explanation.strip()
-        if clean_explanation.startswith("```"):
-            clean_explanation = clean_explanation.split("\n", 1)[-1].rsplit("\n", 1)[0].replace("json", "").strip()
-            
-        try:
-            parsed = json.loads(clean_explanation)
-            return {
-                "query": request.query,
-                "structured": parsed,
-                "evidence": context_docs
-            }
-        except:
-            import re
-            match = re.search(r'\{.*\}', explanation, re.DOTALL)
-            if match:
-                try:
-                    parsed = json.loads(match.group(0))
-                    return {
-                        "query": request.query,
-                        "structured": parsed,
-                        "evidence": context_docs
-                    }
-                except:
-                    pass
-            
-            return {
-                "query": request.query,
-                "structured": {
-                    "summary": "AI returned non-structured text",
-                    "evidence": "No valid JSON block found in the response.",
-                    "root_cause": explanation,
-                    "actions": "Please review raw output.",
-                    "confidence": "Low"
-                },
-                "evidence": context_docs
-            }
+        result, shared = await query_flights.run(query_key(request), lambda: answer_query(request))
+        # A shared result echoes the query as this caller worded it
+        return {**result, "query": request.query, "coalesced": shared}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/query/stream")
+async def query_stream(request: QueryRequest):
+    """Query the RAG system, streaming tokens as NDJSON before the final result"""
+    key = query_key(request)
+    try:
+        (context, retrieval), _ = await retrieval_flights.run(
+            key, lambda: run_in_threadpool(retrieve_context, request))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    async def events():
+        decision = router.decide(retrieval, context.tokens_used)
+        generator = Generator(model=decision.model)
+        parser = StructuredParser()
+        try:
+            async with generation_slot():
+                with stage("generate"):
+                    t0 = time.perf_counter()
+                    chunks = generator.stream_structured(request.query, context.docs, parser)
+                    async for chunk in iterate_closing(chunks):
+                        yield json.dumps({"type": "token", "content": chunk}) + "\n"
+                    router.record(decision, time.perf_counter() - t0)
+        except Exception as e:
+            yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+            return
+        # Without the query: requests joining this stream may have worded it differently
+        yield json.dumps({
+            "type": "result",
+            "structured": parser.result(),
+            "evidence": context.docs,
+            "context": context.stats(),
+            "retrieval": retrieval,
+            "route": decision.as_dict()
+        }) + "\n"
+
+    async def own_events():
+        async for line in stream_flights.subscribe(key, events):
+            if line.startswith(RESULT_EVENT):
+                line = json.dumps({"type": "result", "query": request.query, **json.loads(line)}) + "\n"
+            yield line
+
+    return StreamingResponse(own_events(), media_type="application/x-ndjson")
+
 @app.post("/api/history/save")
 async def save_history(request: HistorySaveRequest):
     """Save query history"""
@@ -168,6 +450,10 @@ async def save_history(request: HistorySaveRequest):
         
         with open(history_file, "w") as f:
             json.dump(data, f, indent=2)
+
+        code_index = deps.get_code_index()
+        if code_index.add_history(entry):
+            code_index.save()
         
         return {"message": "History saved successfully"}
     except Exception as e:
@@ -232,6 +518,7 @@ async def get_faults(filename: str):
         if not os.path.exists(file_path):
             raise HTTPException(status_code=404, detail="File not found")
         
+        import pandas as pd
         df = pd.read_csv(file_path)
         cols = [c for c in df.columns if any(x in c.lower() for x in ["alarm", "fault"])]
         
@@ -252,6 +539,10 @@ async def submit_feedback(request: FeedbackRequest):
             "response": request.response,
             "rating": request.rating
         }
+        if request.route:
+            entry["route"] = request.route
+        if request.model:
+            entry["model"] = request.model
         
         data = []
         if os.path.exists(feedback_file):
@@ -335,16 +626,232 @@ async def process_kb(request: KBProcessRequest):
         if not os.path.exists(kb_dir):
             raise HTTPException(status_code=404, detail=f"Path {kb_dir} not found")
             
-        ingestor = KnowledgeBaseIngestor()
-        docs = ingestor.process_directory(kb_dir)
-        
-        indexer = Indexer()
-        indexer.ingest_documents(docs)
-        
-        return {"message": f"Indexed {len(docs)} segments", "count": len(docs)}
+        def index_directory() -> int:
+            from ingest.parse_kb import batched
+
+            ingestor = deps.get_kb_ingestor()
+            with stage("load_indexer"):
+                indexer = deps.get_indexer()
+                code_index = deps.get_code_index()
+            batches = batched(ingestor.process_directory(kb_dir))
+            count = 0
+            while True:
+                with stage("parse_kb"):
+                    docs = next(batches, None)
+                if docs is None:
+                    break
+                with stage("index"):
+                    indexer.ingest_documents(docs)
+                with stage("code_index"):
+                    code_index.add_documents(docs)
+                count += len(docs)
+            deps.invalidate_retriever()
+            with stage("code_index"):
+                code_index.save()
+            return count
+
+        count = await run_in_threadpool(index_directory)
+        return {"message": f"Indexed {count} segments", "count": count}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/generation/stats")
+async def generation_stats():
+    """Prompt-eval vs generation timings per resident model"""
+    return {
+        "sessions": [s.stats() for s in all_sessions()],
+        "parsing": parse_stats(),
+        "slots": {"max": MAX_CONCURRENT_GENERATIONS, **generation_load},
+        "coalescing": {f.name: f.stats() for f in (query_flights, retrieval_flights, stream_flights)},
+    }
+
+@app.get("/api/routing/stats")
+async def routing_stats():
+    """Model per route, per-route generation latency and feedback ratings"""
+    try:
+        return await run_in_threadpool(router.stats)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/retrieval/stats")
+async def retrieval_stats():
+    """Per-leg timings of the most recent hybrid retrieval"""
+    if not deps.INDEX_SERVICE and "retriever" not in deps.loaded():
+        return {"loaded": False}
+    return {"loaded": True, **deps.get_retriever().stats()}
+
+@app.get("/api/codes/stats")
+async def code_index_stats():
+    """Size of the exact fault-code index"""
+    return deps.get_code_index().stats()
+
+@app.get("/api/admin/index/stats")
+async def index_stats():
+    """Document counts by source, age range, disk size and the last maintenance runs"""
+    try:
+        return await run_in_threadpool(deps.get_index_maintenance().stats)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/admin/index/sweep")
+async def index_sweep():
+    """Apply the retention rules now"""
+    try:
+        return await run_in_threadpool(deps.get_index_maintenance().sweep)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/admin/index/delete")
+async def index_delete(request: IndexDeleteRequest):
+    """Delete documents by source, file, content type and/or age"""
+    try:
+        conditions = request.model_dump(exclude_none=True)
+        if not conditions:
+            raise HTTPException(status_code=400, detail="Give at least one of source, file, content_type, older_than_days")
+        return await run_in_threadpool(lambda: deps.get_index_maintenance().delete(**conditions))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/admin/index/rebuild")
+async def index_rebuild(request: IndexRebuildRequest):
+    """Rebuild the HNSW index, optionally with new parameters"""
+    try:
+        return await run_in_threadpool(lambda: deps.get_index_maintenance().rebuild(hnsw=request.hnsw))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/admin/index/snapshot")
+async def index_snapshot(name: Optional[str] = None):
+    """Snapshot the vector store together with the code index and manifests"""
+    try:
+        if name is not None:
+            check_snapshot_name(name)
+        return await run_in_threadpool(lambda: deps.get_index_maintenance().snapshot(name=name))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/admin/index/snapshots")
+async def index_snapshots():
+    """Available snapshots"""
+    try:
+        return {"snapshots": await run_in_threadpool(deps.get_index_maintenance().snapshots)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/admin/index/restore")
+async def index_restore(name: str):
+    """Restore a snapshot; the current store is kept next to it"""
+    try:
+        check_snapshot_name(name)
+        return await run_in_threadpool(lambda: deps.get_index_maintenance().restore(name=name))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def uploaded_logs() -> list[str]:
+    metadata_file = "data/file_metadata.json"
+    if not os.path.exists(metadata_file):
+        return []
+    with open(metadata_file, "r") as f:
+        metadata = json.load(f)
+    return [f"data/{m['filename']}" for m in metadata
+            if m["filename"].lower().endswith((".csv", ".json")) and os.path.exists(f"data/{m['filename']}")]
+
+@app.get("/api/summary/export")
+async def export_summary(site: Optional[str] = None):
+    """Mergeable summaries of the uploaded logs, for the cross-site hub"""
+    try:
+        from ingest.summary import SITE_ID, export_site
+        return await run_in_threadpool(export_site, uploaded_logs(), site or SITE_ID)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def hub_query(method, *args, **kwargs):
+    """Runs a hub query after picking up exports other workers imported"""
+    def run():
+        hub = deps.get_hub()
+        hub.refresh()
+        return getattr(hub, method)(*args, **kwargs)
+    try:
+        return await run_in_threadpool(run)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/hub/import")
+async def hub_import(request: Request):
+    """Merge a site export into the hub"""
+    try:
+        export = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON site export")
+    try:
+        return await run_in_threadpool(lambda: deps.get_hub().import_export(export))
+    except (ValueError, KeyError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/hub/sites")
+async def hub_sites():
+    return {"sites": await hub_query("site_list"), "totals": await hub_query("stats")}
+
+@app.get("/api/hub/alarms")
+async def hub_top_alarms(n: int = 10, site: Optional[str] = None):
+    return await hub_query("top_alarms", n=n, site=site)
+
+@app.get("/api/hub/alarms/{alarm}/trend")
+async def hub_alarm_trend(alarm: str, site: Optional[str] = None, days: Optional[int] = None):
+    return await hub_query("alarm_trend", alarm, site=site, days=days)
+
+@app.get("/api/hub/alarms/{alarm}/cooccurring")
+async def hub_cooccurring(alarm: str, n: int = 10, site: Optional[str] = None):
+    return await hub_query("cooccurring", alarm, n=n, site=site)
+
+@app.get("/api/hub/rising")
+async def hub_rising(days: int = 7, n: int = 10, site: Optional[str] = None):
+    return await hub_query("rising", days=days, n=n, site=site)
+
+@app.get("/api/hub/hotspots")
+async def hub_hotspots(n: int = 10, site: Optional[str] = None):
+    return await hub_query("hotspots", n=n, site=site)
+
+@app.get("/api/hub/sites/{site}/machines/{machine}")
+async def hub_machine_histogram(site: str, machine: str, bucket_s: int = 86400):
+    return await hub_query("machine_histogram", site, machine, bucket_s=bucket_s)
+
+@app.get("/api/profiles")
+async def profile_summary(limit: int = 20, path: Optional[str] = None):
+    """Slowest profiled requests with their dominant stages"""
+    try:
+        return {"profiles": await run_in_threadpool(profiling.summary, limit, path)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/profiles/{profile_id}")
+async def profile_detail(profile_id: str):
+    """Full capture of one profiled request"""
+    capture = await run_in_threadpool(profiling.load, profile_id)
+    if capture is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return capture
+
+@app.get("/api/health")
+async def health():
+    """Liveness check; does not touch the index or the model"""
+    return {"status": "ok", "ready_s": report.ready_s}
+
+@app.get("/api/startup")
+async def startup_report():
+    """Startup time and import breakdown, including lazily loaded dependencies"""
+    return {**report.as_dict(), "loaded": deps.loaded()}
+
 @app.get("/")
 async def root():
     return {"message": "PLC Fault Explainer API v3"}
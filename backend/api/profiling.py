@@ -0,0 +1,309 @@
+"""Opt-in per-request profiling.
+
+Send `X-Profile: 1` (or `?profile=1`) with any request to capture:
+
+- a sampling CPU profile (Python stacks of every busy thread, so work the
+  request hands to the thread pool is included, as is any concurrent
+  request's work)
+- peak traced memory and the top allocation sites, via tracemalloc (the
+  peak is only reported for one capture at a time, since tracemalloc has
+  a single peak counter)
+- the time spent in each named stage (see `stage`)
+
+Captures are written to data/profiles as JSON, next to a .folded file of
+collapsed stacks that flamegraph tools read. Profiling adds overhead,
+mostly from tracemalloc, so the timings are only comparable with each
+other. PLC_PROFILE_SAMPLE_RATE (0 to 1) profiles that share of requests
+without the flag; other requests pass through `ProfilingMiddleware`
+untouched.
+"""
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Optional
+from urllib.parse import parse_qs
+
+try:
+    import resource
+except ImportError:
+    # POSIX only; captures on Windows go without the process RSS
+    resource = None
+
+PROFILE_DIR = os.getenv("PLC_PROFILE_DIR", "data/profiles")
+PROFILE_KEEP = int(os.getenv("PLC_PROFILE_KEEP", "200"))
+SAMPLE_INTERVAL_S = float(os.getenv("PLC_PROFILE_INTERVAL_MS", "5")) / 1000
+SAMPLE_RATE = float(os.getenv("PLC_PROFILE_SAMPLE_RATE", "0"))
+TOP_N = 15
+
+# Leaf frames of threads that are blocked rather than working
+IDLE_FRAMES = {("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"), ("selectors.py", "select"),
+               ("queue.py", "get"), ("thread.py", "_worker")}
+
+_current: ContextVar[Optional["RequestProfile"]] = ContextVar("request_profile", default=None)
+_tracemalloc_users = 0
+# The capture whose peak tracemalloc is tracking; reset_peak() would clobber anyone else's
+_peak_owner: Optional["RequestProfile"] = None
+_tracemalloc_lock = threading.Lock()
+
+def requested(headers, query_params) -> bool:
+    flag = headers.get("x-profile") or query_params.get("profile")
+    return flag is not None and flag.lower() not in ("0", "false", "no", "")
+
+@contextmanager
+def stage(name: str):
+    """Times a block as a named stage of the current profiled request; free otherwise."""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_stage(name, time.perf_counter() - t0)
+
+@contextmanager
+def active(profile: "RequestProfile"):
+    """Makes `profile` the target of `stage` for code run from this context."""
+    token = _current.set(profile)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+def _frame_key(code) -> str:
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+class SamplingProfiler:
+    """Samples the Python stacks of all other threads at a fixed interval."""
+
+    def __init__(self, interval_s: float = SAMPLE_INTERVAL_S):
+        self.interval_s = interval_s
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self):
+        own = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own:
+                continue
+            leaf = (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name)
+            if leaf in IDLE_FRAMES:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_key(frame.f_code))
+                frame = frame.f_back
+            self.stacks[tuple(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            self._sample()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def top(self, n: int = TOP_N) -> dict:
+        """Functions by samples on top of the stack (self) and anywhere in it (cumulative)."""
+        own, cumulative = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for key in set(stack):
+                cumulative[key] += count
+        total = sum(self.stacks.values()) or 1
+        fmt = lambda counts: [{"function": k, "samples": v, "share": round(v / total, 3)}
+                              for k, v in counts.most_common(n)]
+        return {"self": fmt(own), "cumulative": fmt(cumulative)}
+
+    def folded(self) -> str:
+        return "\n".join(f"{';'.join(stack)} {count}" for stack, count in self.stacks.most_common())
+
+class RequestProfile:
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.started_at = datetime.now()
+        self.id = f"{self.started_at.strftime('%Y%m%d-%H%M%S-%f')}-{method}-{path.strip('/').replace('/', '_') or 'root'}"
+        self.stages = defaultdict(float)
+        self.stage_counts = Counter()
+        self.profiler = SamplingProfiler()
+        self._lock = threading.Lock()
+        self._t0 = 0.0
+
+    def add_stage(self, name: str, seconds: float):
+        # Stages may finish on thread-pool threads
+        with self._lock:
+            self.stages[name] += seconds
+            self.stage_counts[name] += 1
+
+    def start(self):
+        global _tracemalloc_users, _peak_owner
+        with _tracemalloc_lock:
+            if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+            _tracemalloc_users += 1
+            if _peak_owner is None:
+                _peak_owner = self
+                tracemalloc.reset_peak()
+        self.profiler.start()
+        self._t0 = time.perf_counter()
+
+    def finish(self, status: int) -> dict:
+        global _tracemalloc_users, _peak_owner
+        duration = time.perf_counter() - self._t0
+        self.profiler.stop()
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ])
+        with _tracemalloc_lock:
+            # Overlapping captures get no peak rather than a wrong one
+            peak = None
+            if _peak_owner is self:
+                _, peak = tracemalloc.get_traced_memory()
+                _peak_owner = None
+            _tracemalloc_users -= 1
+            if _tracemalloc_users == 0:
+                tracemalloc.stop()
+
+        stages = sorted(({"stage": name, "seconds": round(s, 4), "calls": self.stage_counts[name],
+                          "share": round(s / duration, 3) if duration else 0.0}
+                         for name, s in self.stages.items()), key=lambda s: -s["seconds"])
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": status,
+            "started_at": self.started_at.isoformat(),
+            "duration_s": round(duration, 4),
+            "stages": stages,
+            "cpu": {"interval_s": self.profiler.interval_s, "samples": self.profiler.samples,
+                    **self.profiler.top()},
+            "memory": {
+                # None when another capture was tracking the peak
+                "peak_traced_bytes": peak,
+                # ru_maxrss is in KiB on Linux; it is the peak of the whole process so far
+                "process_peak_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None,
+                # Allocated since the request started and still held when it finished
+                "top_allocations": [{"site": str(s.traceback), "bytes": s.size, "count": s.count}
+                                    for s in snapshot.statistics("lineno")[:TOP_N]],
+            },
+            "_folded": self.profiler.folded(),
+        }
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware; requests that are not profiled go straight to the app."""
+
+    def __init__(self, app, sample_rate: float = SAMPLE_RATE):
+        self.app = app
+        self.sample_rate = sample_rate
+
+    def wanted(self, scope) -> bool:
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]
+                   if k.lower() == b"x-profile"}
+        query_string = scope.get("query_string", b"")
+        query = {k: v[-1] for k, v in parse_qs(query_string.decode("latin-1")).items()} \
+            if b"profile=" in query_string else {}
+        if headers or query:
+            return requested(headers, query)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.wanted(scope):
+            await self.app(scope, receive, send)
+            return
+        profile = RequestProfile(scope["method"], scope["path"])
+        status = 500
+
+        async def send_profiled(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", [])) + [(b"x-profile-id", profile.id.encode("latin-1", "replace"))]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        profile.start()
+        try:
+            # The app returns once the last body chunk is sent, streamed responses included
+            with active(profile):
+                await self.app(scope, receive, send_profiled)
+        finally:
+            # The tracemalloc snapshot can take a while after a big request; keep it off the event loop
+            await asyncio.get_running_loop().run_in_executor(None, lambda: save(profile.finish(status)))
+
+def save(capture: dict, directory: Optional[str] = None, keep: int = PROFILE_KEEP) -> str:
+    """Writes a capture and its folded stacks; only the newest `keep` captures are kept."""
+    directory = directory or PROFILE_DIR
+    os.makedirs(directory, exist_ok=True)
+    folded = capture.pop("_folded", "")
+    path = os.path.join(directory, capture["id"] + ".json")
+    with open(path, "w") as f:
+        json.dump(capture, f, indent=2)
+    with open(os.path.join(directory, capture["id"] + ".folded"), "w") as f:
+        f.write(folded)
+    captures = sorted(n for n in os.listdir(directory) if n.endswith(".json"))
+    for name in captures[:-keep] if keep else []:
+        for ext in (".json", ".folded"):
+            try:
+                os.remove(os.path.join(directory, name[:-5] + ext))
+            except FileNotFoundError:
+                pass
+    return path
+
+def load(profile_id: str, directory: Optional[str] = None) -> Optional[dict]:
+    directory = directory or PROFILE_DIR
+    path = os.path.join(directory, os.path.basename(profile_id) + ".json")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+def summary(limit: int = 20, path_prefix: Optional[str] = None, directory: Optional[str] = None) -> list[dict]:
+    """Slowest captured requests, each with its dominant stage and hottest function."""
+    directory = directory or PROFILE_DIR
+    if not os.path.isdir(directory):
+        return []
+    rows = []
+    for name in os.listdir(directory):
+        if not name.endswith(".json"):
+            continue
+        with open(os.path.join(directory, name), "r") as f:
+            try:
+                capture = json.load(f)
+            except ValueError:
+                continue
+        if path_prefix and not capture["path"].startswith(path_prefix):
+            continue
+        hottest = capture["cpu"]["self"][0] if capture["cpu"]["self"] else None
+        rows.append({
+            "id": capture["id"],
+            "method": capture["method"],
+            "path": capture["path"],
+            "status": capture["status"],
+            "started_at": capture["started_at"],
+            "duration_s": capture["duration_s"],
+            "peak_traced_bytes": capture["memory"]["peak_traced_bytes"],
+            "stages": capture["stages"][:3],
+            "hottest_function": hottest,
+        })
+    rows.sort(key=lambda r: -r["duration_s"])
+    return rows[:limit]
@@ -0,0 +1,47 @@
+import json
+import time
+from contextlib import contextmanager
+
+class StartupReport:
+    """Records how long the API took to come up and what each import cost.
+
+    Stages measured while the module loads are "startup"; heavy dependencies
+    pulled in on first use of an endpoint are recorded as "lazy".
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.ready_s = None
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name: str, phase: str = "startup"):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append({
+                "name": name,
+                "phase": phase,
+                "seconds": round(time.perf_counter() - t0, 4),
+                "at_s": round(t0 - self.started, 4),
+            })
+
+    def mark_ready(self):
+        if self.ready_s is None:
+            self.ready_s = round(time.perf_counter() - self.started, 4)
+
+    def as_dict(self) -> dict:
+        return {
+            "ready_s": self.ready_s,
+            "startup": [s for s in self.stages if s["phase"] == "startup"],
+            "lazy": [s for s in self.stages if s["phase"] == "lazy"],
+        }
+
+report = StartupReport()
+
+if __name__ == "__main__":
+    # Import the app the way uvicorn does and print the breakdown
+    from backend.api import main
+    report.mark_ready()
+    print(json.dumps(report.as_dict(), indent=2))
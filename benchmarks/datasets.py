@@ -0,0 +1,43 @@
+import os
+import re
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scripts.gen_sample import generate_sample_csv
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), ".data")
+SEED = 1234
+
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+
+def parse_scale(label: str) -> int:
+    """Accepts the named scales or plain row counts such as 25000 or 50k."""
+    label = label.strip().lower()
+    if label in SCALES:
+        return SCALES[label]
+    match = re.fullmatch(r"(\d+)([km]?)", label)
+    if not match:
+        raise ValueError(f"Unknown scale: {label}")
+    return int(match.group(1)) * {"": 1, "k": 1_000, "m": 1_000_000}[match.group(2)]
+
+def dataset(rows: int) -> str:
+    """Path to a seeded synthetic alarm log with `rows` rows, generated once."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, f"alarms_{rows}_{SEED}.csv")
+    if not os.path.exists(path):
+        tmp_path = path + ".tmp"
+        generate_sample_csv(tmp_path, rows, seed=SEED)
+        os.replace(tmp_path, path)
+    return path
+
+QUERIES = [
+    "2024-02-01 08:00:00,Machine_1,ALM_5521,Maintenance",
+    "Machine_3 triggered ALM_3021",
+    "ALM_2045 motor overheat on Machine_4",
+    "vacuum pressure dropping during pick",
+    "Communication loss after restart",
+    "Machine_2 ALM_4056 while Running",
+    "safety relay tripped twice this morning",
+    "ALM_7034 sensor timeout",
+]
@@ -0,0 +1,86 @@
+import hashlib
+import json
+import time
+from typing import Iterator
+
+from rag.codes import extract_codes
+
+NS = 1_000_000_000
+
+def fake_explanation(prompt: str) -> str:
+    """Deterministic five-field answer derived from the prompt text."""
+    digest = hashlib.sha256(prompt.encode()).hexdigest()
+    codes = extract_codes(prompt)
+    code = codes[-1] if codes else "the reported alarm"
+    return json.dumps({
+        "summary": f"{code} indicates a fault on the affected machine (ref {digest[:8]}).",
+        "evidence": f"Context lines mentioning {code} were retrieved.",
+        "root_cause": "Sensor, wiring or logic fault consistent with the manual entry.",
+        "actions": "1. Inspect the sensor\n2. Check wiring\n3. Review PLC logic",
+        "confidence": ["High", "Medium", "Low"][int(digest[8], 16) % 3],
+    })
+
+class FakeOllamaClient:
+    """Drop-in for ollama.Client with fixed output and simulated token timing.
+
+    `tokens_per_s` of 0 returns immediately; otherwise generation sleeps as
+    long as a model at that rate would, and prompt evaluation at
+    `prompt_tokens_per_s`. Reported durations match the simulated ones.
+    """
+
+    def __init__(self, tokens_per_s: float = 0, prompt_tokens_per_s: float = 0,
+                 load_s: float = 0):
+        self.tokens_per_s = tokens_per_s
+        self.prompt_tokens_per_s = prompt_tokens_per_s
+        self.load_s = load_s
+        self.loaded = set()
+        self.calls = 0
+
+    def _prompt(self, messages) -> str:
+        return "\n".join(m["content"] for m in messages or [])
+
+    def _load(self, model: str) -> float:
+        if model in self.loaded or not self.load_s:
+            self.loaded.add(model)
+            return 0.0
+        time.sleep(self.load_s)
+        self.loaded.add(model)
+        return self.load_s
+
+    def _timings(self, prompt: str, output: str, load_s: float) -> tuple[dict, float, float]:
+        prompt_tokens = max(len(prompt) // 4, 1)
+        output_tokens = max(len(output) // 4, 1)
+        prompt_s = prompt_tokens / self.prompt_tokens_per_s if self.prompt_tokens_per_s else 0.0
+        eval_s = output_tokens / self.tokens_per_s if self.tokens_per_s else 0.0
+        stats = {
+            "load_duration": int(load_s * NS),
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(prompt_s * NS),
+            "eval_count": output_tokens,
+            "eval_duration": int(eval_s * NS),
+            "total_duration": int((load_s + prompt_s + eval_s) * NS),
+        }
+        return stats, prompt_s, eval_s
+
+    def chat(self, model: str = "", messages=None, stream: bool = False, **kwargs):
+        self.calls += 1
+        prompt = self._prompt(messages)
+        output = fake_explanation(prompt)
+        load_s = self._load(model)
+        stats, prompt_s, eval_s = self._timings(prompt, output, load_s)
+        if stream:
+            return self._stream(model, output, stats, prompt_s, eval_s)
+        time.sleep(prompt_s + eval_s)
+        return {"model": model, "done": True, "message": {"role": "assistant", "content": output}, **stats}
+
+    def _stream(self, model, output, stats, prompt_s, eval_s) -> Iterator[dict]:
+        time.sleep(prompt_s)
+        pieces = [output[i:i + 4] for i in range(0, len(output), 4)]
+        for piece in pieces:
+            time.sleep(eval_s / len(pieces))
+            yield {"model": model, "done": False, "message": {"role": "assistant", "content": piece}}
+        yield {"model": model, "done": True, "message": {"role": "assistant", "content": ""}, **stats}
+
+    def generate(self, model: str = "", prompt: str = "", **kwargs):
+        load_s = self._load(model)
+        return {"model": model, "done": True, "response": "", "load_duration": int(load_s * NS)}
@@ -0,0 +1,105 @@
+"""Local HTTP stand-in for the Ollama server.
+
+    python -m benchmarks.fake_ollama --port 11435 --tokens-per-s 25 --parallel 1
+
+Point the API at it with OLLAMA_HOST=http://localhost:11435. Answers are
+the deterministic ones from FakeOllamaClient; --parallel limits how many
+generations run at once, like OLLAMA_NUM_PARALLEL on a real server.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.fake_llm import FakeOllamaClient
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _json(self, payload: dict, status: int = 200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, chunks):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for chunk in chunks:
+            line = (json.dumps(chunk) + "\n").encode()
+            self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._json({"models": [{"name": m} for m in sorted(self.server.client.loaded)]})
+        elif self.path == "/api/version":
+            self._json({"version": "fake"})
+        else:
+            self._json({"status": "Ollama is running"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        request = json.loads(self.rfile.read(length) or b"{}")
+        client = self.server.client
+        # The Ollama HTTP API streams unless told otherwise
+        stream = request.get("stream", True)
+
+        if self.path == "/api/chat":
+            with self.server.slots:
+                result = client.chat(model=request.get("model", ""), messages=request.get("messages"),
+                                     stream=stream)
+                if stream:
+                    self._stream(result)
+                else:
+                    self._json(result)
+        elif self.path == "/api/generate":
+            result = client.generate(model=request.get("model", ""), prompt=request.get("prompt", ""))
+            if stream:
+                self._stream([result])
+            else:
+                self._json(result)
+        else:
+            self._json({"error": f"unsupported path {self.path}"}, status=404)
+
+def serve(host: str = "127.0.0.1", port: int = 11435, tokens_per_s: float = 25,
+          prompt_tokens_per_s: float = 500, load_s: float = 0, parallel: int = 1) -> ThreadingHTTPServer:
+    """Starts the fake server on a background thread and returns it."""
+    server = ThreadingHTTPServer((host, port), FakeOllamaHandler)
+    server.daemon_threads = True
+    server.client = FakeOllamaClient(tokens_per_s, prompt_tokens_per_s, load_s)
+    server.slots = threading.BoundedSemaphore(parallel)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fake Ollama server for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--tokens-per-s", type=float, default=25, help="Generation rate (0 = instant)")
+    parser.add_argument("--prompt-tokens-per-s", type=float, default=500, help="Prompt eval rate (0 = instant)")
+    parser.add_argument("--load-s", type=float, default=0, help="Simulated model load on first use")
+    parser.add_argument("--parallel", type=int, default=1, help="Concurrent generations allowed")
+    args = parser.parse_args(argv)
+
+    server = serve(args.host, args.port, args.tokens_per_s, args.prompt_tokens_per_s, args.load_s, args.parallel)
+    print(f"Fake Ollama listening on http://{args.host}:{args.port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
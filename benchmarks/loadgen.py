@@ -0,0 +1,222 @@
+"""Load generator for the FastAPI app.
+
+    # Against a running API (started with OLLAMA_HOST pointing at a fake or real Ollama)
+    python -m benchmarks.loadgen --url http://localhost:8000 --concurrency 8 --duration 60
+
+    # Self-contained: starts the fake Ollama and the API, then drives it
+    python -m benchmarks.loadgen --spawn --tokens-per-s 25 --concurrency 1,2,4,8 --duration 30
+
+Each worker picks endpoints at random according to --mix and records
+latency per endpoint; the report gives throughput and p50/p95/p99.
+`process` re-indexes --filename on every call, so it is left out of the
+default mix; with --spawn it writes to a throwaway Chroma directory.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import httpx
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.datasets import QUERIES
+
+DEFAULT_MIX = "query=6,preview=2,history=1"
+
+def parse_mix(spec: str) -> dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - set(REQUESTS)
+    if unknown:
+        raise ValueError(f"Unknown endpoints in mix: {sorted(unknown)}")
+    return mix
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+def request_query(rng, filename):
+    return "POST", "/api/query", {"json": {"query": rng.choice(QUERIES)}}
+
+def request_preview(rng, filename):
+    return "GET", f"/api/preview/{filename}", {}
+
+def request_history(rng, filename):
+    return "GET", "/api/history", {"params": {"filename": filename}}
+
+def request_process(rng, filename):
+    return "POST", "/api/process", {"params": {"filename": filename}}
+
+REQUESTS = {
+    "query": request_query,
+    "preview": request_preview,
+    "history": request_history,
+    "process": request_process,
+}
+
+class LoadResult:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def record(self, endpoint: str, seconds: float, ok: bool):
+        self.latencies[endpoint].append(seconds)
+        if not ok:
+            self.errors[endpoint] += 1
+
+    def report(self, concurrency: int) -> dict:
+        endpoints = {}
+        total = 0
+        for endpoint, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            total += len(values)
+            endpoints[endpoint] = {
+                "requests": len(values),
+                "errors": self.errors[endpoint],
+                "throughput_rps": round(len(values) / self.elapsed, 3) if self.elapsed else 0.0,
+                "p50_s": round(percentile(values, 50), 4),
+                "p95_s": round(percentile(values, 95), 4),
+                "p99_s": round(percentile(values, 99), 4),
+                "max_s": round(values[-1], 4),
+            }
+        return {
+            "concurrency": concurrency,
+            "duration_s": round(self.elapsed, 3),
+            "requests": total,
+            "throughput_rps": round(total / self.elapsed, 3) if self.elapsed else 0.0,
+            "errors": sum(self.errors.values()),
+            "endpoints": endpoints,
+        }
+
+async def worker(client, mix, filename, deadline, remaining, result, seed):
+    rng = random.Random(seed)
+    names, weights = list(mix), list(mix.values())
+    while time.perf_counter() < deadline:
+        if remaining is not None:
+            if remaining[0] <= 0:
+                return
+            remaining[0] -= 1
+        endpoint = rng.choices(names, weights)[0]
+        method, path, kwargs = REQUESTS[endpoint](rng, filename)
+        t0 = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        result.record(endpoint, time.perf_counter() - t0, ok)
+
+async def run_load(url: str, concurrency: int, duration: float, mix: dict, filename: str,
+                   requests: int = None, timeout: float = 300, seed: int = 0) -> dict:
+    result = LoadResult()
+    deadline = time.perf_counter() + duration
+    remaining = [requests] if requests else None
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        await asyncio.gather(*[
+            worker(client, mix, filename, deadline, remaining, result, seed + i)
+            for i in range(concurrency)
+        ])
+    result.elapsed = time.perf_counter() - result.started
+    return result.report(concurrency)
+
+def wait_for(url: str, timeout: float = 60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(url, timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+def spawn_stack(args):
+    """Starts the fake Ollama in-process and the API as a uvicorn subprocess."""
+    from benchmarks.fake_ollama import serve
+    fake = serve(port=args.fake_port, tokens_per_s=args.tokens_per_s,
+                 prompt_tokens_per_s=args.prompt_tokens_per_s, parallel=args.ollama_parallel)
+    # Keep `process` requests away from the developer's real index
+    store = tempfile.mkdtemp(prefix="loadgen-chroma-")
+    env = {**os.environ, "OLLAMA_HOST": f"http://127.0.0.1:{args.fake_port}", "PLC_CHROMA_DIR": store,
+           "PLC_PROFILE_DIR": os.path.join(store, "profiles")}
+    env.pop("PLC_INDEX_SERVICE", None)
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    api = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.api.main:app", "--port", str(args.api_port),
+         "--workers", str(args.workers)],
+        cwd=root, env=env,
+    )
+    url = f"http://127.0.0.1:{args.api_port}"
+    wait_for(url + "/api/health")
+    return fake, api, url, store
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Load test the PLC log explainer API")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", default="4", help="One level or a comma-separated sweep, e.g. 1,2,4,8")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds per concurrency level")
+    parser.add_argument("--requests", type=int, default=None, help="Stop after this many requests per level")
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--filename", default="sample.csv", help="Data file used by preview/history/process")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--output", default=None, help="Write the JSON report here")
+    parser.add_argument("--spawn", action="store_true", help="Start a fake Ollama and the API locally")
+    parser.add_argument("--api-port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--fake-port", type=int, default=11435)
+    parser.add_argument("--tokens-per-s", type=float, default=25)
+    parser.add_argument("--prompt-tokens-per-s", type=float, default=500)
+    parser.add_argument("--ollama-parallel", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    fake = api = store = None
+    url = args.url
+    if args.spawn:
+        fake, api, url, store = spawn_stack(args)
+
+    reports = []
+    try:
+        for level in [int(c) for c in args.concurrency.split(",")]:
+            report = asyncio.run(run_load(url, level, args.duration, mix, args.filename,
+                                          requests=args.requests, timeout=args.timeout))
+            reports.append(report)
+            print(f"\nconcurrency={level}  {report['throughput_rps']} req/s  errors={report['errors']}")
+            print(f"  {'endpoint':<10}{'reqs':>7}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}")
+            for name, stats in report["endpoints"].items():
+                print(f"  {name:<10}{stats['requests']:>7}{stats['throughput_rps']:>9}"
+                      f"{stats['p50_s']:>9}{stats['p95_s']:>9}{stats['p99_s']:>9}")
+    finally:
+        if api:
+            api.terminate()
+            api.wait()
+        if fake:
+            fake.shutdown()
+        if store:
+            shutil.rmtree(store, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"url": url, "mix": mix, "levels": reports}, f, indent=2)
+        print(f"\nReport written to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,245 @@
+"""Benchmarks for the ingest, retrieval and generation pipeline.
+
+    python -m benchmarks.run --scales 10k,100k
+    python -m benchmarks.run --scales 10k --stages parse,textualize --baseline benchmarks/baseline.json
+    python -m benchmarks.run --scales 10k,1m --save-baseline
+
+Results are written as JSON keyed by "<stage>[<scale>]"; when a baseline is
+given, any stage whose median time grew by more than --threshold fails the
+run with exit code 1.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.datasets import QUERIES, dataset, parse_scale
+from benchmarks.fake_llm import FakeOllamaClient
+
+STAGES = ["parse", "textualize", "embed", "retrieve", "api_query"]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(__file__), "results", "latest.json")
+
+def measure(fn, repeat: int) -> list[float]:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return times
+
+def summarize(times: list[float], items: int = 0) -> dict:
+    median = statistics.median(times)
+    result = {"median_s": round(median, 6), "min_s": round(min(times), 6), "runs": len(times)}
+    if items:
+        result["items"] = items
+        result["items_per_s"] = round(items / median, 1) if median else None
+    return result
+
+class PipelineBench:
+    """Times each pipeline stage on one synthetic dataset."""
+
+    def __init__(self, rows: int, repeat: int, textualize_rows: int, index_rows: int, workdir: str):
+        self.rows = rows
+        self.repeat = repeat
+        self.textualize_rows = min(textualize_rows, rows)
+        self.index_rows = min(index_rows, rows)
+        self.workdir = workdir
+        self.path = dataset(rows)
+        self._texts = None
+        self._embeddings = None
+        self._retriever = None
+
+    def texts(self) -> list[str]:
+        if self._texts is None:
+            from ingest.parse_logs import LogParser
+            from ingest.textualize import Textualizer
+            textualizer = Textualizer()
+            self._texts = []
+            for chunk in LogParser(self.path).parse():
+                self._texts.extend(textualizer.process_chunk(chunk))
+                if len(self._texts) >= self.index_rows:
+                    break
+            self._texts = self._texts[:self.index_rows]
+        return self._texts
+
+    def embeddings(self):
+        if self._embeddings is None:
+            from langchain_huggingface import HuggingFaceEmbeddings
+            from backend.api.deps import EMBEDDING_MODEL
+            self._embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+        return self._embeddings
+
+    def parse(self) -> dict:
+        from ingest.parse_logs import LogParser
+
+        def run():
+            for _ in LogParser(self.path).parse():
+                pass
+        return summarize(measure(run, self.repeat), self.rows)
+
+    def textualize(self) -> dict:
+        from ingest.parse_logs import LogParser
+        from ingest.textualize import Textualizer
+        chunks, total = [], 0
+        for chunk in LogParser(self.path).parse():
+            chunks.append(chunk.head(self.textualize_rows - total))
+            total += len(chunks[-1])
+            if total >= self.textualize_rows:
+                break
+        textualizer = Textualizer()
+
+        def run():
+            for chunk in chunks:
+                textualizer.process_chunk(chunk)
+        return summarize(measure(run, self.repeat), total)
+
+    def embed(self) -> dict:
+        from rag.embed import Indexer
+        texts = self.texts()
+        times = []
+        for i in range(self.repeat):
+            indexer = Indexer(persist_dir=os.path.join(self.workdir, f"embed_{i}"), embeddings=self.embeddings())
+            t0 = time.perf_counter()
+            indexer.ingest_logs(texts)
+            times.append(time.perf_counter() - t0)
+        return summarize(times, len(texts))
+
+    def retriever(self):
+        if self._retriever is None:
+            from rag.embed import Indexer
+            from rag.retrieve import Retriever
+            persist_dir = os.path.join(self.workdir, "index")
+            indexer = Indexer(persist_dir=persist_dir, embeddings=self.embeddings())
+            indexer.ingest_manuals("data/auto_faults/knowledge_base.json")
+            indexer.ingest_logs(self.texts())
+            self._retriever = Retriever(persist_dir=persist_dir, embeddings=self.embeddings())
+        return self._retriever
+
+    def retrieve(self) -> dict:
+        retriever = self.retriever()
+
+        def run():
+            for query in QUERIES:
+                retriever.query(query, k=10)
+        result = summarize(measure(run, self.repeat), len(QUERIES))
+        result["last_timings"] = retriever.last_timings
+        return result
+
+    def api_query(self) -> dict:
+        from fastapi.testclient import TestClient
+        from backend.api import deps
+        from backend.api import main
+        from rag.codes import CodeIndex
+        from rag.session import get_session
+
+        code_index = CodeIndex(path=os.path.join(self.workdir, "code_index.json"))
+        code_index.add_manuals("data/auto_faults/knowledge_base.json")
+        deps._cache.update({"retriever": self.retriever(), "code_index": code_index})
+        for model in {main.router.large_model, main.router.small_model or main.router.large_model}:
+            get_session(model).client = FakeOllamaClient()
+
+        client = TestClient(main.app)
+
+        def run():
+            for query in QUERIES:
+                response = client.post("/api/query", json={"query": query})
+                response.raise_for_status()
+        return summarize(measure(run, self.repeat), len(QUERIES))
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+def compare(current: dict, baseline: dict, threshold: float) -> list[dict]:
+    """Stages whose median time regressed by more than `threshold` (0.2 = 20%)."""
+    regressions = []
+    for name, result in current.get("results", {}).items():
+        base = baseline.get("results", {}).get(name)
+        if not base or not base.get("median_s"):
+            continue
+        change = result["median_s"] / base["median_s"] - 1
+        if change > threshold:
+            regressions.append({"benchmark": name, "baseline_s": base["median_s"],
+                                "current_s": result["median_s"], "change": round(change, 3)})
+    return regressions
+
+def run(scales: list[str], stages: list[str], repeat: int, textualize_rows: int, index_rows: int) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="plc-bench-") as workdir:
+        for label in scales:
+            rows = parse_scale(label)
+            bench = PipelineBench(rows, repeat, textualize_rows, index_rows, os.path.join(workdir, label))
+            for stage in stages:
+                name = f"{stage}[{label}]"
+                print(f"Running {name}...")
+                results[name] = getattr(bench, stage)()
+                print(f"  median {results[name]['median_s']:.4f}s")
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "cpus": os.cpu_count(),
+            "repeat": repeat,
+            "textualize_rows": textualize_rows,
+            "index_rows": index_rows,
+        },
+        "results": results,
+    }
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the PLC log explainer pipeline")
+    parser.add_argument("--scales", default="10k", help="Comma-separated dataset sizes: 10k,100k,1m,10m")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"Comma-separated subset of {STAGES}")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--textualize-rows", type=int, default=100_000)
+    parser.add_argument("--index-rows", type=int, default=5_000)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", default=None, help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown before failing")
+    parser.add_argument("--save-baseline", action="store_true", help=f"Also write results to {DEFAULT_BASELINE}")
+    args = parser.parse_args(argv)
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"Unknown stages: {sorted(unknown)}")
+
+    current = run(args.scales.split(","), stages, args.repeat, args.textualize_rows, args.index_rows)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(current, f, indent=2)
+    print(f"Results written to {args.output}")
+    if args.save_baseline:
+        with open(DEFAULT_BASELINE, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"Baseline written to {DEFAULT_BASELINE}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.threshold)
+        for r in regressions:
+            print(f"REGRESSION {r['benchmark']}: {r['baseline_s']:.4f}s -> {r['current_s']:.4f}s "
+                  f"(+{r['change'] * 100:.0f}%)")
+        if regressions:
+            return 1
+        print(f"No regressions above {args.threshold * 100:.0f}%")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -29,6 +29,7 @@ export default function Workflow() {
     const [result, setResult] = useState<{
         structured: StructuredResult;
         evidence: string[];
+        route?: { route: string; model: string };
     } | null>(null);
     const [loading, setLoading] = useState(false);
     const [submittedRating, setSubmittedRating] = useState<string | null>(null);
@@ -164,7 +165,9 @@ export default function Workflow() {
             await axios.post(`${API_URL}/api/feedback`, {
                 query,
                 response: JSON.stringify(result.structured),
-                rating
+                rating,
+                route: result.route?.route,
+                model: result.route?.model
             });
             setSubmittedRating(rating);
         } catch (error) {
@@ -0,0 +1,299 @@
+import io
+import json
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+import pandas as pd
+
+from ingest.textualize import Textualizer
+
+try:
+    import fcntl
+except ImportError:
+    # No cross-process lock on Windows; run a single API worker there
+    fcntl = None
+
+class LogFollower:
+    """Tails a growing CSV or NDJSON log and ingests only the appended rows.
+
+    The byte offset and inode are persisted, so a restart resumes where it
+    left off. Rotation (new inode) drains the old file through the handle we
+    still hold before switching; truncation (size below offset) starts over
+    from the top. Only complete lines are consumed, so a row that is half
+    written when we poll is picked up on the next poll.
+
+    Several API workers share the state directory. A follower holds an
+    exclusive lock on <state>.lock while it runs, so only one process tails
+    a file. Any process can ask the owner to stop by creating <state>.stop.
+    """
+
+    def __init__(self, filepath: str, sink: Callable[[list[str]], None],
+                 state_dir: str = "data/follow_state", batch_rows: int = 500,
+                 poll_interval: float = 1.0, max_read_bytes: int = 4 * 1024 * 1024):
+        self.filepath = filepath
+        self.sink = sink
+        self.batch_rows = batch_rows
+        self.poll_interval = poll_interval
+        self.max_read_bytes = max_read_bytes
+        self.file_ext = os.path.splitext(filepath)[1].lower()
+        if self.file_ext not in ['.csv', '.jsonl', '.ndjson']:
+            raise ValueError(f"Follow mode supports CSV and NDJSON logs, not {self.file_ext}")
+        self.textualizer = Textualizer()
+        self.state_path = os.path.join(state_dir, os.path.basename(filepath) + ".json")
+        self.lock_path = self.state_path + ".lock"
+        self.stop_path = self.state_path + ".stop"
+        self.state = {"inode": None, "offset": 0, "header": None, "rows": 0, "batches": 0,
+                      "rotations": 0, "truncations": 0, "last_ingest": None, "last_error": None,
+                      "caught_up_at": None, "bad_lines": 0}
+        self._handle = None
+        self._lock_file = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._load_state()
+
+    def _load_state(self):
+        if os.path.exists(self.state_path):
+            with open(self.state_path, "r") as f:
+                try:
+                    self.state.update(json.load(f))
+                except ValueError:
+                    pass
+
+    def _save_state(self):
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def _open(self, inode: int):
+        if self._handle:
+            self._handle.close()
+        self._handle = open(self.filepath, "rb")
+        if inode != self.state["inode"]:
+            # A different file than the one the saved offset refers to
+            self.state.update({"inode": inode, "offset": 0, "header": None})
+
+    def _read_complete_lines(self) -> tuple[list[str], list[int]]:
+        """Complete lines after the saved offset, each with the offset just past it.
+
+        The offset is not moved for data lines; `_ingest` moves it once their
+        batch is in the sink, so rows are never skipped when the sink fails.
+        """
+        start = self.state["offset"]
+        self._handle.seek(start)
+        data = self._handle.read(self.max_read_bytes)
+        end = data.rfind(b"\n")
+        if end < 0:
+            return [], []
+        lines, ends, position = [], [], start
+        for raw in data[:end + 1].splitlines(keepends=True):
+            position += len(raw)
+            line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+            if line.strip():
+                lines.append(line)
+                ends.append(position)
+        if self.file_ext == ".csv" and self.state["header"] is None and lines:
+            self.state["header"] = lines.pop(0)
+            self.state["offset"] = ends.pop(0)
+        if not lines:
+            # Blank lines (or just the header): nothing that could be lost
+            self.state["offset"] = start + end + 1
+        return lines, ends
+
+    def _parse(self, lines: list[str]) -> pd.DataFrame:
+        if self.file_ext == ".csv":
+            return pd.read_csv(io.StringIO("\n".join([self.state["header"]] + lines)))
+        return pd.DataFrame([json.loads(l) for l in lines])
+
+    def _to_frame(self, lines: list[str]) -> pd.DataFrame:
+        try:
+            return self._parse(lines)
+        except ValueError:
+            # One malformed line: keep the rest of the batch and skip only it
+            good = []
+            for line in lines:
+                try:
+                    self._parse([line])
+                    good.append(line)
+                except ValueError:
+                    self.state["bad_lines"] += 1
+                    print(f"Follow {self.filepath}: skipped malformed line: {line[:200]}")
+            return self._parse(good) if good else pd.DataFrame()
+
+    def _ingest(self, lines: list[str], ends: list[int]) -> int:
+        for i in range(0, len(lines), self.batch_rows):
+            batch = lines[i:i + self.batch_rows]
+            frame = self._to_frame(batch)
+            texts = self.textualizer.process_chunk(frame) if not frame.empty else []
+            if texts:
+                self.sink(texts)
+            # Only now are these rows safe to skip on the next read
+            self.state["offset"] = ends[i + len(batch) - 1]
+            self.state["rows"] += len(texts)
+            self.state["batches"] += 1
+            self._save_state()
+        if lines:
+            self.state["last_ingest"] = time.time()
+        return len(lines)
+
+    def poll(self) -> int:
+        """Ingests whatever has been appended since the last poll; returns rows read."""
+        started = time.time()
+        try:
+            st = os.stat(self.filepath)
+        except FileNotFoundError:
+            # Mid-rotation: the new file has not been created yet
+            return 0
+
+        ingested = 0
+        if self._handle is None:
+            self._open(st.st_ino)
+        elif st.st_ino != self.state["inode"]:
+            # Rotated: finish the old file through the open handle, then switch
+            while True:
+                lines, ends = self._read_complete_lines()
+                if not lines:
+                    break
+                ingested += self._ingest(lines, ends)
+            self.state["rotations"] += 1
+            self._open(st.st_ino)
+        elif st.st_size < self.state["offset"]:
+            self.state["truncations"] += 1
+            self.state.update({"offset": 0, "header": None})
+
+        while True:
+            lines, ends = self._read_complete_lines()
+            if not lines:
+                break
+            ingested += self._ingest(lines, ends)
+        # Everything written before this poll started has now been read
+        self.state["caught_up_at"] = started
+        self._save_state()
+        return ingested
+
+    def lag(self) -> dict:
+        """How far ingestion is behind the file on disk.
+
+        Seconds count from the last time the follower had read everything,
+        so they keep growing while it falls behind a file that is still
+        being written.
+        """
+        try:
+            st = os.stat(self.filepath)
+        except FileNotFoundError:
+            return {"bytes": None, "seconds": None}
+        same_file = st.st_ino == self.state["inode"]
+        behind = max(st.st_size - self.state["offset"], 0) if same_file else st.st_size
+        if not behind:
+            return {"bytes": 0, "seconds": 0.0}
+        since = self.state["caught_up_at"]
+        return {"bytes": behind, "seconds": round(max(time.time() - since, 0.0), 3) if since else None}
+
+    def status(self) -> dict:
+        if not self.running:
+            # Another process may be the one following it
+            self._load_state()
+        return {
+            "file": self.filepath,
+            "running": self.running or self.followed_elsewhere(),
+            "offset": self.state["offset"],
+            "rows": self.state["rows"],
+            "batches": self.state["batches"],
+            "rotations": self.state["rotations"],
+            "truncations": self.state["truncations"],
+            "bad_lines": self.state["bad_lines"],
+            "last_ingest": self.state["last_ingest"],
+            "last_error": self.state["last_error"],
+            "lag": self.lag(),
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _acquire(self) -> bool:
+        """Takes the cross-process follow lock without waiting."""
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        self._lock_file = open(self.lock_path, "a")
+        if fcntl is None:
+            return True
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            self._release()
+            return False
+
+    def _release(self):
+        if self._lock_file:
+            # Closing the file drops the lock
+            self._lock_file.close()
+            self._lock_file = None
+
+    def followed_elsewhere(self) -> bool:
+        """True when another process holds the follow lock."""
+        if self.running or fcntl is None or not os.path.exists(self.lock_path):
+            return False
+        if not self._acquire():
+            return True
+        self._release()
+        return False
+
+    def request_stop(self):
+        """Asks whichever process follows the file to stop at its next poll."""
+        os.makedirs(os.path.dirname(self.stop_path), exist_ok=True)
+        open(self.stop_path, "w").close()
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                if os.path.exists(self.stop_path):
+                    os.remove(self.stop_path)
+                    break
+                try:
+                    self.poll()
+                    self.state["last_error"] = None
+                except Exception as e:
+                    self.state["last_error"] = str(e)
+                    print(f"Follow {self.filepath} failed: {e}")
+                self._stop.wait(self.poll_interval)
+        finally:
+            if self._handle:
+                self._handle.close()
+                self._handle = None
+            self._release()
+
+    def start(self) -> bool:
+        """Starts following; False when another process already follows the file."""
+        if self.running:
+            return True
+        if not self._acquire():
+            return False
+        if os.path.exists(self.stop_path):
+            os.remove(self.stop_path)
+        # Another process may have advanced the offset since we last ran
+        self._load_state()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f"follow-{os.path.basename(self.filepath)}",
+                                        daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.poll_interval * 2 + 5)
+        if self._handle:
+            # Left open by polls made without the thread
+            self._handle.close()
+            self._handle = None
+
+def followed_files(state_dir: str = "data/follow_state", data_dir: str = "data") -> list[tuple[str, "LogFollower"]]:
+    """(filename, follower) for every file with saved state, for reading status in any process."""
+    if not os.path.isdir(state_dir):
+        return []
+    return [(name[:-5], LogFollower(os.path.join(data_dir, name[:-5]), sink=None, state_dir=state_dir))
+            for name in sorted(os.listdir(state_dir)) if name.endswith(".json")]
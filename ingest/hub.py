@@ -0,0 +1,368 @@
+"""Cross-site hub: merges site summary exports and answers trend queries.
+
+Sites send exports made by ingest.summary; no raw logs leave a site.
+Each file summary is stored under <hub_dir>/sites/<site>/ and merged into
+that site's aggregate and the global one, so an import costs one merge
+however many came before it. A file whose contents changed since its
+last export replaces the earlier summary, and only that site's aggregate
+is rebuilt. Queries read the in-memory aggregates.
+
+Several API workers can share one hub directory: each picks up files
+stored by the others on its next `refresh`. Imports hold an exclusive
+lock on <hub_dir>/.lock and refreshes a shared one, so a refresh never
+sees a summary halfway through being replaced. Exports are validated
+in full before anything is written.
+
+    python -m ingest.hub import exports/*.json
+    python -m ingest.hub watch --inbox data/hub/inbox
+    python -m ingest.hub rising --days 7
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from urllib.parse import quote, unquote
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ingest.summary import FORMAT_VERSION, LogSummary, day_key
+
+try:
+    import fcntl
+except ImportError:
+    # No cross-process lock on Windows; run a single API worker there
+    fcntl = None
+
+HUB_DIR = os.getenv("PLC_HUB_DIR", "data/hub")
+REFRESH_S = float(os.getenv("PLC_HUB_REFRESH_S", "2"))
+SITE_NAME = re.compile(r"[A-Za-z0-9_.-]{1,64}")
+DIGEST = re.compile(r"[0-9a-f]{64}")
+# Quoted file name length, well inside the usual 255 byte limit with the digest
+MAX_FILE_NAME = 150
+
+def _safe(name: str) -> str:
+    return quote(name, safe="")
+
+def validate_export(export) -> tuple[str, list[tuple[dict, LogSummary]]]:
+    """Checks a whole site export; returns the site and each entry with its parsed summary."""
+    if not isinstance(export, dict):
+        raise ValueError("Export must be a JSON object")
+    if export.get("format") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported export format: {export.get('format')}")
+    site = export.get("site")
+    if not isinstance(site, str) or not SITE_NAME.fullmatch(site) or site in (".", ".."):
+        raise ValueError(f"Invalid site: {site!r} (use letters, digits, '_', '.' and '-')")
+    files = export.get("files", [])
+    if not isinstance(files, list):
+        raise ValueError("Export files must be a list")
+    entries, seen = [], set()
+    for entry in files:
+        if not isinstance(entry, dict):
+            raise ValueError("Each exported file must be an object")
+        file, digest = entry.get("file"), entry.get("digest")
+        if not isinstance(file, str) or not file or len(_safe(file)) > MAX_FILE_NAME:
+            raise ValueError(f"Invalid file name: {file!r}")
+        if file in seen:
+            raise ValueError(f"File exported twice: {file}")
+        seen.add(file)
+        if not isinstance(digest, str) or not DIGEST.fullmatch(digest):
+            raise ValueError(f"Invalid digest for {file}: expected 64 hex characters")
+        try:
+            summary = LogSummary.from_dict(entry["summary"])
+            # Sketch sizes, buckets and windows must match the hub's to merge
+            LogSummary().merge(summary)
+        except Exception as e:
+            raise ValueError(f"Invalid summary for {file}: {e}")
+        entries.append((entry, summary))
+    return site, entries
+
+def _write_json(path: str, data: dict):
+    """Writes next to `path` and renames into place, so readers never see half a file."""
+    directory, name = os.path.split(path)
+    # Not ending in .json, so a crash never leaves something that looks stored
+    tmp = os.path.join(directory, f".{name}.{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+def _utc(ts: int) -> datetime:
+    return datetime.fromtimestamp(ts, timezone.utc)
+
+class SummaryHub:
+    def __init__(self, hub_dir: str = HUB_DIR):
+        self.hub_dir = hub_dir
+        self.total = LogSummary()
+        self.sites: dict[str, LogSummary] = {}
+        # site -> file -> digest of the summary merged in
+        self.files: dict[str, dict[str, str]] = {}
+        self.lock = threading.RLock()
+        self._refreshed = 0.0
+        self.refresh(max_age_s=0)
+
+    def _site_dir(self, site: str) -> str:
+        return os.path.join(self.hub_dir, "sites", _safe(site))
+
+    @contextmanager
+    def _hub_lock(self, exclusive: bool):
+        """Inter-process lock on the hub directory; callers hold self.lock first."""
+        os.makedirs(self.hub_dir, exist_ok=True)
+        with open(os.path.join(self.hub_dir, ".lock"), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            # Closing the file drops the lock
+            yield
+
+    def _stored(self) -> dict[tuple[str, str], tuple[str, str]]:
+        """(site, file) -> (digest, path) of every stored summary."""
+        stored, mtimes = {}, {}
+        sites_dir = os.path.join(self.hub_dir, "sites")
+        if not os.path.isdir(sites_dir):
+            return stored
+        for site_name in os.listdir(sites_dir):
+            for name in os.listdir(os.path.join(sites_dir, site_name)):
+                if not name.endswith(".json"):
+                    continue
+                file_name, _, digest = name[:-5].rpartition("@")
+                path = os.path.join(sites_dir, site_name, name)
+                try:
+                    mtime = os.path.getmtime(path)
+                except FileNotFoundError:
+                    continue
+                key = (unquote(site_name), unquote(file_name))
+                # Without the lock (no fcntl) a replace can briefly leave both files
+                if key not in stored or mtime > mtimes[key]:
+                    stored[key], mtimes[key] = (digest, path), mtime
+        return stored
+
+    def refresh(self, max_age_s: float = REFRESH_S) -> int:
+        """Merges summaries other processes stored since the last refresh."""
+        if time.monotonic() - self._refreshed < max_age_s:
+            return 0
+        with self.lock, self._hub_lock(exclusive=False):
+            return self._refresh()
+
+    def _refresh(self) -> int:
+        applied = 0
+        for (site, file), (digest, path) in self._stored().items():
+            if self.files.get(site, {}).get(file) == digest:
+                continue
+            try:
+                with open(path, "r") as f:
+                    entry = json.load(f)
+            except FileNotFoundError:
+                continue
+            self._apply(site, entry)
+            applied += 1
+        self._refreshed = time.monotonic()
+        return applied
+
+    def _apply(self, site: str, entry: dict, summary: Optional[LogSummary] = None) -> str:
+        if summary is None:
+            summary = LogSummary.from_dict(entry["summary"])
+        known = self.files.setdefault(site, {}).get(entry["file"])
+        self.files[site][entry["file"]] = entry["digest"]
+        if known is None:
+            self.sites.setdefault(site, LogSummary(bucket_s=summary.bucket_s, window_s=summary.window_s)).merge(summary)
+            self.total.merge(summary)
+            return "added"
+        self._rebuild(site)
+        return "replaced"
+
+    def _rebuild(self, site: str):
+        """Re-merges a site from its stored files, then the total from the sites."""
+        aggregate = LogSummary()
+        for (stored_site, file), (digest, path) in self._stored().items():
+            if stored_site == site and self.files[site].get(file) == digest:
+                try:
+                    with open(path, "r") as f:
+                        aggregate.merge(LogSummary.from_dict(json.load(f)["summary"]))
+                except FileNotFoundError:
+                    continue
+        self.sites[site] = aggregate
+        self.total = LogSummary()
+        for summary in self.sites.values():
+            self.total.merge(summary)
+
+    def import_export(self, export: dict) -> dict:
+        """Stores and merges every file summary of one site export."""
+        site, entries = validate_export(export)
+        result = {"site": site, "added": 0, "replaced": 0, "unchanged": 0}
+        with self.lock, self._hub_lock(exclusive=True):
+            self._refresh()
+            os.makedirs(self._site_dir(site), exist_ok=True)
+            for entry, summary in entries:
+                known = self.files.get(site, {}).get(entry["file"])
+                if known == entry["digest"]:
+                    result["unchanged"] += 1
+                    continue
+                path = os.path.join(self._site_dir(site), f"{_safe(entry['file'])}@{entry['digest']}.json")
+                _write_json(path, entry)
+                if known is not None:
+                    try:
+                        os.remove(os.path.join(self._site_dir(site), f"{_safe(entry['file'])}@{known}.json"))
+                    except FileNotFoundError:
+                        pass
+                result[self._apply(site, entry, summary)] += 1
+            # The site directory's mtime is the import time every worker sees
+            os.utime(self._site_dir(site))
+        return result
+
+    def _summary(self, site: Optional[str]) -> LogSummary:
+        if site is None:
+            return self.total
+        if site not in self.sites:
+            raise KeyError(f"Unknown site: {site}")
+        return self.sites[site]
+
+    def _imported_at(self, site: str) -> Optional[str]:
+        try:
+            return datetime.fromtimestamp(os.path.getmtime(self._site_dir(site))).isoformat()
+        except FileNotFoundError:
+            return None
+
+    def site_list(self) -> list[dict]:
+        with self.lock:
+            return [{
+                "site": site,
+                "files": len(self.files.get(site, {})),
+                "rows": summary.rows,
+                "first": _utc(summary.first_ts).isoformat() if summary.first_ts is not None else None,
+                "last": _utc(summary.last_ts).isoformat() if summary.last_ts is not None else None,
+                "top_alarm": summary.alarms.most_common(1)[0][0] if summary.alarms else None,
+                "imported_at": self._imported_at(site),
+            } for site, summary in sorted(self.sites.items())]
+
+    def top_alarms(self, n: int = 10, site: Optional[str] = None) -> list[dict]:
+        with self.lock:
+            summary = self._summary(site)
+            return [{"alarm": alarm, "count": count,
+                     "sites": sum(1 for s in self.sites.values() if s.alarms.get(alarm))}
+                    for alarm, count in summary.alarms.most_common(n)]
+
+    def alarm_trend(self, alarm: str, site: Optional[str] = None, days: Optional[int] = None) -> list[dict]:
+        """Daily counts of one alarm; estimates from the count-min sketch, never low."""
+        with self.lock:
+            summary = self._summary(site)
+            span = summary.days()
+            if days:
+                span = span[-days:]
+            return [{"day": day, "count": summary.sketch.estimate(day_key(alarm, day))} for day in span]
+
+    def rising(self, days: int = 7, n: int = 10, site: Optional[str] = None) -> list[dict]:
+        """Alarms with the largest increase over the last `days` against the `days` before."""
+        with self.lock:
+            summary = self._summary(site)
+            if summary.last_ts is None:
+                return []
+            end = _utc(summary.last_ts).date()
+            recent_days = [(end - timedelta(days=i)).isoformat() for i in range(days)]
+            previous_days = [(end - timedelta(days=days + i)).isoformat() for i in range(days)]
+            rows = []
+            for alarm in summary.alarms:
+                recent = sum(summary.sketch.estimate(day_key(alarm, d)) for d in recent_days)
+                previous = sum(summary.sketch.estimate(day_key(alarm, d)) for d in previous_days)
+                if recent > previous:
+                    rows.append({"alarm": alarm, "recent": recent, "previous": previous,
+                                 "increase": recent - previous,
+                                 "ratio": round(recent / previous, 2) if previous else None})
+            rows.sort(key=lambda r: -r["increase"])
+            return rows[:n]
+
+    def cooccurring(self, alarm: str, n: int = 10, site: Optional[str] = None) -> list[dict]:
+        """Alarms most often raised on the same machine within the window of `alarm`."""
+        with self.lock:
+            summary = self._summary(site)
+            partners = []
+            for key, count in summary.cooccurrence.items():
+                first, _, second = key.partition("|")
+                if alarm in (first, second):
+                    partners.append({"alarm": second if first == alarm else first, "count": count})
+            partners.sort(key=lambda p: -p["count"])
+            return partners[:n]
+
+    def hotspots(self, n: int = 10, site: Optional[str] = None) -> list[dict]:
+        """Most frequent (machine, alarm) pairs.
+
+        Machine names are only unique within a site, so across sites a
+        pair is the same machine name at several sites.
+        """
+        with self.lock:
+            summary = self._summary(site)
+            rows = []
+            for key, lower in summary.heavy.top(n):
+                machine, _, alarm = key.partition("|")
+                rows.append({"machine": machine, "alarm": alarm, "count": summary.sketch.estimate(key),
+                             "at_least": lower})
+            rows.sort(key=lambda r: -r["count"])
+            return rows
+
+    def machine_histogram(self, site: str, machine: str, bucket_s: int = 86400) -> list[dict]:
+        """Alarms per bucket for one machine, rolled up from the stored resolution."""
+        with self.lock:
+            summary = self._summary(site)
+            if machine not in summary.machines:
+                raise KeyError(f"Unknown machine at {site}: {machine}")
+            bucket_s = max(bucket_s, summary.bucket_s)
+            rolled = {}
+            for bucket, count in summary.machines[machine].items():
+                start = bucket - bucket % bucket_s
+                rolled[start] = rolled.get(start, 0) + count
+            return [{"start": _utc(start).isoformat(), "count": rolled[start]}
+                    for start in sorted(rolled)]
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"sites": len(self.sites), "files": sum(len(f) for f in self.files.values()),
+                    "rows": self.total.rows, "alarms": len(self.total.alarms)}
+
+def watch(hub: SummaryHub, inbox: str, interval_s: float = 30):
+    """Imports exports dropped into `inbox`, moving each to inbox/imported afterwards."""
+    done = os.path.join(inbox, "imported")
+    os.makedirs(done, exist_ok=True)
+    while True:
+        for name in sorted(os.listdir(inbox)):
+            path = os.path.join(inbox, name)
+            if not name.endswith(".json") or not os.path.isfile(path):
+                continue
+            try:
+                with open(path, "r") as f:
+                    result = hub.import_export(json.load(f))
+                print(f"Imported {name}: {result}")
+                shutil.move(path, os.path.join(done, name))
+            except ValueError as e:
+                print(f"Failed to import {name}: {e}")
+        time.sleep(interval_s)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cross-site hub for summary exports")
+    parser.add_argument("--hub-dir", default=HUB_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_cmd = commands.add_parser("import", help="Import export files")
+    import_cmd.add_argument("paths", nargs="+")
+    watch_cmd = commands.add_parser("watch", help="Import exports as they arrive in an inbox directory")
+    watch_cmd.add_argument("--inbox", default=os.path.join(HUB_DIR, "inbox"))
+    watch_cmd.add_argument("--interval-s", type=float, default=30)
+    rising_cmd = commands.add_parser("rising", help="Alarms rising across all sites")
+    rising_cmd.add_argument("--days", type=int, default=7)
+    rising_cmd.add_argument("-n", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    hub = SummaryHub(args.hub_dir)
+    if args.command == "import":
+        for path in args.paths:
+            with open(path, "r") as f:
+                print(f"{path}: {hub.import_export(json.load(f))}")
+    elif args.command == "watch":
+        watch(hub, args.inbox, args.interval_s)
+    else:
+        print(json.dumps(hub.rising(days=args.days, n=args.n), indent=2))
+
+if __name__ == "__main__":
+    main()
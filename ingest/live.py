@@ -0,0 +1,236 @@
+"""Push-based ingestion of alarm events.
+
+Events arrive from the HTTP/WebSocket endpoints or from an EventSource
+(an MQTT or OPC UA bridge), wait in a bounded queue, and are textualized
+and indexed in micro-batches by one worker thread. When indexing falls
+behind the queue fills up: HTTP publishers get a 429, blocking publishers
+wait, and anything that still does not fit is counted as dropped.
+"""
+import json
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Iterable, Optional
+
+import pandas as pd
+from prometheus_client import Counter, Gauge
+
+from ingest.textualize import Textualizer
+
+LIVE_EVENTS = Counter("live_events_total", "Live alarm events by outcome", ["outcome"])
+LIVE_QUEUE_DEPTH = Gauge("live_queue_depth", "Live alarm events waiting to be indexed")
+# A single NDJSON event larger than this is rejected rather than buffered
+MAX_EVENT_BYTES = 64 * 1024
+
+def normalize_event(event: dict) -> dict:
+    """Maps an event onto the log columns Textualizer understands."""
+    if not isinstance(event, dict):
+        raise ValueError("Event must be a JSON object")
+    alarm = event.get("alarm") or event.get("alarm_code") or event.get("code")
+    if not alarm:
+        raise ValueError("Event has no alarm code")
+    row = {
+        "timestamp": event.get("timestamp") or event.get("time") or datetime.now().isoformat(timespec="seconds"),
+        "machine": event.get("machine") or event.get("machine_id") or "Unknown Machine",
+        "alarm": str(alarm),
+        # Every row has the column, so a batch mixing events with and without it stays uniform
+        "state": event.get("state"),
+    }
+    return row
+
+def parse_ndjson(lines: Iterable[str]) -> tuple[list[dict], int]:
+    """Events from NDJSON lines, plus the number of lines that were not valid events."""
+    events, invalid = [], 0
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            events.append(normalize_event(json.loads(line)))
+        except ValueError:
+            invalid += 1
+    return events, invalid
+
+class LiveIngestor:
+    def __init__(self, sink: Callable[[list[str]], None], max_queue: int = 10000,
+                 batch_size: int = 256, batch_window_s: float = 0.5):
+        self.sink = sink
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.batch_window_s = batch_window_s
+        self.textualizer = Textualizer()
+        self.events = queue.Queue(maxsize=max_queue)
+        self.counters = {"accepted": 0, "dropped": 0, "invalid": 0, "indexed": 0, "failed": 0, "batches": 0}
+        self.last_batch = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _count(self, outcome: str, n: int):
+        if n:
+            with self._lock:
+                self.counters[outcome] += n
+            LIVE_EVENTS.labels(outcome=outcome).inc(n)
+
+    def count_invalid(self, n: int):
+        """Records events that were rejected before reaching the queue."""
+        self._count("invalid", n)
+
+    def offer(self, events: list[dict], timeout: float = 0) -> tuple[int, int]:
+        """Queues normalized events; returns (accepted, dropped).
+
+        With timeout=0 nothing waits, which is what the HTTP endpoint wants so
+        it can answer 429 straight away. Bridges pass a timeout to block
+        while the queue drains.
+        """
+        deadline = time.monotonic() + timeout
+        accepted = 0
+        for event in events:
+            try:
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    self.events.put((time.monotonic(), event), timeout=remaining)
+                else:
+                    self.events.put_nowait((time.monotonic(), event))
+                accepted += 1
+            except queue.Full:
+                break
+        dropped = len(events) - accepted
+        self._count("accepted", accepted)
+        self._count("dropped", dropped)
+        LIVE_QUEUE_DEPTH.set(self.events.qsize())
+        return accepted, dropped
+
+    def _next_batch(self) -> list[tuple[float, dict]]:
+        try:
+            batch = [self.events.get(timeout=0.25)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.batch_window_s
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.events.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _index(self, batch: list[tuple[float, dict]]):
+        t0 = time.perf_counter()
+        try:
+            texts = self.textualizer.process_chunk(pd.DataFrame([event for _, event in batch]))
+            self.sink(texts)
+            self._count("indexed", len(batch))
+        except Exception as e:
+            self._count("failed", len(batch))
+            print(f"Live ingest batch of {len(batch)} failed: {e}")
+        self.counters["batches"] += 1
+        self.last_batch = {
+            "events": len(batch),
+            "seconds": round(time.perf_counter() - t0, 4),
+            # Time the oldest event in the batch spent queued before it was indexed
+            "lag_s": round(time.monotonic() - batch[0][0], 4),
+        }
+        LIVE_QUEUE_DEPTH.set(self.events.qsize())
+
+    def drain(self):
+        """Indexes everything queued so far on the calling thread."""
+        while not self.events.empty():
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.events.get_nowait())
+                except queue.Empty:
+                    break
+            if batch:
+                self._index(batch)
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._next_batch()
+            if batch:
+                self._index(batch)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="live-ingest", daemon=True)
+        self._thread.start()
+
+    def stop(self, drain: bool = True):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if drain:
+            self.drain()
+
+    def stats(self) -> dict:
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "queue_depth": self.events.qsize(),
+            "queue_capacity": self.max_queue,
+            **self.counters,
+            "last_batch": self.last_batch,
+        }
+
+class EventSource:
+    """Interface for bridges that push events from the plant network.
+
+    A bridge (MQTT subscriber, OPC UA monitored items) calls `publish` with
+    raw event dicts from its own thread; `start`/`stop` connect and
+    disconnect it. `publish` blocks for up to `timeout` when the queue is full,
+    which lets the broker's flow control slow the producer down.
+    """
+
+    def __init__(self, ingestor: LiveIngestor, timeout: float = 1.0):
+        self.ingestor = ingestor
+        self.timeout = timeout
+
+    def publish(self, raw_events: Iterable[dict]) -> tuple[int, int]:
+        events, invalid = [], 0
+        for raw in raw_events:
+            try:
+                events.append(normalize_event(raw))
+            except ValueError:
+                invalid += 1
+        self.ingestor.count_invalid(invalid)
+        return self.ingestor.offer(events, timeout=self.timeout)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+class InProcessPublisher(EventSource):
+    """EventSource driven directly from Python, for tests and benchmarks.
+
+    `replay` publishes events at a fixed rate from a background thread,
+    the way a bridge would.
+    """
+
+    def __init__(self, ingestor: LiveIngestor, timeout: float = 0):
+        super().__init__(ingestor, timeout)
+        self.results = []
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def replay(self, events: list[dict], rate_per_s: float = 0, batch: int = 1):
+        def run():
+            for i in range(0, len(events), batch):
+                if self._stop.is_set():
+                    return
+                self.results.append(self.publish(events[i:i + batch]))
+                if rate_per_s:
+                    time.sleep(batch / rate_per_s)
+        self._thread = threading.Thread(target=run, name="live-publisher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
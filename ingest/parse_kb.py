@@ -1,21 +1,45 @@
 import os
+import re
 import pandas as pd
-from typing import List
+from typing import Iterable, Iterator, List
 from langchain_core.documents import Document
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-import fitz  # PyMuPDF
-from docx import Document as DocxDocument
+
+# PyMuPDF, python-docx, openpyxl and the LangChain splitters are slow to
+# import, so each is loaded the first time a file that needs it is processed.
+
+# Columns of I/O lists whose values are looked up verbatim (PX_101, %I0.1, DB10.DBX2.1)
+TAG_COLUMN = re.compile(r"\b(tag|tags|address|addr|symbol|i/?o point)\b", re.IGNORECASE)
+# Chunks handed to the indexer at a time, so a large KB is never held in memory whole
+BATCH_SIZE = int(os.getenv("PLC_KB_BATCH_SIZE", "256"))
+
+def _cell(value) -> str:
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return ""
+    return str(value).replace("\n", " ").replace("|", "\\|").strip()
+
+def _table_row(cells: Iterable[str]) -> str:
+    return "| " + " | ".join(cells) + " |"
 
 class KnowledgeBaseIngestor:
-    def __init__(self):
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=100,
-            separators=["\n\n", "\n", " ", ""]
-        )
+    def __init__(self, chunk_size: int = 1000, max_rows_per_chunk: int = 50):
+        self.chunk_size = chunk_size
+        self.max_rows_per_chunk = max_rows_per_chunk
+        self._text_splitter = None
+
+    @property
+    def text_splitter(self):
+        if self._text_splitter is None:
+            from langchain_text_splitters import RecursiveCharacterTextSplitter
+            self._text_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=self.chunk_size,
+                chunk_overlap=100,
+                separators=["\n\n", "\n", " ", ""]
+            )
+        return self._text_splitter
 
     def parse_pdf(self, file_path: str) -> List[Document]:
         """Parses PDF and extracts text + basic table structure."""
+        import fitz  # PyMuPDF
         docs = []
         doc = fitz.open(file_path)
         for page_num, page in enumerate(doc):
@@ -33,26 +57,112 @@ class KnowledgeBaseIngestor:
                 ))
         return docs
 
-    def parse_excel(self, file_path: str) -> List[Document]:
-        """Parses Excel and converts to markdown tables for LLM reasoning."""
-        docs = []
-        xl = pd.ExcelFile(file_path)
-        for sheet_name in xl.sheet_names:
-            df = xl.parse(sheet_name)
-            # Convert to markdown for high-fidelity table reasoning
-            md_table = df.to_markdown(index=False)
-            docs.append(Document(
-                page_content=f"Sheet: {sheet_name}\n\n{md_table}",
-                metadata={
-                    "source": os.path.basename(file_path),
-                    "sheet": sheet_name,
-                    "type": "excel"
-                }
-            ))
-        return docs
+    def sheet_documents(self, rows: Iterable[tuple], sheet_name: str, source: str) -> Iterator[Document]:
+        """Groups sheet rows into table chunks that each repeat the header.
+
+        Rows are consumed one at a time, so only the current chunk is held
+        in memory, and a row is never split across chunks. Up to five
+        single-cell rows above the table are taken as titles; if the sheet
+        never gets wider than one column they are its header and rows.
+        """
+        header, widths, header_size = None, 0, 0
+        group, group_start, group_end, size = [], 0, 0, 0
+        tag_columns = ""
+        titles = []  # (row number, cells) of single-cell rows above the header
+
+        def flush():
+            title = f"Sheet: {sheet_name} (rows {group_start}-{group_end})"
+            if titles:
+                title += " - " + " / ".join(next(c for c in cells if c) for _, cells in titles)
+            table = [_table_row(header), _table_row(["---"] * widths)] + group
+            metadata = {"source": source, "sheet": sheet_name, "type": "excel",
+                        "row_start": group_start, "row_end": group_end}
+            if tag_columns:
+                metadata["tag_columns"] = tag_columns
+            return Document(page_content=title + "\n\n" + "\n".join(table), metadata=metadata)
+
+        def set_header(cells: list[str]):
+            nonlocal header, widths, tag_columns, header_size
+            widths = max(i + 1 for i, c in enumerate(cells) if c)
+            header = [c or f"Column {i + 1}" for i, c in enumerate(cells[:widths])]
+            tag_columns = ",".join(h for h in header if TAG_COLUMN.search(h))
+            header_size = len(_table_row(header)) * 2
+
+        def add(row_number: int, cells: list[str]) -> Iterator[Document]:
+            nonlocal group, group_start, group_end, size, widths, header_size
+            used = max(i + 1 for i, c in enumerate(cells) if c)
+            if used > widths:
+                # Cells past the header get their own columns; rows already
+                # grouped keep the narrower header
+                if group:
+                    yield flush()
+                    group = []
+                header.extend(f"Column {i + 1}" for i in range(widths, used))
+                widths = used
+                header_size = len(_table_row(header)) * 2
+            line = _table_row((cells + [""] * widths)[:widths])
+            if group and (size + len(line) > self.chunk_size or len(group) >= self.max_rows_per_chunk):
+                yield flush()
+                group = []
+            if not group:
+                group_start, size = row_number, header_size
+            group.append(line)
+            group_end = row_number
+            size += len(line) + 1
+
+        def single_column() -> Iterator[Document]:
+            # Every row so far had one cell: the first is the header, not a title
+            nonlocal titles
+            buffered, titles = titles, []
+            set_header(buffered[0][1])
+            for row_number, cells in buffered[1:]:
+                yield from add(row_number, cells)
+
+        for row_number, row in enumerate(rows, start=1):
+            cells = [_cell(v) for v in row]
+            if not any(cells):
+                continue
+            if header is None:
+                if sum(1 for c in cells if c) == 1:
+                    if len(titles) < 5:
+                        titles.append((row_number, cells))
+                        continue
+                    yield from single_column()
+                else:
+                    set_header(cells)
+                    continue
+            yield from add(row_number, cells)
+        if header is None and titles:
+            yield from single_column()
+        if group:
+            yield flush()
+
+    def parse_excel(self, file_path: str) -> Iterator[Document]:
+        """Streams Excel sheets as row-group table chunks.
+
+        .xlsx is read with openpyxl in read-only mode, which never loads a
+        whole sheet. Legacy .xls has no streaming reader, so it goes through
+        pandas one sheet at a time.
+        """
+        source = os.path.basename(file_path)
+        if file_path.lower().endswith(".xls"):
+            xl = pd.ExcelFile(file_path)
+            for sheet_name in xl.sheet_names:
+                df = xl.parse(sheet_name, header=None)
+                yield from self.sheet_documents(df.itertuples(index=False, name=None), sheet_name, source)
+            return
+
+        from openpyxl import load_workbook
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            for sheet in workbook.worksheets:
+                yield from self.sheet_documents(sheet.iter_rows(values_only=True), sheet.title, source)
+        finally:
+            workbook.close()
 
     def parse_docx(self, file_path: str) -> List[Document]:
         """Parses Word/Docx files."""
+        from docx import Document as DocxDocument
         docs = []
         doc = DocxDocument(file_path)
         full_text = []
@@ -70,7 +180,7 @@ class KnowledgeBaseIngestor:
             ))
         return docs
 
-    def process_file(self, file_path: str) -> List[Document]:
+    def process_file(self, file_path: str) -> Iterator[Document]:
         """Processes a file based on its extension."""
         ext = os.path.splitext(file_path)[1].lower()
         raw_docs = []
@@ -78,20 +188,31 @@ class KnowledgeBaseIngestor:
         if ext == '.pdf':
             raw_docs = self.parse_pdf(file_path)
         elif ext in ['.xlsx', '.xls']:
-            raw_docs = self.parse_excel(file_path)
+            # Already chunked by rows; splitting again would cut rows off their header
+            yield from self.parse_excel(file_path)
+            return
         elif ext == '.docx':
             raw_docs = self.parse_docx(file_path)
         else:
-            return []
+            return
 
         # Split into chunks for vector indexing
-        return self.text_splitter.split_documents(raw_docs)
+        yield from self.text_splitter.split_documents(raw_docs)
 
-    def process_directory(self, directory: str) -> List[Document]:
-        """Processes all supported files in a directory."""
-        all_docs = []
+    def process_directory(self, directory: str) -> Iterator[Document]:
+        """Processes all supported files in a directory, one chunk at a time."""
         for root, _, files in os.walk(directory):
             for file in files:
                 file_path = os.path.join(root, file)
-                all_docs.extend(self.process_file(file_path))
-        return all_docs
+                yield from self.process_file(file_path)
+
+def batched(docs: Iterable[Document], size: int = BATCH_SIZE) -> Iterator[List[Document]]:
+    """Groups a chunk stream into lists of at most `size` for indexing."""
+    batch = []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
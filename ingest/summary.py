@@ -0,0 +1,319 @@
+"""Compact, mergeable summaries of alarm logs for the cross-site hub.
+
+Each site summarizes its log files chunk by chunk (as LogParser yields
+them) into:
+
+- exact alarm counts
+- a count-min sketch over (alarm, day) and (machine, alarm) keys
+- a Misra-Gries heavy-hitter summary of (machine, alarm) pairs
+- a co-occurrence matrix of alarms raised on the same machine within a window
+- per-machine time histograms
+
+Every part merges by addition, so the hub can combine any number of file
+summaries in any order and get the summary of the combined logs. Sketch
+dimensions are fixed per export format; summaries with different
+dimensions refuse to merge.
+
+    python -m ingest.summary --site warehouse_07 data/*.csv -o warehouse_07.json
+"""
+import argparse
+import base64
+import hashlib
+import json
+import os
+import sys
+import zlib
+from collections import Counter, defaultdict, deque
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+FORMAT_VERSION = 1
+SUMMARY_CACHE_DIR = "data/summaries"
+SITE_ID = os.getenv("PLC_SITE_ID", "site")
+
+TIMESTAMP_COLUMNS = ["timestamp", "time"]
+MACHINE_COLUMNS = ["machine", "machine_id"]
+ALARM_COLUMNS = ["alarm", "alarm_code", "code"]
+UNKNOWN_MACHINE = "unknown"
+EPOCH = pd.Timestamp(0, tz="UTC")
+
+def _first_column(df: pd.DataFrame, names: list[str]) -> Optional[str]:
+    return next((name for name in names if name in df.columns), None)
+
+def day_key(alarm: str, day: str) -> str:
+    return f"{alarm}@{day}"
+
+class CountMinSketch:
+    """Point counts of arbitrarily many keys in depth x width counters.
+
+    Estimates never undercount; they overcount by at most 2N/width with
+    probability 1 - 2^-depth, N being the total added. Keys are hashed with
+    blake2b, not hash(), so every process and site agrees on the cells.
+    """
+
+    def __init__(self, width: int = 2048, depth: int = 4, table: Optional[np.ndarray] = None):
+        self.width = width
+        self.depth = depth
+        self.table = table if table is not None else np.zeros((depth, width), dtype=np.int64)
+        self._rows = np.arange(depth)
+
+    def _cells(self, key: str) -> np.ndarray:
+        digest = hashlib.blake2b(key.encode(), digest_size=4 * self.depth).digest()
+        return np.frombuffer(digest, dtype="<u4") % self.width
+
+    def add(self, key: str, count: int = 1):
+        self.table[self._rows, self._cells(key)] += count
+
+    def estimate(self, key: str) -> int:
+        return int(self.table[self._rows, self._cells(key)].min())
+
+    def merge(self, other: "CountMinSketch"):
+        if (self.width, self.depth) != (other.width, other.depth):
+            raise ValueError(f"Cannot merge {other.depth}x{other.width} sketch into {self.depth}x{self.width}")
+        self.table += other.table
+
+    def to_dict(self) -> dict:
+        # Mostly zeros, so the compressed table is a small fraction of its raw size
+        packed = zlib.compress(self.table.astype("<i8").tobytes())
+        return {"width": self.width, "depth": self.depth, "table": base64.b64encode(packed).decode()}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "CountMinSketch":
+        raw = zlib.decompress(base64.b64decode(data["table"]))
+        table = np.frombuffer(raw, dtype="<i8").reshape(data["depth"], data["width"]).astype(np.int64)
+        return cls(data["width"], data["depth"], table)
+
+class HeavyHitters:
+    """Misra-Gries summary keeping at most k counters.
+
+    Every key seen more than total/(k+1) times is kept, with a count that
+    is low by at most that much. Merging adds the counters and subtracts
+    the (k+1)-th largest, which keeps the same guarantee over the union.
+    """
+
+    def __init__(self, k: int = 64, counts: Optional[dict] = None, total: int = 0):
+        self.k = k
+        self.counts: dict[str, int] = dict(counts or {})
+        self.total = total
+
+    def update(self, counts: dict):
+        """Adds exact counts, e.g. the value counts of one chunk."""
+        self._combine(counts)
+        self.total += sum(counts.values())
+
+    def merge(self, other: "HeavyHitters"):
+        if self.k != other.k:
+            raise ValueError(f"Cannot merge top-{other.k} summary into top-{self.k}")
+        self._combine(other.counts)
+        self.total += other.total
+
+    def _combine(self, counts: dict):
+        combined = Counter(self.counts)
+        combined.update(counts)
+        if len(combined) > self.k:
+            cut = sorted(combined.values(), reverse=True)[self.k]
+            combined = {key: n - cut for key, n in combined.items() if n > cut}
+        self.counts = dict(combined)
+
+    def top(self, n: int = 10) -> list[tuple[str, int]]:
+        return sorted(self.counts.items(), key=lambda item: -item[1])[:n]
+
+    def to_dict(self) -> dict:
+        return {"k": self.k, "total": self.total, "counts": self.counts}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "HeavyHitters":
+        return cls(data["k"], data["counts"], data["total"])
+
+class LogSummary:
+    """Mergeable summary of one or more alarm logs."""
+
+    def __init__(self, width: int = 2048, depth: int = 4, top_k: int = 64,
+                 bucket_s: int = 3600, window_s: int = 300):
+        self.rows = 0
+        self.first_ts: Optional[int] = None
+        self.last_ts: Optional[int] = None
+        self.alarms = Counter()
+        self.sketch = CountMinSketch(width, depth)
+        self.heavy = HeavyHitters(top_k)
+        # "A|B" with A < B -> times A and B were raised on the same machine within
+        # window_s of each other, in either order
+        self.cooccurrence = Counter()
+        # machine -> bucket start (epoch seconds) -> alarms
+        self.machines: dict[str, Counter] = defaultdict(Counter)
+        self.bucket_s = bucket_s
+        self.window_s = window_s
+        # Recent (ts, alarm) per machine, so windows span chunk boundaries
+        self._recent: dict[str, deque] = defaultdict(deque)
+
+    def add_chunk(self, df: pd.DataFrame):
+        """Adds one chunk of a log.
+
+        Rows within a chunk may be in any order. Co-occurrence windows carry
+        over between chunks, so the chunks themselves must come in time
+        order, as they do when a log is read front to back.
+        """
+        df = df.rename(columns=lambda c: str(c).strip().lower())
+        alarm_col = _first_column(df, ALARM_COLUMNS)
+        if alarm_col is None or df.empty:
+            return
+        df = df[df[alarm_col].notna()]
+        alarms = df[alarm_col].astype(str).str.strip()
+        machine_col = _first_column(df, MACHINE_COLUMNS)
+        machines = (df[machine_col].fillna(UNKNOWN_MACHINE).astype(str).str.strip() if machine_col
+                    else pd.Series(UNKNOWN_MACHINE, index=df.index))
+
+        self.rows += len(df)
+        self.alarms.update(alarms.value_counts().to_dict())
+        pairs = (machines + "|" + alarms).value_counts().to_dict()
+        for key, n in pairs.items():
+            self.sketch.add(key, n)
+        self.heavy.update(pairs)
+
+        ts_col = _first_column(df, TIMESTAMP_COLUMNS)
+        if ts_col is None:
+            return
+        ts = pd.to_datetime(df[ts_col], errors="coerce", utc=True)
+        valid = ts.notna()
+        if not valid.any():
+            return
+        ts, alarms, machines = ts[valid], alarms[valid], machines[valid]
+        # Not astype(int64): the unit depends on how pandas parsed the column
+        seconds = ((ts - EPOCH) // pd.Timedelta(seconds=1)).to_numpy(dtype=np.int64)
+        self.first_ts = int(seconds.min()) if self.first_ts is None else min(self.first_ts, int(seconds.min()))
+        self.last_ts = int(seconds.max()) if self.last_ts is None else max(self.last_ts, int(seconds.max()))
+
+        days = ts.dt.strftime("%Y-%m-%d")
+        for key, n in (alarms + "@" + days).value_counts().to_dict().items():
+            self.sketch.add(key, n)
+        buckets = pd.DataFrame({"machine": machines.to_numpy(), "bucket": seconds - seconds % self.bucket_s})
+        for (machine, bucket), n in buckets.value_counts().to_dict().items():
+            self.machines[machine][int(bucket)] += n
+        # Windows are walked forwards in time; stable, so ties keep file order
+        order = np.argsort(seconds, kind="stable")
+        self._add_cooccurrence(machines.to_numpy()[order], alarms.to_numpy()[order], seconds[order])
+
+    def _add_cooccurrence(self, machines, alarms, seconds):
+        """Counts pairs per machine; expects rows sorted by time."""
+        for machine, alarm, t in zip(machines, alarms, seconds):
+            recent = self._recent[machine]
+            while recent and t - recent[0][0] > self.window_s:
+                recent.popleft()
+            for other in {a for _, a in recent if a != alarm}:
+                self.cooccurrence["|".join(sorted((alarm, other)))] += 1
+            recent.append((t, alarm))
+
+    def merge(self, other: "LogSummary"):
+        if (self.bucket_s, self.window_s) != (other.bucket_s, other.window_s):
+            raise ValueError("Cannot merge summaries with different buckets or windows")
+        self.sketch.merge(other.sketch)
+        self.heavy.merge(other.heavy)
+        self.rows += other.rows
+        self.alarms.update(other.alarms)
+        self.cooccurrence.update(other.cooccurrence)
+        for machine, histogram in other.machines.items():
+            self.machines[machine].update(histogram)
+        if other.first_ts is not None:
+            self.first_ts = other.first_ts if self.first_ts is None else min(self.first_ts, other.first_ts)
+            self.last_ts = other.last_ts if self.last_ts is None else max(self.last_ts, other.last_ts)
+
+    def days(self) -> list[str]:
+        if self.first_ts is None:
+            return []
+        days = pd.date_range(datetime.fromtimestamp(self.first_ts, timezone.utc).date(),
+                             datetime.fromtimestamp(self.last_ts, timezone.utc).date(), freq="D")
+        return [d.strftime("%Y-%m-%d") for d in days]
+
+    def to_dict(self) -> dict:
+        return {
+            "rows": self.rows,
+            "first_ts": self.first_ts,
+            "last_ts": self.last_ts,
+            "bucket_s": self.bucket_s,
+            "window_s": self.window_s,
+            "alarms": dict(self.alarms),
+            "sketch": self.sketch.to_dict(),
+            "heavy": self.heavy.to_dict(),
+            "cooccurrence": dict(self.cooccurrence),
+            "machines": {m: {str(b): n for b, n in h.items()} for m, h in self.machines.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LogSummary":
+        summary = cls(bucket_s=data["bucket_s"], window_s=data["window_s"])
+        summary.rows = data["rows"]
+        summary.first_ts = data["first_ts"]
+        summary.last_ts = data["last_ts"]
+        summary.alarms = Counter(data["alarms"])
+        summary.sketch = CountMinSketch.from_dict(data["sketch"])
+        summary.heavy = HeavyHitters.from_dict(data["heavy"])
+        summary.cooccurrence = Counter(data["cooccurrence"])
+        for machine, histogram in data["machines"].items():
+            summary.machines[machine] = Counter({int(b): n for b, n in histogram.items()})
+        return summary
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def summary_layout(summary: LogSummary) -> dict:
+    """Everything that decides whether two summaries can be merged."""
+    return {"format": FORMAT_VERSION, "width": summary.sketch.width, "depth": summary.sketch.depth,
+            "top_k": summary.heavy.k, "bucket_s": summary.bucket_s, "window_s": summary.window_s}
+
+def summarize_file(path: str, cache_dir: Optional[str] = SUMMARY_CACHE_DIR, chunksize: int = 10000) -> dict:
+    """Summary entry for one log file; unchanged files are served from the cache."""
+    from ingest.parse_logs import LogParser
+
+    digest = file_digest(path)
+    summary = LogSummary()
+    # Keyed by the summary layout too, so changed defaults never serve a summary the hub cannot merge
+    layout = hashlib.sha256(json.dumps(summary_layout(summary), sort_keys=True).encode()).hexdigest()[:12]
+    cached = os.path.join(cache_dir, f"{digest}-{layout}.json") if cache_dir else None
+    if cached and os.path.exists(cached):
+        with open(cached, "r") as f:
+            entry = json.load(f)
+        return {**entry, "file": os.path.normpath(path)}
+
+    for chunk in LogParser(path, chunksize=chunksize).parse():
+        summary.add_chunk(chunk)
+    entry = {"file": os.path.normpath(path), "digest": digest, "bytes": os.path.getsize(path),
+             "summary": summary.to_dict()}
+    if cached:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(cached, "w") as f:
+            json.dump(entry, f)
+    return entry
+
+def export_site(paths: Iterable[str], site: str = SITE_ID, cache_dir: Optional[str] = SUMMARY_CACHE_DIR) -> dict:
+    """One export per site: a summary entry per log file, nothing raw."""
+    files = []
+    for path in paths:
+        try:
+            files.append(summarize_file(path, cache_dir=cache_dir))
+        except (ValueError, FileNotFoundError) as e:
+            print(f"Skipping {path}: {e}")
+    return {"format": FORMAT_VERSION, "site": site, "created_at": datetime.now().isoformat(), "files": files}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export mergeable log summaries for the cross-site hub")
+    parser.add_argument("paths", nargs="+", help="CSV or JSON log files")
+    parser.add_argument("--site", default=SITE_ID)
+    parser.add_argument("-o", "--output", required=True)
+    args = parser.parse_args(argv)
+
+    export = export_site(args.paths, site=args.site)
+    with open(args.output, "w") as f:
+        json.dump(export, f)
+    print(f"Exported {len(export['files'])} file summaries for {args.site} to {args.output}")
+
+if __name__ == "__main__":
+    main()
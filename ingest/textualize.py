@@ -20,7 +20,9 @@ class Textualizer:
         
         if "state" in cols:
             state = row.get("state")
-            text += f" The machine state was recorded as '{state}'."
+            # Rows without a state come through as None/NaN or an empty cell
+            if not pd.isna(state) and str(state).strip():
+                text += f" The machine state was recorded as '{state}'."
             
         return text
 
@@ -0,0 +1,236 @@
+import json
+import os
+import re
+import threading
+from typing import List, Optional
+
+from langchain_core.documents import Document
+
+# Alarm/fault codes as they appear in manuals and logs: ALM_3021, INF_100, E_50
+CODE_PATTERN = re.compile(r"\b[A-Z][A-Z0-9]*_\d+\b")
+# Anything code-shaped in a free-text query; matched case-insensitively
+QUERY_TOKEN = re.compile(r"\b[A-Za-z][A-Za-z0-9]*_\d+\b")
+
+# Tags and I/O addresses in a query: whitespace-separated, with surrounding punctuation dropped
+TAG_TOKEN = re.compile(r"[^\s,;()\[\]\"'`]+")
+
+MAX_KB_MENTIONS = 20
+MAX_HISTORY = 10
+MAX_TAG_ROWS = 5
+
+def manual_text(item: dict) -> str:
+    """Rich text representation of one manual/knowledge base entry."""
+    return f"Fault Code: {item.get('fault', 'N/A')}. " \
+           f"Description: {item.get('description', '')}. " \
+           f"Diagnosis: {item.get('diagnosis', '')}. " \
+           f"Resolution: {item.get('resolution', '')}."
+
+def extract_codes(text: str) -> list[str]:
+    """Code-shaped tokens in a query, upper-cased, in order of appearance."""
+    seen = []
+    for token in QUERY_TOKEN.findall(text or ""):
+        code = token.upper()
+        if code not in seen:
+            seen.append(code)
+    return seen
+
+def extract_tags(text: str) -> list[str]:
+    """Candidate tag/address tokens in a query, upper-cased."""
+    seen = []
+    for token in TAG_TOKEN.findall(text or ""):
+        tag = token.rstrip(".:").upper()
+        if tag and tag not in seen:
+            seen.append(tag)
+    return seen
+
+def _split_row(line: str) -> list[str]:
+    return [c.strip() for c in re.split(r"(?<!\\)\|", line.strip())[1:-1]]
+
+def table_tags(doc: Document) -> list[tuple[str, str]]:
+    """(tag, header + row) pairs from a row-group chunk with tag columns.
+
+    Chunks come from KnowledgeBaseIngestor.sheet_documents, which records
+    the tag column names in metadata["tag_columns"].
+    """
+    columns = set((doc.metadata.get("tag_columns") or "").split(","))
+    lines = [l for l in doc.page_content.splitlines() if l.startswith("|")]
+    if not columns or len(lines) < 3:
+        return []
+    header = _split_row(lines[0])
+    positions = [i for i, name in enumerate(header) if name in columns]
+    pairs = []
+    for line in lines[2:]:
+        cells = _split_row(line)
+        for i in positions:
+            tag = cells[i].replace("\\|", "|").upper() if i < len(cells) else ""
+            # Plain words (SPARE) and bare numbers would match ordinary query text
+            if any(ch.isdigit() for ch in tag) and not tag.isdigit():
+                pairs.append((tag, f"{lines[0]}\n{line}"))
+    return pairs
+
+class CodeHits:
+    """Everything the code index knows about the codes and tags in one query."""
+
+    def __init__(self, codes: List[str], manual: List[Document], related: List[Document],
+                 tags: Optional[List[str]] = None):
+        self.codes = codes
+        self.manual = manual
+        self.related = related
+        self.tags = tags or []
+
+    def __bool__(self):
+        return bool(self.manual or self.related)
+
+    @property
+    def exact(self) -> bool:
+        """True when a manual entry answers the code, so search can be skipped."""
+        return bool(self.manual)
+
+class CodeIndex:
+    """In-memory alarm code -> manual entries, KB mentions and prior diagnoses.
+
+    Consulted before semantic search so the most common query shape, a log
+    row containing an alarm code, is answered with a dictionary lookup.
+    I/O list tags and addresses map to their rows the same way. Persisted
+    as JSON next to the other data files.
+    """
+
+    def __init__(self, path: str = "data/code_index.json"):
+        self.path = path
+        self.codes: dict[str, dict] = {}
+        self.tags: dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, code: str) -> dict:
+        return self.codes.setdefault(code, {"manual": [], "kb": [], "history": []})
+
+    def load(self) -> bool:
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, "r") as f:
+            try:
+                data = json.load(f)
+            except ValueError:
+                return False
+        with self._lock:
+            self.codes = data.get("codes", {})
+            self.tags = data.get("tags", {})
+        return True
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with self._lock:
+            with open(tmp_path, "w") as f:
+                json.dump({"codes": self.codes, "tags": self.tags}, f)
+            os.replace(tmp_path, self.path)
+
+    def add_manuals(self, json_path: str) -> int:
+        """Indexes the structured fault manual; returns the number of codes added."""
+        if not os.path.exists(json_path):
+            return 0
+        with open(json_path, "r") as f:
+            data = json.load(f)
+        count = 0
+        with self._lock:
+            for item in data:
+                code = str(item.get("fault", "")).upper()
+                if not code:
+                    continue
+                entry = self._entry(code)
+                text = manual_text(item)
+                if text not in entry["manual"]:
+                    entry["manual"].append(text)
+                    count += 1
+        return count
+
+    def add_documents(self, documents: List[Document]) -> int:
+        """Records which KB segments mention which codes, and the rows of tag columns."""
+        count = 0
+        with self._lock:
+            for doc in documents:
+                if doc.metadata.get("tag_columns"):
+                    metadata = {k: v for k, v in doc.metadata.items() if k != "tag_columns"}
+                    for tag, text in table_tags(doc):
+                        rows = self.tags.setdefault(tag, [])
+                        if len(rows) < MAX_TAG_ROWS and all(r["text"] != text for r in rows):
+                            rows.append({"text": text, "metadata": metadata})
+                            count += 1
+                source = doc.metadata.get("source")
+                for code in set(CODE_PATTERN.findall(doc.page_content)):
+                    mentions = self._entry(code)["kb"]
+                    # Re-processing the KB yields the same chunks again
+                    if len(mentions) >= MAX_KB_MENTIONS or any(
+                            m["text"] == doc.page_content and m["metadata"].get("source") == source
+                            for m in mentions):
+                        continue
+                    mentions.append({"text": doc.page_content, "metadata": doc.metadata})
+                    count += 1
+        return count
+
+    def add_history(self, entry: dict) -> int:
+        """Indexes a saved diagnosis under the codes in its query."""
+        structured = (entry.get("result") or {}).get("structured") or {}
+        record = {
+            "timestamp": entry.get("timestamp"),
+            "filename": entry.get("filename"),
+            "summary": structured.get("summary", ""),
+            "root_cause": structured.get("root_cause", ""),
+        }
+        # Case-sensitive on purpose: keeps machine names like Machine_3 out
+        codes = list(dict.fromkeys(CODE_PATTERN.findall(entry.get("query", ""))))
+        with self._lock:
+            for code in codes:
+                history = self._entry(code)["history"]
+                history.append(record)
+                del history[:-MAX_HISTORY]
+        return len(codes)
+
+    def add_history_file(self, history_path: str) -> int:
+        if not os.path.exists(history_path):
+            return 0
+        with open(history_path, "r") as f:
+            try:
+                data = json.load(f)
+            except ValueError:
+                return 0
+        return sum(self.add_history(entry) for entry in data)
+
+    def lookup(self, query: str) -> Optional[CodeHits]:
+        """Returns the indexed evidence for every known code and tag in the query."""
+        found_codes = extract_codes(query)
+        found_tags = extract_tags(query) if self.tags else []
+        # Ingest adds to these dicts from other threads
+        with self._lock:
+            codes = [c for c in found_codes if c in self.codes]
+            tags = [t for t in found_tags if t in self.tags]
+            if not codes and not tags:
+                return None
+            manual, related = [], []
+            for tag in tags:
+                related += [Document(page_content=r["text"], metadata={**r["metadata"], "tag": tag,
+                                                                       "content_type": "knowledge_base"})
+                            for r in self.tags[tag]]
+            for code in codes:
+                entry = self.codes[code]
+                manual += [Document(page_content=t, metadata={"source": "manual", "code": code})
+                           for t in entry["manual"]]
+                related += [Document(page_content=m["text"], metadata={**m["metadata"], "code": code,
+                                                                       "content_type": "knowledge_base"})
+                            for m in entry["kb"]]
+                related += [Document(page_content=f"Previous diagnosis ({h['timestamp']}, {h['filename']}): "
+                                                  f"{h['summary']} Root cause: {h['root_cause']}",
+                                     metadata={"source": "history", "code": code, "content_type": "history"})
+                            for h in reversed(entry["history"])]
+        hits = CodeHits(codes, manual, related, tags=tags)
+        return hits if hits else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "codes": len(self.codes),
+                "manual_entries": sum(len(e["manual"]) for e in self.codes.values()),
+                "kb_mentions": sum(len(e["kb"]) for e in self.codes.values()),
+                "history_entries": sum(len(e["history"]) for e in self.codes.values()),
+                "tags": len(self.tags),
+            }
@@ -0,0 +1,178 @@
+import os
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from langchain_core.documents import Document
+from prometheus_client import Counter
+
+from rag.tokens import estimate_tokens, CHARS_PER_TOKEN
+
+DEFAULT_CONTEXT_TOKENS = int(os.getenv("PLC_CONTEXT_TOKENS", "1200"))
+
+TOKENS_SAVED = Counter("context_tokens_saved_total", "Prompt tokens removed by context assembly")
+
+# Relative priority of evidence types when scores are otherwise close
+SOURCE_PRIOR = {
+    "manual": 0.3,
+    "knowledge_base": 0.15,
+    "history": 0.1,
+    "log": 0.0,
+}
+
+_TIMESTAMP = re.compile(r"\d{4}-\d{2}-\d{2}[ t]\d{2}:\d{2}(:\d{2})?(\.\d+)?")
+_NUMBER = re.compile(r"\b\d+(\.\d+)?\b")
+_WORD = re.compile(r"[a-z0-9_]+")
+
+def normalize(text: str) -> str:
+    """Lowercases and masks timestamps/numbers so repeated log lines compare equal."""
+    text = _TIMESTAMP.sub("<ts>", text.lower())
+    text = _NUMBER.sub("#", text)
+    return " ".join(text.split())
+
+def shingles(text: str, size: int = 3) -> set:
+    words = _WORD.findall(text)
+    if len(words) < size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+def jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+@dataclass
+class Candidate:
+    doc: Document
+    rank: int
+    text: str
+    shingles: set
+    score: float = 0.0
+    duplicates: int = 0
+
+@dataclass
+class AssembledContext:
+    docs: List[str] = field(default_factory=list)
+    tokens_in: int = 0
+    tokens_used: int = 0
+    dropped_duplicates: int = 0
+    dropped_budget: int = 0
+    truncated: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(self.tokens_in - self.tokens_used, 0)
+
+    def stats(self) -> dict:
+        return {
+            "tokens_in": self.tokens_in,
+            "tokens_used": self.tokens_used,
+            "tokens_saved": self.tokens_saved,
+            "documents": len(self.docs),
+            "dropped_duplicates": self.dropped_duplicates,
+            "dropped_budget": self.dropped_budget,
+            "truncated": self.truncated,
+        }
+
+class ContextAssembler:
+    """Deduplicates, reranks and packs retrieved evidence into a token budget."""
+
+    def __init__(self, max_tokens: int = DEFAULT_CONTEXT_TOKENS, max_chunk_tokens: int = 250,
+                 similarity_threshold: float = 0.8):
+        self.max_tokens = max_tokens
+        self.max_chunk_tokens = max_chunk_tokens
+        self.similarity_threshold = similarity_threshold
+
+    def dedupe(self, candidates: List[Candidate]) -> tuple[List[Candidate], int]:
+        """Collapses near-identical evidence into the best-ranked copy."""
+        kept: List[Candidate] = []
+        seen = {}
+        dropped = 0
+        for cand in candidates:
+            key = normalize(cand.text)
+            match = seen.get(key)
+            if match is None:
+                match = next((k for k in kept
+                              if jaccard(k.shingles, cand.shingles) >= self.similarity_threshold), None)
+            if match is not None:
+                match.duplicates += 1
+                dropped += 1
+                continue
+            seen[key] = cand
+            kept.append(cand)
+        return kept, dropped
+
+    def score(self, cand: Candidate, query_terms: set) -> float:
+        """Retrieval rank, query-term overlap and source type, combined."""
+        rank_score = 1.0 / (cand.rank + 1)
+        words = set(_WORD.findall(cand.text.lower()))
+        overlap = len(query_terms & words) / len(query_terms) if query_terms else 0.0
+        content_type = cand.doc.metadata.get("content_type") or cand.doc.metadata.get("source", "")
+        prior = SOURCE_PRIOR.get(content_type, 0.0)
+        # Repeated occurrences are evidence of a pattern, but only mildly so
+        recurrence = min(cand.duplicates, 5) * 0.02
+        return rank_score + overlap + prior + recurrence
+
+    def truncate(self, text: str, query_terms: set) -> tuple[str, bool]:
+        """Cuts an oversized chunk down to a window around the first query term."""
+        if estimate_tokens(text) <= self.max_chunk_tokens:
+            return text, False
+        width = self.max_chunk_tokens * CHARS_PER_TOKEN
+        lowered = text.lower()
+        hits = [lowered.find(t) for t in query_terms if len(t) > 2 and t in lowered]
+        start = max(min(hits) - width // 4, 0) if hits else 0
+        snippet = text[start:start + width].strip()
+        if start > 0:
+            snippet = "..." + snippet
+        if start + width < len(text):
+            snippet += "..."
+        return snippet, True
+
+    def assemble(self, query: str, documents: List[Document],
+                 max_tokens: Optional[int] = None,
+                 pinned: Optional[List[Document]] = None) -> AssembledContext:
+        """Returns the evidence to send to the generator, best first.
+
+        `pinned` documents (exact code matches) always come first and are
+        never dropped for budget; they only count against it.
+        """
+        budget = max_tokens or self.max_tokens
+        query_terms = set(_WORD.findall(query.lower()))
+        result = AssembledContext()
+
+        for doc in pinned or []:
+            text, was_truncated = self.truncate(doc.page_content.strip(), query_terms)
+            if not text or text in result.docs:
+                continue
+            result.tokens_in += estimate_tokens(doc.page_content)
+            result.tokens_used += estimate_tokens(text)
+            result.truncated += int(was_truncated)
+            result.docs.append(text)
+
+        candidates = []
+        for rank, doc in enumerate(documents):
+            text = doc.page_content.strip()
+            if not text:
+                continue
+            result.tokens_in += estimate_tokens(text)
+            candidates.append(Candidate(doc=doc, rank=rank, text=text, shingles=shingles(normalize(text))))
+
+        candidates, result.dropped_duplicates = self.dedupe(candidates)
+        for cand in candidates:
+            cand.score = self.score(cand, query_terms)
+        candidates.sort(key=lambda c: c.score, reverse=True)
+
+        for cand in candidates:
+            text, was_truncated = self.truncate(cand.text, query_terms)
+            if cand.duplicates:
+                text += f" (and {cand.duplicates} similar entries)"
+            cost = estimate_tokens(text)
+            if result.tokens_used + cost > budget:
+                result.dropped_budget += 1
+                continue
+            result.docs.append(text)
+            result.tokens_used += cost
+            result.truncated += int(was_truncated)
+
+        TOKENS_SAVED.inc(result.tokens_saved)
+        return result
@@ -1,33 +1,65 @@
-import chromadb
-from chromadb.utils import embedding_functions
 from langchain_chroma import Chroma
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_core.documents import Document
 import json
 import os
-import shutil
+import threading
+import time
+
+from rag.codes import manual_text
+
+COLLECTION_NAME = "plc_logs"
 
 class Indexer:
-    def __init__(self, persist_dir: str = "./chroma_db"):
+    def __init__(self, persist_dir: str = "./chroma_db", embeddings=None,
+                 collection_name: str = COLLECTION_NAME, collection_metadata: dict = None):
         self.persist_dir = persist_dir
+        self.collection_name = collection_name
+        # HNSW parameters only apply when the collection is created; see rag.lifecycle
+        self.collection_metadata = collection_metadata
         # Use HuggingFace embeddings via LangChain
-        self.embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+        self.embeddings = embeddings or HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+        # Held by writes and by maintenance (sweeps, rebuilds, snapshots)
+        self.lock = threading.RLock()
+        self.reopen()
+
+    def reopen(self):
+        """(Re)opens the collection, e.g. after a rebuild or restore swapped it."""
         self.vector_store = Chroma(
-            collection_name="plc_logs",
+            collection_name=self.collection_name,
             embedding_function=self.embeddings,
-            persist_directory=self.persist_dir
+            persist_directory=self.persist_dir,
+            collection_metadata=self.collection_metadata
         )
+
+    def close(self):
+        """Releases the store's files before they are swapped underneath us; reopen() after."""
+        # Chroma caches one client per directory and would keep serving the old files
+        from chromadb.api.client import SharedSystemClient
+        SharedSystemClient.clear_system_cache()
+
+    @property
+    def collection(self):
+        return self.vector_store._collection
+
+    def count(self) -> int:
+        return self.collection.count()
         
     def clear(self):
         """Clears the existing vector store."""
-        if os.path.exists(self.persist_dir):
-            self.vector_store.delete_collection()
-            # Re-init
-            self.vector_store = Chroma(
-                collection_name="plc_logs",
-                embedding_function=self.embeddings,
-                persist_directory=self.persist_dir
-            )
+        with self.lock:
+            if os.path.exists(self.persist_dir):
+                self.vector_store.delete_collection()
+                # Re-init
+                self.reopen()
+
+    def _add(self, documents: list[Document]):
+        # Retention policies select on ingested_at
+        now = time.time()
+        for doc in documents:
+            doc.metadata.setdefault("ingested_at", now)
+        with self.lock:
+            self.vector_store.add_documents(documents)
 
     def ingest_manuals(self, json_path: str):
         """Ingests structured manuals/fault knowledge base."""
@@ -41,10 +73,7 @@ class Indexer:
         documents = []
         for item in data:
             # Construct a rich text representation
-            content = f"Fault Code: {item.get('fault', 'N/A')}. " \
-                      f"Description: {item.get('description', '')}. " \
-                      f"Diagnosis: {item.get('diagnosis', '')}. " \
-                      f"Resolution: {item.get('resolution', '')}."
+            content = manual_text(item)
             
             documents.append(Document(
                 page_content=content,
@@ -52,18 +81,18 @@ class Indexer:
             ))
             
         if documents:
-            self.vector_store.add_documents(documents)
+            self._add(documents)
             print(f"Ingested {len(documents)} manual entries.")
 
-    def ingest_logs(self, log_texts: list[str]):
+    def ingest_logs(self, log_texts: list[str], metadata: dict = None):
         """Ingests textualized logs as historical context."""
         documents = [
-            Document(page_content=text, metadata={"source": "log_history", "content_type": "log"}) 
+            Document(page_content=text, metadata={"source": "log_history", "content_type": "log", **(metadata or {})})
             for text in log_texts
         ]
         
         if documents:
-            self.vector_store.add_documents(documents)
+            self._add(documents)
             print(f"Ingested {len(documents)} log entries.")
 
     def ingest_documents(self, documents: list[Document]):
@@ -74,6 +103,6 @@ class Indexer:
                 if "content_type" not in doc.metadata:
                     doc.metadata["content_type"] = "knowledge_base"
             
-            self.vector_store.add_documents(documents)
+            self._add(documents)
             print(f"Ingested {len(documents)} knowledge base documents.")
 
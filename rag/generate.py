@@ -1,50 +1,64 @@
-import ollama
-import re
-from typing import List
+import json
+from typing import Iterator, List, Optional
 
-class Generator:
-    def __init__(self, model: str = "mistral"):
-        self.model = model
+from rag.schema import EXPLANATION_SCHEMA, StructuredParser
+from rag.session import GenerationSession, get_session
 
-    def generate_explanation(self, query: str, context_docs: List[str]) -> str:
-        """Generates a structured fault explanation from retrieved context."""
-        context_str = "\n".join([f"- {doc}" for doc in context_docs])
-        
-        prompt = f"""You are an expert industrial automation AI assistant. 
+SYSTEM_PROMPT = """You are an expert industrial automation AI assistant.
 Your goal is to explain PLC faults to maintenance technicians based on the provided context.
 
-CONTEXT INFORMATION:
-{context_str}
-
-USER ALARM/LOG:
-{query}
-
 INSTRUCTIONS:
 Analyze the user alarm using the context information and provide a response in VALID JSON format with exactly these 5 categories:
 
-{{
+{
   "summary": "A clear, comprehensive explanation of the fault suitable for technical users (2-3 sentences)",
   "evidence": "Detailed explanation of which specific logs, manuals, or data points support this diagnosis and why they are relevant",
   "root_cause": "Thorough analysis of the most likely technical causes with technical details (e.g., sensor failure modes, wiring issues, logic errors, environmental factors)",
   "actions": "Provide a clean, numbered list (1., 2., 3.) with one step per line. Avoid using dots inside numbers (e.g., use 'ALM 2' instead of 'ALM 2.0') to prevent parsing errors.",
   "confidence": "High/Medium/Low based on how well the manual matches the alarm, with brief justification"
-}}
+}
 
 Each field should be a string. For "actions", use a simple numbered list format where each step starts with the number and a dot on a new line.
 Provide evidence-based reasoning throughout - explain WHY you reached each conclusion based on the context.
 Do not hallucinate. If the context does not contain relevant info, state that explicitly in the summary.
 Return ONLY valid JSON, no markdown code blocks, no extra text.
 """
-        response = ollama.chat(model=self.model, messages=[
-            {
-                'role': 'user',
-                'content': prompt,
-            },
-        ])
-        raw_content = response['message']['content']
-        
+
+class Generator:
+    def __init__(self, model: str = "mistral", session: Optional[GenerationSession] = None):
+        self.model = model
+        self.session = session or get_session(model)
+
+    def build_prompt(self, query: str, context_docs: List[str]) -> str:
+        """Builds the per-request user message; static instructions live in SYSTEM_PROMPT."""
+        context_str = "\n".join([f"- {doc}" for doc in context_docs])
+        return f"""CONTEXT INFORMATION:
+{context_str}
+
+USER ALARM/LOG:
+{query}
+"""
+
+    def generate_structured(self, query: str, context_docs: List[str]) -> dict:
+        """Generates the five-field explanation, constrained to the JSON schema."""
+        raw_content = self.session.chat(SYSTEM_PROMPT, self.build_prompt(query, context_docs),
+                                        format=EXPLANATION_SCHEMA)
+        parser = StructuredParser()
+        parser.feed(raw_content)
+        return parser.result()
+
+    def stream_structured(self, query: str, context_docs: List[str],
+                          parser: StructuredParser) -> Iterator[str]:
+        """Yields raw output chunks while feeding them to `parser`; close() ends the model stream."""
+        chunks = self.session.stream(SYSTEM_PROMPT, self.build_prompt(query, context_docs),
+                                     format=EXPLANATION_SCHEMA)
         try:
-            match = re.search(r'\{.*\}', raw_content, re.DOTALL)
-            return match.group(0) if match else raw_content
-        except:
-            return raw_content
+            for chunk in chunks:
+                parser.feed(chunk)
+                yield chunk
+        finally:
+            chunks.close()
+
+    def generate_explanation(self, query: str, context_docs: List[str]) -> str:
+        """Generates a structured fault explanation from retrieved context."""
+        return json.dumps(self.generate_structured(query, context_docs))
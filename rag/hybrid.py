@@ -0,0 +1,146 @@
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+from rank_bm25 import BM25Plus
+
+_TOKEN = re.compile(r"[a-z0-9_]+")
+
+def tokenize(text: str) -> list[str]:
+    # Keeps alarm codes like alm_3021 and tags like px_101 as single tokens
+    return _TOKEN.findall(text.lower())
+
+class KeywordIndex:
+    """BM25 over the stored documents, returning positions into the corpus.
+
+    BM25+ rather than Okapi: Okapi's IDF drops to zero or below for terms in
+    half the corpus, which is exactly how a frequent alarm code looks.
+    """
+
+    def __init__(self, documents: List[Document]):
+        self.documents = documents
+        self.bm25 = BM25Plus([tokenize(d.page_content) for d in documents]) if documents else None
+
+    def __len__(self):
+        return len(self.documents)
+
+    def search(self, query: str, k: int) -> np.ndarray:
+        """Positions of the top-k matches, best first; zero-score documents are dropped."""
+        if self.bm25 is None:
+            return np.empty(0, dtype=np.int64)
+        tokens = tokenize(query)
+        scores = self.bm25.get_scores(tokens)
+        # BM25+ gives every document idf * delta per query term; anything at
+        # that floor matched nothing
+        floor = sum((self.bm25.idf.get(t) or 0) * self.bm25.delta for t in tokens)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return top[scores[top] > floor + 1e-9]
+
+class HybridRetriever:
+    """Keyword + vector search run concurrently and fused with weighted RRF.
+
+    Both legs return ranked positions into one corpus array, so fusion is a
+    couple of vectorised adds rather than a dict merge per document. Vector
+    hits that were added to the store after the keyword index was built are
+    appended to the corpus on the fly.
+    """
+
+    def __init__(self, vector_store, documents: List[Document], ids: Optional[List[str]] = None,
+                 weights: tuple[float, float] = (0.5, 0.5), fetch_k: int = 20, rrf_c: int = 60,
+                 workers: int = 4):
+        self.vector_store = vector_store
+        self.keyword = KeywordIndex(documents)
+        self.documents = list(documents)
+        self.weights = weights
+        self.fetch_k = fetch_k
+        self.rrf_c = rrf_c
+        self.last_timings: dict = {}
+        self._positions = {}
+        self._lock = threading.Lock()
+        for i, doc in enumerate(self.documents):
+            self._positions[self._key(doc, ids[i] if ids else None)] = i
+        # Both legs of up to `workers` searches at once; batches fan out on their own pool
+        # so a search never waits for a leg queued behind its own batch
+        self._executor = ThreadPoolExecutor(max_workers=2 * workers, thread_name_prefix="hybrid")
+        self._batch_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hybrid-batch")
+
+    @staticmethod
+    def _key(doc: Document, doc_id: Optional[str] = None) -> str:
+        doc_id = doc_id or getattr(doc, "id", None)
+        return doc_id or doc.page_content
+
+    def _timed(self, fn, *args):
+        t0 = time.perf_counter()
+        result = fn(*args)
+        return result, time.perf_counter() - t0
+
+    def _vector_search(self, query: str, k: int, embedding: Optional[list[float]] = None) -> np.ndarray:
+        if embedding is not None:
+            hits = self.vector_store.similarity_search_by_vector(embedding, k=k)
+        else:
+            hits = self.vector_store.similarity_search(query, k=k)
+        positions = []
+        for doc in hits:
+            key = self._key(doc)
+            with self._lock:
+                if key not in self._positions:
+                    self._positions[key] = len(self.documents)
+                    self.documents.append(doc)
+                positions.append(self._positions[key])
+        return np.asarray(positions, dtype=np.int64)
+
+    def fuse(self, rankings: List[np.ndarray], size: int) -> np.ndarray:
+        """Weighted reciprocal rank fusion into a dense score vector."""
+        scores = np.zeros(size, dtype=np.float64)
+        for weight, ranked in zip(self.weights, rankings):
+            if len(ranked):
+                np.add.at(scores, ranked, weight / (self.rrf_c + np.arange(1, len(ranked) + 1)))
+        return scores
+
+    def search(self, query: str, k: int = 5,
+               embedding: Optional[list[float]] = None) -> List[tuple[Document, float]]:
+        """Top-k documents with their fused scores, best first.
+
+        Pass `embedding` when the query vector is already known (see
+        search_many) to skip embedding it again.
+        """
+        t0 = time.perf_counter()
+        fetch_k = max(k, self.fetch_k)
+        keyword_future = self._executor.submit(self._timed, self.keyword.search, query, fetch_k)
+        vector_future = self._executor.submit(self._timed, self._vector_search, query, fetch_k, embedding)
+        keyword_ranked, keyword_s = keyword_future.result()
+        vector_ranked, vector_s = vector_future.result()
+
+        t_fuse = time.perf_counter()
+        scores = self.fuse([keyword_ranked, vector_ranked], len(self.documents))
+        hits = np.flatnonzero(scores)
+        top = hits[np.argsort(-scores[hits], kind="stable")][:k]
+        results = [(self.documents[i], float(scores[i])) for i in top]
+
+        now = time.perf_counter()
+        self.last_timings = {
+            "keyword_s": round(keyword_s, 6),
+            "vector_s": round(vector_s, 6),
+            "fusion_s": round(now - t_fuse, 6),
+            "total_s": round(now - t0, 6),
+            "keyword_hits": int(len(keyword_ranked)),
+            "vector_hits": int(len(vector_ranked)),
+        }
+        return results
+
+    def search_many(self, queries: List[str], k: int = 5) -> List[List[tuple[Document, float]]]:
+        """Searches a batch of queries, embedding them in a single call."""
+        embeddings = self.vector_store.embeddings.embed_documents(queries)
+        if len(queries) == 1:
+            return [self.search(queries[0], k, embedding=embeddings[0])]
+        return list(self._batch_executor.map(lambda qe: self.search(qe[0], k, embedding=qe[1]),
+                                             zip(queries, embeddings)))
+
+    def invoke(self, query: str, k: int = 5) -> List[Document]:
+        return [doc for doc, _ in self.search(query, k)]
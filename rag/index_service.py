@@ -0,0 +1,423 @@
+"""Single owner of the Chroma store, keyword index and code index.
+
+    python -m rag.index_service --address 127.0.0.1:7070 --persist-dir ./chroma_db
+
+API workers started with PLC_INDEX_SERVICE=127.0.0.1:7070 (or a unix socket
+path) talk to this process instead of opening chroma_db themselves, so
+uvicorn can run several workers without concurrent writers. Requests from
+all workers go through one dispatcher thread. Concurrent searches are
+batched (one embedding call for the whole batch) and reads run on a pool
+of reader threads. Writes are applied one at a time, in arrival order, on
+a writer thread, so ingest does not hold up searches. Only the operations
+that swap the collection (clear, rebuild, restore) wait for in-flight
+reads and hold new ones back.
+
+Connections carry pickles, so whoever can connect can run code in this
+process. Prefer a unix socket; on TCP the service refuses to start unless
+PLC_INDEX_AUTHKEY is set to a secret shared with the API workers.
+"""
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from multiprocessing.connection import Client, Listener
+from typing import List, Optional
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_core.documents import Document
+
+INSECURE_AUTHKEY = b"plc-index"
+DEFAULT_AUTHKEY = os.getenv("PLC_INDEX_AUTHKEY", INSECURE_AUTHKEY.decode()).encode()
+READ_OPS = {"search", "code_lookup", "stats", "code_stats", "index_stats", "snapshots"}
+MAINTENANCE_OPS = {"sweep", "delete", "rebuild", "snapshot", "restore"}
+# Writes that replace the collection under the retriever
+SWAP_OPS = {"clear", "rebuild", "restore"}
+
+def parse_address(address: str):
+    """'host:port' for TCP, anything else is a unix socket path."""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit():
+        return (host or "127.0.0.1", int(port))
+    return address
+
+def check_listen_address(address: str, authkey: bytes):
+    """Refuses TCP listeners guarded only by the well-known default authkey."""
+    if isinstance(parse_address(address), tuple) and (not authkey or authkey == INSECURE_AUTHKEY):
+        raise ValueError(f"Refusing to listen on TCP address {address} with the default authkey: "
+                         "set PLC_INDEX_AUTHKEY to a secret, or listen on a unix socket path")
+
+class ReadWriteLock:
+    """Many readers or one writer; a waiting writer holds back new readers."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def shared(self):
+        with self._cond:
+            self._cond.wait_for(lambda: not self._writing and not self._writers_waiting)
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                self._cond.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        with self._cond:
+            self._writers_waiting += 1
+            self._cond.wait_for(lambda: not self._writing and not self._readers)
+            self._writers_waiting -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+
+class IndexService:
+    def __init__(self, indexer, retriever_factory, code_index,
+                 max_batch: int = 32, batch_window_s: float = 0.005, maintenance=None, readers: int = 4):
+        self.indexer = indexer
+        self.retriever_factory = retriever_factory
+        self.code_index = code_index
+        self.maintenance = maintenance
+        self.max_batch = max_batch
+        self.batch_window_s = batch_window_s
+        self.requests = queue.Queue()
+        self.writes = queue.Queue()
+        self.readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="index-read")
+        self.swap_lock = ReadWriteLock()
+        self.counters = {"reads": 0, "writes": 0, "batches": 0, "max_batch": 0}
+        self._retriever = None
+        self._retriever_built = 0.0
+        self._retriever_lock = threading.Lock()
+        self._trailing_reset: Optional[threading.Timer] = None
+
+    @classmethod
+    def from_store(cls, persist_dir: str = "./chroma_db", code_index_path: str = "data/code_index.json",
+                   manuals_path: str = "data/auto_faults/knowledge_base.json",
+                   history_path: str = "data/query_history.json", **kwargs) -> "IndexService":
+        """Builds the service over the persistent Chroma store and code index."""
+        from langchain_huggingface import HuggingFaceEmbeddings
+        from rag.codes import CodeIndex
+        from rag.embed import COLLECTION_NAME, Indexer
+        from rag.lifecycle import IndexMaintenance, collection_metadata, load_config
+        from rag.retrieve import Retriever
+
+        embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+        code_index = CodeIndex(path=code_index_path)
+        if not code_index.load():
+            code_index.add_history_file(history_path)
+        code_index.add_manuals(manuals_path)
+        code_index.save()
+        config = load_config()
+        indexer = Indexer(persist_dir=persist_dir, embeddings=embeddings,
+                          collection_metadata=collection_metadata(config, COLLECTION_NAME))
+        service = cls(
+            indexer=indexer,
+            retriever_factory=lambda: Retriever(persist_dir=persist_dir, embeddings=embeddings),
+            code_index=code_index,
+            **kwargs
+        )
+        service.maintenance = IndexMaintenance(indexer, code_index=code_index, config=config,
+                                               on_change=service.reset_retriever)
+        return service
+
+    def reset_retriever(self, max_staleness_s: float = 0):
+        """Drops the retriever so the keyword index is rebuilt on the next search.
+
+        Like deps.invalidate_retriever: a retriever younger than
+        max_staleness_s is kept, and dropped once it is that old.
+        """
+        with self._retriever_lock:
+            age = time.monotonic() - self._retriever_built
+            if age >= max_staleness_s:
+                self._retriever = None
+            elif self._trailing_reset is None or not self._trailing_reset.is_alive():
+                self._trailing_reset = threading.Timer(max_staleness_s - age, self.reset_retriever)
+                self._trailing_reset.daemon = True
+                self._trailing_reset.start()
+
+    @property
+    def retriever(self):
+        # Rebuilt lazily after writes so the keyword index matches the store
+        retriever = self._retriever
+        if retriever is None:
+            with self._retriever_lock:
+                if self._retriever is None:
+                    self._retriever = self.retriever_factory()
+                    self._retriever_built = time.monotonic()
+                retriever = self._retriever
+        return retriever
+
+    def serve(self, address: str, authkey: bytes = DEFAULT_AUTHKEY):
+        """Accepts worker connections forever."""
+        listener = self.listen(address, authkey)
+        print(f"Index service listening on {address}")
+        self.accept_loop(listener)
+
+    def listen(self, address: str, authkey: bytes = DEFAULT_AUTHKEY) -> Listener:
+        check_listen_address(address, authkey)
+        parsed = parse_address(address)
+        if isinstance(parsed, str) and os.path.exists(parsed):
+            # Left behind by a previous run, e.g. on a persistent volume
+            os.remove(parsed)
+        threading.Thread(target=self._dispatch_loop, daemon=True).start()
+        threading.Thread(target=self._write_loop, daemon=True).start()
+        return Listener(parsed, authkey=authkey)
+
+    def accept_loop(self, listener: Listener):
+        while True:
+            try:
+                conn = listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._read_loop, args=(conn,), daemon=True).start()
+
+    def _read_loop(self, conn):
+        try:
+            while True:
+                op, payload = conn.recv()
+                self.requests.put((conn, op, payload))
+        except (EOFError, OSError):
+            conn.close()
+
+    def _next_batch(self) -> list:
+        batch = [self.requests.get()]
+        deadline = time.perf_counter() + self.batch_window_s
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _dispatch_loop(self):
+        while True:
+            batch = self._next_batch()
+            self.counters["batches"] += 1
+            self.counters["max_batch"] = max(self.counters["max_batch"], len(batch))
+            reads = [item for item in batch if item[1] in READ_OPS]
+            for item in batch:
+                if item[1] not in READ_OPS:
+                    self.writes.put(item)
+            self.counters["reads"] += len(reads)
+            searches = [item for item in reads if item[1] == "search"]
+            if searches:
+                self.readers.submit(self._run_searches, searches)
+            for item in reads:
+                if item[1] != "search":
+                    self.readers.submit(self._run_read, item)
+
+    def _write_loop(self):
+        while True:
+            item = self.writes.get()
+            if item[1] in SWAP_OPS:
+                with self.swap_lock.exclusive():
+                    self._run_write(item)
+            else:
+                self._run_write(item)
+
+    def _reply(self, conn, status: str, value):
+        try:
+            conn.send((status, value))
+        except (EOFError, OSError):
+            pass
+
+    def _run_searches(self, searches: list):
+        try:
+            with self.swap_lock.shared():
+                k = max(payload["k"] for _, _, payload in searches)
+                results = self.retriever.search_many([payload["query"] for _, _, payload in searches], k=k)
+            for (conn, _, payload), result in zip(searches, results):
+                self._reply(conn, "ok", result[:payload["k"]])
+        except Exception as e:
+            for conn, _, _ in searches:
+                self._reply(conn, "error", str(e))
+
+    def _run_read(self, item):
+        conn, op, payload = item
+        try:
+            with self.swap_lock.shared():
+                value = self._read(op, payload)
+            self._reply(conn, "ok", value)
+        except Exception as e:
+            self._reply(conn, "error", str(e))
+
+    def _read(self, op: str, payload: dict):
+        if op == "code_lookup":
+            return self.code_index.lookup(payload["query"])
+        if op == "code_stats":
+            return self.code_index.stats()
+        if op == "stats":
+            return {**self.retriever.stats(), "service": dict(self.counters),
+                    "queued": self.requests.qsize(), "queued_writes": self.writes.qsize()}
+        if op == "index_stats":
+            return self.maintenance.stats()
+        if op == "snapshots":
+            return self.maintenance.snapshots()
+        raise ValueError(f"Unknown read op {op}")
+
+    def _run_write(self, item):
+        conn, op, payload = item
+        self.counters["writes"] += 1
+        try:
+            if op == "ingest_logs":
+                self.indexer.ingest_logs(payload["texts"], metadata=payload.get("metadata"))
+                # Streamed micro-batches rebuild the keyword index at most this often
+                self.reset_retriever(payload.get("max_staleness_s", 0))
+            elif op == "ingest_documents":
+                self.indexer.ingest_documents(payload["documents"])
+                self.reset_retriever()
+            elif op == "clear":
+                self.indexer.clear()
+                self.reset_retriever()
+            elif op == "code_add_history":
+                self.code_index.add_history(payload["entry"])
+                self.code_index.save()
+            elif op == "code_add_documents":
+                self.code_index.add_documents(payload["documents"])
+                self.code_index.save()
+            elif op in MAINTENANCE_OPS:
+                self._reply(conn, "ok", getattr(self.maintenance, op)(**payload))
+                return
+            else:
+                raise ValueError(f"Unknown write op {op}")
+            self._reply(conn, "ok", None)
+        except Exception as e:
+            self._reply(conn, "error", str(e))
+
+class IndexClient:
+    """Indexer/Retriever stand-in that forwards to the index service.
+
+    Each calling thread gets its own connection, since the API runs
+    retrieval and ingest from a thread pool.
+    """
+
+    def __init__(self, address: str, authkey: bytes = DEFAULT_AUTHKEY):
+        self.address = parse_address(address)
+        self.authkey = authkey
+        self._local = threading.local()
+
+    def _call(self, op: str, **payload):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = Client(self.address, authkey=self.authkey)
+        try:
+            conn.send((op, payload))
+            status, value = conn.recv()
+        except (EOFError, OSError):
+            self._local.conn = None
+            raise
+        if status == "error":
+            raise RuntimeError(f"Index service {op} failed: {value}")
+        return value
+
+    # Retriever interface
+    def search(self, query_text: str, k: int = 5) -> List[tuple[Document, float]]:
+        return self._call("search", query=query_text, k=k)
+
+    def query(self, query_text: str, k: int = 5) -> List[Document]:
+        return [doc for doc, _ in self.search(query_text, k=k)]
+
+    def stats(self) -> dict:
+        return self._call("stats")
+
+    # Indexer interface
+    def ingest_logs(self, log_texts: list[str], metadata: dict = None, max_staleness_s: float = 0):
+        self._call("ingest_logs", texts=log_texts, metadata=metadata, max_staleness_s=max_staleness_s)
+
+    def ingest_documents(self, documents: list[Document]):
+        self._call("ingest_documents", documents=documents)
+
+    def clear(self):
+        self._call("clear")
+
+class MaintenanceClient:
+    """IndexMaintenance interface backed by the index service."""
+
+    def __init__(self, client: IndexClient):
+        self.client = client
+
+    def stats(self) -> dict:
+        return self.client._call("index_stats")
+
+    def snapshots(self) -> list[dict]:
+        return self.client._call("snapshots")
+
+    def sweep(self) -> dict:
+        return self.client._call("sweep")
+
+    def delete(self, **conditions) -> dict:
+        return self.client._call("delete", **conditions)
+
+    def rebuild(self, hnsw: Optional[dict] = None) -> dict:
+        return self.client._call("rebuild", hnsw=hnsw)
+
+    def snapshot(self, name: Optional[str] = None) -> dict:
+        return self.client._call("snapshot", name=name)
+
+    def restore(self, name: str) -> dict:
+        return self.client._call("restore", name=name)
+
+class CodeIndexClient:
+    """CodeIndex interface backed by the index service."""
+
+    def __init__(self, client: IndexClient):
+        self.client = client
+
+    def lookup(self, query: str):
+        return self.client._call("code_lookup", query=query)
+
+    def add_history(self, entry: dict) -> int:
+        self.client._call("code_add_history", entry=entry)
+        return 1
+
+    def add_documents(self, documents: list[Document]) -> int:
+        self.client._call("code_add_documents", documents=documents)
+        return len(documents)
+
+    def save(self):
+        # The service persists after every write
+        pass
+
+    def stats(self) -> dict:
+        return self.client._call("code_stats")
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description="Shared index service for multi-worker API deployments")
+    parser.add_argument("--address", default=os.getenv("PLC_INDEX_SERVICE", "127.0.0.1:7070"))
+    parser.add_argument("--persist-dir", default=os.getenv("PLC_CHROMA_DIR", "./chroma_db"))
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--batch-window-ms", type=float, default=5)
+    parser.add_argument("--sweep-interval-s", type=float, default=float(os.getenv("PLC_RETENTION_SWEEP_S", "3600")))
+    parser.add_argument("--readers", type=int, default=4, help="Threads serving reads concurrently")
+    args = parser.parse_args(argv)
+    try:
+        check_listen_address(args.address, DEFAULT_AUTHKEY)
+    except ValueError as e:
+        parser.error(str(e))
+
+    service = IndexService.from_store(persist_dir=args.persist_dir, max_batch=args.max_batch,
+                                      batch_window_s=args.batch_window_ms / 1000, readers=args.readers)
+    if args.sweep_interval_s > 0:
+        service.maintenance.start_sweeper(args.sweep_interval_s)
+    service.serve(args.address)
+
+if __name__ == "__main__":
+    main()
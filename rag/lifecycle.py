@@ -0,0 +1,377 @@
+"""Retention, rebuilds and snapshots of the vector store.
+
+Configured from data/index_config.json (PLC_INDEX_CONFIG), for example:
+
+    {
+      "collections": {"plc_logs": {"hnsw": {"M": 32, "construction_ef": 200, "search_ef": 64}}},
+      "retention": [
+        {"source": "log_history", "max_age_days": 30},
+        {"file": "commissioning_week1.csv", "max_age_days": 7}
+      ]
+    }
+
+HNSW parameters are fixed when Chroma creates a collection, so changing
+them takes a rebuild, which copies the stored embeddings into a fresh
+collection. The rebuild also drops the tombstones that deletes leave
+behind in the HNSW graph. The keyword index is derived from the store
+and is rebuilt on the next query, so a snapshot only needs the Chroma
+directory, the code index and the manifests.
+"""
+import json
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+CONFIG_PATH = os.getenv("PLC_INDEX_CONFIG", "data/index_config.json")
+SNAPSHOT_DIR = os.getenv("PLC_SNAPSHOT_DIR", "data/snapshots")
+# Manifests that describe what is in the store, restored along with it
+MANIFESTS = ["data/file_metadata.json", "data/follow_state"]
+HNSW_KEYS = ["space", "M", "construction_ef", "search_ef", "num_threads", "resize_factor", "batch_size",
+             "sync_threshold"]
+RULE_KEYS = ["source", "file", "content_type"]
+SCAN_BATCH = 5000
+# Snapshot names become directory names under the snapshot directory
+SNAPSHOT_NAME = re.compile(r"[A-Za-z0-9_.-]+")
+
+def check_snapshot_name(name: str) -> str:
+    if not SNAPSHOT_NAME.fullmatch(name or "") or name in (".", ".."):
+        raise ValueError(f"Invalid snapshot name: {name!r} (use letters, digits, '_', '.' and '-')")
+    return name
+
+def load_config(path: str = CONFIG_PATH) -> dict:
+    config = {"collections": {}, "retention": []}
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            config.update(json.load(f))
+    # Shorthand for the common case of expiring old log rows
+    days = os.getenv("PLC_LOG_RETENTION_DAYS")
+    if days:
+        config["retention"] = config["retention"] + [{"source": "log_history", "max_age_days": float(days)}]
+    return config
+
+def hnsw_metadata(hnsw: Optional[dict]) -> Optional[dict]:
+    """Chroma collection metadata for the given HNSW parameters."""
+    if not hnsw:
+        return None
+    unknown = set(hnsw) - set(HNSW_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown HNSW parameters: {sorted(unknown)}")
+    return {f"hnsw:{k}": v for k, v in hnsw.items()}
+
+def collection_metadata(config: dict, collection: str) -> Optional[dict]:
+    return hnsw_metadata(config.get("collections", {}).get(collection, {}).get("hnsw"))
+
+def build_filter(conditions: dict, cutoff: Optional[float] = None) -> dict:
+    """Chroma `where` clause matching all conditions, and ingested before `cutoff`."""
+    clauses = [{key: conditions[key]} for key in RULE_KEYS if conditions.get(key)]
+    if cutoff is not None:
+        clauses.append({"ingested_at": {"$lt": cutoff}})
+    if not clauses:
+        raise ValueError("A filter needs at least one condition")
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+def retention_filter(rule: dict, now: Optional[float] = None) -> dict:
+    """Chroma `where` clause selecting the documents a retention rule expires."""
+    if rule.get("max_age_days") is None:
+        raise ValueError(f"Retention rule needs max_age_days: {rule}")
+    return build_filter(rule, (now or time.time()) - float(rule["max_age_days"]) * 86400)
+
+def dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+def copy_store(src: str, dst: str):
+    """Copies a Chroma directory; the SQLite file goes through the backup API."""
+    shutil.copytree(src, dst, ignore=shutil.ignore_patterns("chroma.sqlite3*"), dirs_exist_ok=True)
+    db = os.path.join(src, "chroma.sqlite3")
+    if os.path.exists(db):
+        with sqlite3.connect(db) as source, sqlite3.connect(os.path.join(dst, "chroma.sqlite3")) as target:
+            source.backup(target)
+
+class IndexMaintenance:
+    """Lifecycle operations on one Indexer's collection.
+
+    Every operation holds the indexer's write lock, so nothing is ingested
+    halfway through a sweep, rebuild or snapshot. `on_change` is called
+    after the store changed so cached retrievers can be dropped.
+    """
+
+    def __init__(self, indexer, code_index=None, config: Optional[dict] = None,
+                 snapshot_dir: str = SNAPSHOT_DIR, manifests: Optional[list[str]] = None,
+                 on_change: Optional[Callable[[], None]] = None):
+        self.indexer = indexer
+        self.code_index = code_index
+        self.config = config if config is not None else load_config()
+        self.snapshot_dir = snapshot_dir
+        self.manifests = MANIFESTS if manifests is None else manifests
+        self.on_change = on_change or (lambda: None)
+        self.last = {}
+        self._sweeper: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def _changed(self):
+        self.on_change()
+
+    def _record(self, op: str, t0: float, **details) -> dict:
+        result = {"seconds": round(time.perf_counter() - t0, 4), "at": datetime.now().isoformat(), **details}
+        self.last[op] = result
+        print(f"Index {op}: {result}")
+        return result
+
+    def _snapshot_path(self, name: str) -> str:
+        check_snapshot_name(name)
+        root = os.path.realpath(self.snapshot_dir)
+        path = os.path.realpath(os.path.join(root, name))
+        if os.path.dirname(path) != root:
+            raise ValueError(f"Invalid snapshot name: {name!r}")
+        return path
+
+    def _scan(self, include: list[str]):
+        """Yields the collection in batches, so large stores are never loaded at once."""
+        collection = self.indexer.collection
+        offset = 0
+        while True:
+            batch = collection.get(include=include, limit=SCAN_BATCH, offset=offset)
+            if not batch["ids"]:
+                return
+            yield batch
+            offset += len(batch["ids"])
+
+    def backfill_ingested_at(self, now: Optional[float] = None) -> int:
+        """Stamps documents indexed before ingested_at existed, so retention can age them."""
+        now = now or time.time()
+        stamped = 0
+        with self.indexer.lock:
+            for batch in self._scan(["metadatas"]):
+                ids, metadatas = [], []
+                for doc_id, metadata in zip(batch["ids"], batch["metadatas"]):
+                    if "ingested_at" not in (metadata or {}):
+                        ids.append(doc_id)
+                        metadatas.append({**(metadata or {}), "ingested_at": now})
+                if ids:
+                    self.indexer.collection.update(ids=ids, metadatas=metadatas)
+                    stamped += len(ids)
+        return stamped
+
+    def delete(self, source: Optional[str] = None, file: Optional[str] = None,
+               content_type: Optional[str] = None, older_than_days: Optional[float] = None) -> dict:
+        """Deletes the documents matching all of the given conditions."""
+        t0 = time.perf_counter()
+        conditions = {"source": source, "file": file, "content_type": content_type}
+        cutoff = time.time() - older_than_days * 86400 if older_than_days is not None else None
+        # Raises when nothing was given; clearing the whole store is Indexer.clear
+        where = build_filter(conditions, cutoff)
+        with self.indexer.lock:
+            before = self.indexer.count()
+            self.indexer.collection.delete(where=where)
+            deleted = before - self.indexer.count()
+        if deleted:
+            self._changed()
+        return self._record("delete", t0, deleted=deleted, where=where)
+
+    def sweep(self, rules: Optional[list[dict]] = None, now: Optional[float] = None) -> dict:
+        """Applies the retention rules once."""
+        t0 = time.perf_counter()
+        rules = self.config.get("retention", []) if rules is None else rules
+        deleted, per_rule = 0, []
+        with self.indexer.lock:
+            if rules and not self.last.get("backfill"):
+                self.last["backfill"] = {"stamped": self.backfill_ingested_at(now)}
+            for rule in rules:
+                before = self.indexer.count()
+                self.indexer.collection.delete(where=retention_filter(rule, now))
+                removed = before - self.indexer.count()
+                per_rule.append({**rule, "deleted": removed})
+                deleted += removed
+        if deleted:
+            self._changed()
+        return self._record("sweep", t0, deleted=deleted, rules=per_rule)
+
+    def rebuild(self, hnsw: Optional[dict] = None) -> dict:
+        """Rebuilds the collection's HNSW index, optionally with new parameters.
+
+        Embeddings are copied, not recomputed. The copy is complete before
+        the old collection is dropped, so a failure leaves the store as it
+        was.
+        """
+        t0 = time.perf_counter()
+        name = self.indexer.collection_name
+        if hnsw is not None:
+            self.config.setdefault("collections", {}).setdefault(name, {})["hnsw"] = hnsw
+        metadata = collection_metadata(self.config, name) or {}
+        with self.indexer.lock:
+            client = self.indexer.vector_store._client
+            tmp_name = f"{name}__rebuild"
+            try:
+                client.delete_collection(tmp_name)
+            except Exception:
+                pass
+            target = client.create_collection(tmp_name, metadata=metadata or None, embedding_function=None)
+            copied = 0
+            try:
+                for batch in self._scan(["embeddings", "documents", "metadatas"]):
+                    target.add(ids=batch["ids"], embeddings=batch["embeddings"],
+                               documents=batch["documents"], metadatas=batch["metadatas"])
+                    copied += len(batch["ids"])
+            except Exception:
+                client.delete_collection(tmp_name)
+                raise
+            bytes_before = dir_size(self.indexer.persist_dir)
+            client.delete_collection(name)
+            target.modify(name=name)
+            self.indexer.collection_metadata = metadata or None
+            self.indexer.reopen()
+        self._changed()
+        return self._record("rebuild", t0, documents=copied, hnsw=metadata,
+                            bytes_before=bytes_before, bytes_after=dir_size(self.indexer.persist_dir))
+
+    def snapshot(self, name: Optional[str] = None) -> dict:
+        """Copies the store, code index and manifests into one snapshot directory."""
+        t0 = time.perf_counter()
+        name = name or datetime.now().strftime("%Y%m%d-%H%M%S")
+        path = self._snapshot_path(name)
+        if os.path.exists(path):
+            raise ValueError(f"Snapshot {name} already exists")
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        os.mkdir(path)
+        with self.indexer.lock:
+            copy_store(self.indexer.persist_dir, os.path.join(path, "chroma"))
+            files = []
+            if self.code_index is not None:
+                self.code_index.save()
+                shutil.copy2(self.code_index.path, os.path.join(path, "code_index.json"))
+            for manifest in self.manifests:
+                if not os.path.exists(manifest):
+                    continue
+                target = os.path.join(path, "manifests", manifest.replace(os.sep, "__"))
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                if os.path.isdir(manifest):
+                    shutil.copytree(manifest, target)
+                else:
+                    shutil.copy2(manifest, target)
+                files.append(manifest)
+            info = {
+                "name": name,
+                "created_at": datetime.now().isoformat(),
+                "collection": self.indexer.collection_name,
+                "documents": self.indexer.count(),
+                "hnsw": self.indexer.collection_metadata,
+                "manifests": files,
+            }
+        info["bytes"] = dir_size(path)
+        with open(os.path.join(path, "snapshot.json"), "w") as f:
+            json.dump(info, f, indent=2)
+        return self._record("snapshot", t0, **info)
+
+    def snapshots(self) -> list[dict]:
+        if not os.path.isdir(self.snapshot_dir):
+            return []
+        result = []
+        for name in sorted(os.listdir(self.snapshot_dir)):
+            info_path = os.path.join(self.snapshot_dir, name, "snapshot.json")
+            if os.path.exists(info_path):
+                with open(info_path, "r") as f:
+                    result.append(json.load(f))
+        return result
+
+    def restore(self, name: str) -> dict:
+        """Replaces the store, code index and manifests with a snapshot.
+
+        The current store is moved aside (not deleted) first.
+        """
+        t0 = time.perf_counter()
+        path = self._snapshot_path(name)
+        if not os.path.exists(os.path.join(path, "snapshot.json")):
+            raise ValueError(f"Snapshot {name} not found")
+        with open(os.path.join(path, "snapshot.json"), "r") as f:
+            info = json.load(f)
+        persist_dir = self.indexer.persist_dir
+        with self.indexer.lock:
+            self.indexer.close()
+            previous = f"{persist_dir.rstrip(os.sep)}.pre-restore-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+            # Contents rather than the directory, which is often a volume mount point
+            os.makedirs(previous)
+            if os.path.exists(persist_dir):
+                for entry in os.listdir(persist_dir):
+                    shutil.move(os.path.join(persist_dir, entry), previous)
+            copy_store(os.path.join(path, "chroma"), persist_dir)
+            for manifest in info.get("manifests", []):
+                source = os.path.join(path, "manifests", manifest.replace(os.sep, "__"))
+                if os.path.isdir(manifest):
+                    shutil.rmtree(manifest)
+                if os.path.isdir(source):
+                    shutil.copytree(source, manifest)
+                else:
+                    shutil.copy2(source, manifest)
+            if self.code_index is not None and os.path.exists(os.path.join(path, "code_index.json")):
+                shutil.copy2(os.path.join(path, "code_index.json"), self.code_index.path)
+                self.code_index.load()
+            self.indexer.collection_metadata = info.get("hnsw")
+            self.indexer.reopen()
+        self._changed()
+        return self._record("restore", t0, name=name, documents=info.get("documents"), previous=previous)
+
+    def stats(self) -> dict:
+        """Size, age and source breakdown of the store, plus the last run of each operation.
+
+        Reads without the write lock, so ingestion carries on; while writes
+        are running the breakdown can be a batch behind `documents`.
+        """
+        t0 = time.perf_counter()
+        by_source, oldest, newest, unstamped = {}, None, None, 0
+        documents = self.indexer.count()
+        for batch in self._scan(["metadatas"]):
+            for metadata in batch["metadatas"]:
+                metadata = metadata or {}
+                source = metadata.get("source", "unknown")
+                by_source[source] = by_source.get(source, 0) + 1
+                stamp = metadata.get("ingested_at")
+                if stamp is None:
+                    unstamped += 1
+                    continue
+                oldest = stamp if oldest is None else min(oldest, stamp)
+                newest = stamp if newest is None else max(newest, stamp)
+        return {
+            "collection": self.indexer.collection_name,
+            "documents": documents,
+            "by_source": by_source,
+            "oldest_ingested_at": oldest,
+            "newest_ingested_at": newest,
+            "unstamped": unstamped,
+            "disk_bytes": dir_size(self.indexer.persist_dir),
+            "hnsw": self.indexer.collection.metadata,
+            "retention": self.config.get("retention", []),
+            "snapshots": len(self.snapshots()),
+            "sweeper": self._sweeper is not None and self._sweeper.is_alive(),
+            "last": self.last,
+            "stats_s": round(time.perf_counter() - t0, 4),
+        }
+
+    def start_sweeper(self, interval_s: float):
+        """Sweeps on a background thread every `interval_s` seconds."""
+        if not self.config.get("retention") or (self._sweeper and self._sweeper.is_alive()):
+            return
+
+        def run():
+            while not self._stop.wait(interval_s):
+                try:
+                    self.sweep()
+                except Exception as e:
+                    print(f"Retention sweep failed: {e}")
+        self._stop.clear()
+        self._sweeper = threading.Thread(target=run, name="retention-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        self._stop.set()
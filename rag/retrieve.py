@@ -1,48 +1,42 @@
 from langchain_chroma import Chroma
 from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.retrievers import BM25Retriever
-try:
-    from langchain.retrievers.ensemble import EnsembleRetriever
-except ImportError:
-    try:
-        from langchain_community.retrievers import EnsembleRetriever
-    except ImportError:
-        try:
-            from langchain_classic.retrievers.ensemble import EnsembleRetriever
-        except ImportError:
-            EnsembleRetriever = None
 from langchain_core.documents import Document
 
+from rag.hybrid import HybridRetriever
+
 class Retriever:
-    def __init__(self, persist_dir: str = "./chroma_db", weights: list[float] = [0.5, 0.5]):
+    def __init__(self, persist_dir: str = "./chroma_db", weights: list[float] = [0.5, 0.5], embeddings=None):
         """Initializes a Hybrid Retriever (Vector + Keyword)."""
-        self.embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+        self.embeddings = embeddings or HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
         self.vector_store = Chroma(
             collection_name="plc_logs",
             embedding_function=self.embeddings,
             persist_directory=persist_dir
         )
-        
-        self.vector_retriever = self.vector_store.as_retriever(search_kwargs={"k": 5})
-        
-        try:
-            stored_data = self.vector_store.get()
-            texts = stored_data['documents']
-            metadatas = stored_data['metadatas']
-            docs = [Document(page_content=t, metadata=m) for t, m in zip(texts, metadatas)]
-            
-            if docs:
-                self.bm25_retriever = BM25Retriever.from_documents(docs)
-                self.bm25_retriever.k = 5
-                self.ensemble_retriever = EnsembleRetriever(
-                    retrievers=[self.bm25_retriever, self.vector_retriever],
-                    weights=weights
-                )
-            else:
-                self.ensemble_retriever = self.vector_retriever
-        except Exception as e:
-            self.ensemble_retriever = self.vector_retriever
-        
+
+        stored_data = self.vector_store.get()
+        docs = [
+            Document(page_content=t, metadata=m or {}, id=i)
+            for i, t, m in zip(stored_data['ids'], stored_data['documents'], stored_data['metadatas'])
+        ]
+        self.hybrid = HybridRetriever(self.vector_store, docs, ids=stored_data['ids'], weights=tuple(weights))
+
+    @property
+    def last_timings(self) -> dict:
+        """Per-leg timings of the most recent query."""
+        return self.hybrid.last_timings
+
+    def search(self, query_text: str, k: int = 5) -> list[tuple[Document, float]]:
+        """Retrieves top-k documents with their fused RRF scores."""
+        return self.hybrid.search(query_text, k=k)
+
+    def search_many(self, queries: list[str], k: int = 5) -> list[list[tuple[Document, float]]]:
+        """Batched search; the queries are embedded together."""
+        return self.hybrid.search_many(queries, k=k)
+
+    def stats(self) -> dict:
+        return {"documents": len(self.hybrid.documents), "last": self.last_timings}
+
     def query(self, query_text: str, k: int = 5):
         """Retrieves top-k similar documents."""
-        return self.ensemble_retriever.invoke(query_text)
+        return [doc for doc, _ in self.search(query_text, k=k)]
@@ -0,0 +1,143 @@
+"""Routes each query to a small or a large local model by retrieval strength.
+
+A query is easy when retrieval already pins down the answer: the alarm code
+has a manual entry, or one document clearly beats the rest in the fused
+ranking, and the context is short. Easy queries go to the small model and
+everything else to the large one. With no small model configured
+(PLC_SMALL_MODEL unset) every query is scored but goes to the large model,
+so the scores can be checked against feedback before routing is switched on.
+"""
+import json
+import os
+import threading
+from collections import Counter, deque
+from typing import Optional
+
+from prometheus_client import Histogram
+
+SMALL_MODEL = os.getenv("PLC_SMALL_MODEL")
+ROUTE_THRESHOLD = float(os.getenv("PLC_ROUTE_THRESHOLD", "0.6"))
+LONG_CONTEXT_TOKENS = int(os.getenv("PLC_ROUTE_LONG_CONTEXT", "1200"))
+FEEDBACK_PATH = "data/feedback_logs.json"
+# Best fused score HybridRetriever can give (rank 1 in both legs, weights
+# summing to 1, rrf_c=60)
+RRF_MAX = 1 / 61
+
+# Weights of the easiness score; the context penalty is subtracted
+EXACT_WEIGHT = 0.35
+TOP_WEIGHT = 0.35
+MARGIN_WEIGHT = 0.3
+CONTEXT_PENALTY = 0.5
+
+ROUTE_SECONDS = Histogram("routed_generation_seconds", "Generation time per route", ["route", "model"])
+
+def retrieval_features(retrieval: dict, context_tokens: int, top_score: float = RRF_MAX) -> dict:
+    """Exact code hit, top score share, margin to the runner-up and context length."""
+    exact = retrieval.get("mode") == "code_index"
+    scores = retrieval.get("scores") or []
+    if exact:
+        # Answered from the manual entry; no ranking involved
+        top_share, margin = 1.0, 1.0
+    elif scores and scores[0] > 0:
+        top_share = min(scores[0] / top_score, 1.0)
+        margin = (scores[0] - scores[1]) / scores[0] if len(scores) > 1 else 1.0
+    else:
+        top_share, margin = 0.0, 0.0
+    return {"exact": exact, "top_share": round(top_share, 3), "margin": round(margin, 3),
+            "context_tokens": context_tokens}
+
+def easiness(features: dict, long_context_tokens: int = LONG_CONTEXT_TOKENS) -> float:
+    """0 (hard) to 1 (easy)."""
+    excess = max(features["context_tokens"] - long_context_tokens, 0) / long_context_tokens
+    score = (EXACT_WEIGHT * features["exact"] + TOP_WEIGHT * features["top_share"]
+             + MARGIN_WEIGHT * features["margin"] - CONTEXT_PENALTY * min(excess, 1.0))
+    return round(min(max(score, 0.0), 1.0), 3)
+
+class RouteDecision:
+    def __init__(self, route: str, model: str, score: float, features: dict):
+        self.route = route
+        self.model = model
+        self.score = score
+        self.features = features
+
+    def as_dict(self) -> dict:
+        return {"route": self.route, "model": self.model, "score": self.score, **self.features}
+
+class ModelRouter:
+    """Picks the model per query and keeps latency per route."""
+
+    def __init__(self, large_model: str, small_model: Optional[str] = SMALL_MODEL,
+                 threshold: float = ROUTE_THRESHOLD, long_context_tokens: int = LONG_CONTEXT_TOKENS,
+                 history: int = 500):
+        self.large_model = large_model
+        self.small_model = small_model
+        self.threshold = threshold
+        self.long_context_tokens = long_context_tokens
+        self.decisions = Counter()
+        self.latencies = {"small": deque(maxlen=history), "large": deque(maxlen=history)}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.small_model) and self.small_model != self.large_model
+
+    def decide(self, retrieval: dict, context_tokens: int) -> RouteDecision:
+        features = retrieval_features(retrieval, context_tokens)
+        score = easiness(features, self.long_context_tokens)
+        if self.enabled and score >= self.threshold:
+            decision = RouteDecision("small", self.small_model, score, features)
+        else:
+            decision = RouteDecision("large", self.large_model, score, features)
+        with self._lock:
+            self.decisions[decision.route] += 1
+        return decision
+
+    def record(self, decision: RouteDecision, seconds: float):
+        ROUTE_SECONDS.labels(route=decision.route, model=decision.model).observe(seconds)
+        with self._lock:
+            self.latencies[decision.route].append(seconds)
+
+    def latency_stats(self) -> dict:
+        stats = {}
+        with self._lock:
+            for route, history in self.latencies.items():
+                times = sorted(history)
+                entry = {"decisions": self.decisions[route], "generations": len(times)}
+                if times:
+                    entry.update({
+                        "avg_s": round(sum(times) / len(times), 4),
+                        "p50_s": round(times[len(times) // 2], 4),
+                        "p95_s": round(times[min(int(len(times) * 0.95), len(times) - 1)], 4),
+                    })
+                stats[route] = entry
+        return stats
+
+    def stats(self, feedback_path: str = FEEDBACK_PATH) -> dict:
+        return {
+            "enabled": self.enabled,
+            "models": {"small": self.small_model, "large": self.large_model},
+            "threshold": self.threshold,
+            "long_context_tokens": self.long_context_tokens,
+            "routes": self.latency_stats(),
+            "feedback": feedback_stats(feedback_path),
+        }
+
+def feedback_stats(path: str = FEEDBACK_PATH) -> dict:
+    """Ratings per route; feedback given before routing counts as "unrouted"."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        try:
+            entries = json.load(f)
+        except ValueError:
+            return {}
+    routes: dict[str, Counter] = {}
+    for entry in entries:
+        route = entry.get("route") or "unrouted"
+        routes.setdefault(route, Counter())[str(entry.get("rating", "")).lower()] += 1
+    stats = {}
+    for route, ratings in routes.items():
+        total = sum(ratings.values())
+        stats[route] = {"total": total, "ratings": dict(ratings),
+                        "good_share": round(ratings["good"] / total, 3)}
+    return stats
@@ -0,0 +1,190 @@
+import json
+import re
+from typing import Optional
+
+from prometheus_client import Counter
+
+FIELDS = ["summary", "evidence", "root_cause", "actions", "confidence"]
+
+# Passed to Ollama's `format` so decoding is constrained to this shape
+EXPLANATION_SCHEMA = {
+    "type": "object",
+    "properties": {name: {"type": "string"} for name in FIELDS},
+    "required": FIELDS,
+}
+
+PARSE_OUTCOMES = Counter(
+    "structured_parse_total", "Structured output parse results", ["outcome"]
+)
+
+_FENCE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.IGNORECASE)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_FIELD = r'"{name}"\s*:\s*"((?:[^"\\]|\\.)*)'
+
+class StructuredParser:
+    """Incremental parser for the five-field explanation object.
+
+    Feed it the response in one piece or chunk by chunk as it streams; it
+    tracks string and brace state so it knows when the top-level object is
+    complete. `result()` always returns all five fields, repairing the text
+    in a bounded number of steps if the model output is not clean JSON.
+    """
+
+    def __init__(self):
+        self.buffer = []
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.started = False
+        self.done = False
+        self.outcome: Optional[str] = None
+        self._text = ""
+
+    def feed(self, chunk: str) -> bool:
+        """Consumes a chunk; returns True once the top-level object has closed."""
+        for ch in chunk:
+            if self.done:
+                break
+            if not self.started:
+                if ch != "{":
+                    continue
+                self.started = True
+            self.buffer.append(ch)
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch in "{[":
+                self.depth += 1
+            elif ch in "}]":
+                self.depth -= 1
+                if self.depth == 0:
+                    self.done = True
+        self._text += chunk
+        return self.done
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far, including any prose around the object."""
+        return self._text
+
+    def result(self) -> dict:
+        """Returns the normalized explanation and records the parse outcome."""
+        candidate = "".join(self.buffer)
+        parsed = None
+        if self.done:
+            parsed = _loads(candidate)
+            self.outcome = "clean" if parsed is not None else None
+        if parsed is None:
+            parsed = repair(candidate if self.started else self._text, self._text)
+            self.outcome = "repaired" if parsed is not None else "failed"
+        if parsed is None:
+            parsed = {"summary": self._text.strip() or "Model returned an empty response.",
+                      "confidence": "Low"}
+        PARSE_OUTCOMES.labels(self.outcome).inc()
+        return normalize(parsed)
+
+def parse(text: str) -> dict:
+    """One-shot convenience wrapper around StructuredParser."""
+    parser = StructuredParser()
+    parser.feed(text)
+    return parser.result()
+
+def _loads(text: str) -> Optional[dict]:
+    try:
+        value = json.loads(text)
+    except (ValueError, TypeError):
+        return None
+    return value if isinstance(value, dict) else None
+
+def _close(text: str) -> str:
+    """Closes an unterminated string and any open brackets."""
+    stack = []
+    in_string = escape = False
+    for ch in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+    if in_string:
+        text += '"'
+    text = text.rstrip().rstrip(",")
+    # A key with no value yet ("actions": ) cannot be closed meaningfully
+    text = re.sub(r',?\s*"[^"]*"\s*:\s*$', "", text)
+    return text + "".join(reversed(stack))
+
+def repair(candidate: str, raw: str = "") -> Optional[dict]:
+    """Bounded repair: each step is tried once, in order, on the previous output."""
+    text = _FENCE.sub("", candidate.strip())
+    start = text.find("{")
+    if start > 0:
+        text = text[start:]
+    steps = [
+        lambda t: t,
+        lambda t: _TRAILING_COMMA.sub(r"\1", t),
+        _close,
+        lambda t: _TRAILING_COMMA.sub(r"\1", _close(t)),
+    ]
+    for step in steps:
+        parsed = _loads(step(text))
+        if parsed is not None:
+            return parsed
+
+    # Last resort: lift whichever fields are recognizable from the raw text
+    source = raw or candidate
+    salvaged = {}
+    for name in FIELDS:
+        match = re.search(_FIELD.format(name=name), source, re.DOTALL)
+        if match:
+            try:
+                salvaged[name] = json.loads(f'"{match.group(1)}"')
+            except ValueError:
+                salvaged[name] = match.group(1)
+    return salvaged or None
+
+def normalize(parsed: dict) -> dict:
+    """Coerces a parsed object to exactly the five string fields."""
+    result = {}
+    for name in FIELDS:
+        value = parsed.get(name, "")
+        if isinstance(value, list):
+            if name == "actions":
+                value = "\n".join(f"{i}. {str(step).strip()}" for i, step in enumerate(value, 1))
+            else:
+                value = "\n".join(str(v) for v in value)
+        elif isinstance(value, dict):
+            value = json.dumps(value)
+        elif value is None:
+            value = ""
+        result[name] = str(value)
+    if not result["confidence"]:
+        result["confidence"] = "Low"
+    return result
+
+def parse_stats() -> dict:
+    """Parse outcome counts and failure rate since process start."""
+    counts = {}
+    for metric in PARSE_OUTCOMES.collect():
+        for sample in metric.samples:
+            if sample.name.endswith("_total"):
+                counts[sample.labels["outcome"]] = int(sample.value)
+    total = sum(counts.values())
+    return {
+        "total": total,
+        "outcomes": counts,
+        "failure_rate": counts.get("failed", 0) / total if total else 0.0,
+    }
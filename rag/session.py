@@ -0,0 +1,168 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Iterator, Optional
+
+from prometheus_client import Histogram
+
+from rag.tokens import estimate_tokens
+
+PROMPT_EVAL_SECONDS = Histogram(
+    "ollama_prompt_eval_seconds", "Time Ollama spent evaluating the prompt", ["model"]
+)
+EVAL_SECONDS = Histogram(
+    "ollama_eval_seconds", "Time Ollama spent generating tokens", ["model"]
+)
+LOAD_SECONDS = Histogram(
+    "ollama_load_seconds", "Time Ollama spent loading the model", ["model"]
+)
+
+NS = 1e9
+
+class GenerationSession:
+    """Keeps one Ollama model resident and tracks per-request timings.
+
+    The context window only ever grows in power-of-two steps: Ollama reloads
+    the runner whenever num_ctx changes, so resizing on every request would
+    cost more than the smaller KV cache saves.
+    """
+
+    def __init__(self, model: str = "mistral", host: Optional[str] = None,
+                 keep_alive: Optional[str] = None, client=None,
+                 min_ctx: int = 2048, max_ctx: int = 8192, num_predict: int = 768):
+        self.model = model
+        self.keep_alive = keep_alive or os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+        if client is None:
+            # Imported here so the API can start without loading the HTTP client stack
+            import ollama
+            client = ollama.Client(host=host)
+        self.client = client
+        self.min_ctx = min_ctx
+        self.max_ctx = max_ctx
+        self.num_predict = num_predict
+        self.num_ctx = min_ctx
+        self.warm = False
+        self.last_timings: dict = {}
+        self.history = deque(maxlen=200)
+        self._lock = threading.Lock()
+
+    def warm_up(self) -> bool:
+        """Loads the model into memory so the first real request skips the load."""
+        try:
+            self.client.generate(model=self.model, prompt="", keep_alive=self.keep_alive,
+                                 options={"num_ctx": self.num_ctx})
+            self.warm = True
+        except Exception as e:
+            print(f"Warm-up of {self.model} failed: {e}")
+        return self.warm
+
+    def context_size(self, prompt_tokens: int) -> int:
+        """Returns the num_ctx to use for a prompt of the given size."""
+        needed = prompt_tokens + self.num_predict
+        size = self.min_ctx
+        while size < needed and size < self.max_ctx:
+            size *= 2
+        with self._lock:
+            self.num_ctx = min(max(self.num_ctx, size), self.max_ctx)
+            return self.num_ctx
+
+    def options(self, system: str, user: str) -> dict:
+        """Ollama options sized to the prompt."""
+        prompt_tokens = estimate_tokens(system) + estimate_tokens(user)
+        return {"num_ctx": self.context_size(prompt_tokens), "num_predict": self.num_predict}
+
+    def messages(self, system: str, user: str) -> list[dict]:
+        # The system prompt goes first and never changes, so Ollama can reuse
+        # its KV cache prefix across requests.
+        return [
+            {"role": "system", "content": system},
+            {"role": "user", "content": user},
+        ]
+
+    def chat(self, system: str, user: str, **kwargs) -> str:
+        """Runs one chat completion and returns the message content."""
+        response = self.client.chat(
+            model=self.model,
+            messages=self.messages(system, user),
+            options=self.options(system, user),
+            keep_alive=self.keep_alive,
+            **kwargs
+        )
+        self.record(response)
+        return response["message"]["content"]
+
+    def stream(self, system: str, user: str, **kwargs) -> Iterator[str]:
+        """Streams message content; timings are recorded from the final chunk."""
+        chunks = self.client.chat(
+            model=self.model,
+            messages=self.messages(system, user),
+            options=self.options(system, user),
+            keep_alive=self.keep_alive,
+            stream=True,
+            **kwargs
+        )
+        try:
+            for chunk in chunks:
+                content = chunk["message"]["content"]
+                if content:
+                    yield content
+                if chunk.get("done"):
+                    self.record(chunk)
+        finally:
+            # Closing the client's generator drops the HTTP response, which stops Ollama generating
+            close = getattr(chunks, "close", None)
+            if close:
+                close()
+
+    def record(self, response) -> dict:
+        """Stores the prompt-eval vs generation timings Ollama reports."""
+        def seconds(key):
+            return (response.get(key) or 0) / NS
+
+        def count(key):
+            return response.get(key) or 0
+
+        timings = {
+            "model": self.model,
+            "timestamp": time.time(),
+            "num_ctx": self.num_ctx,
+            "load_s": seconds("load_duration"),
+            "prompt_eval_s": seconds("prompt_eval_duration"),
+            "eval_s": seconds("eval_duration"),
+            "total_s": seconds("total_duration"),
+            "prompt_tokens": count("prompt_eval_count"),
+            "output_tokens": count("eval_count"),
+        }
+        LOAD_SECONDS.labels(self.model).observe(timings["load_s"])
+        PROMPT_EVAL_SECONDS.labels(self.model).observe(timings["prompt_eval_s"])
+        EVAL_SECONDS.labels(self.model).observe(timings["eval_s"])
+
+        self.warm = True
+        self.last_timings = timings
+        self.history.append(timings)
+        return timings
+
+    def stats(self) -> dict:
+        """Averages over the recent request window."""
+        n = len(self.history)
+        summary = {"model": self.model, "warm": self.warm, "num_ctx": self.num_ctx,
+                   "keep_alive": self.keep_alive, "requests": n, "last": self.last_timings}
+        if n:
+            for key in ["load_s", "prompt_eval_s", "eval_s", "total_s", "prompt_tokens", "output_tokens"]:
+                summary[f"avg_{key}"] = sum(t[key] for t in self.history) / n
+        return summary
+
+_sessions: dict[str, GenerationSession] = {}
+_sessions_lock = threading.Lock()
+
+def get_session(model: str = "mistral") -> GenerationSession:
+    """Returns the process-wide session for a model, creating it on first use."""
+    with _sessions_lock:
+        if model not in _sessions:
+            _sessions[model] = GenerationSession(model=model)
+        return _sessions[model]
+
+def all_sessions() -> list[GenerationSession]:
+    with _sessions_lock:
+        return list(_sessions.values())
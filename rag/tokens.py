@@ -0,0 +1,11 @@
+import math
+
+# Mistral/Llama tokenizers average roughly 4 characters per token on English
+# and log text. Good enough for budgeting; exact counts come back from Ollama.
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate for prompt sizing and context budgeting."""
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
@@ -2,7 +2,8 @@ import csv
 import random
 from datetime import datetime, timedelta
 
-def generate_sample_csv(filename, num_rows=150):
+def generate_sample_csv(filename, num_rows=150, seed=None):
+    rng = random.Random(seed)
     machines = [f"Machine_{i}" for i in range(1, 6)]
     alarms = [
         ("ALM_3021", "Vacuum Failure"),
@@ -29,12 +30,12 @@ def generate_sample_csv(filename, num_rows=150):
         
         for i in range(num_rows):
             # Advance time by random intervals (1 min to 30 mins)
-            current_time = start_time + timedelta(minutes=i * random.randint(5, 15))
+            current_time = start_time + timedelta(minutes=i * rng.randint(5, 15))
             
             # Pick a random machine and alarm
-            machine = random.choice(machines)
-            alarm_code, _ = random.choice(alarms)
-            state = random.choice(states)
+            machine = rng.choice(machines)
+            alarm_code, _ = rng.choice(alarms)
+            state = rng.choice(states)
             
             writer.writerow({
                 'timestamp': current_time.strftime('%Y-%m-%d %H:%M:%S'),
@@ -0,0 +1,57 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.datasets import parse_scale
+from benchmarks.fake_llm import FakeOllamaClient
+from benchmarks.run import compare
+from rag.generate import Generator
+from rag.session import GenerationSession
+
+def test_fake_llm_is_deterministic_and_parseable():
+    generator = Generator(session=GenerationSession(client=FakeOllamaClient()))
+    first = generator.generate_structured("Machine_3 ALM_3021", ["ctx"])
+    second = generator.generate_structured("Machine_3 ALM_3021", ["ctx"])
+
+    assert first == second
+    assert "ALM_3021" in first["summary"]
+
+def test_fake_llm_stream_reports_timings():
+    session = GenerationSession(client=FakeOllamaClient(tokens_per_s=10_000))
+    text = "".join(session.stream("system", "ALM_1001"))
+
+    assert text.startswith("{")
+    assert session.last_timings["output_tokens"] > 0
+    assert session.last_timings["eval_s"] > 0
+
+def test_compare_flags_only_regressions_above_threshold():
+    baseline = {"results": {"parse[10k]": {"median_s": 1.0}, "embed[10k]": {"median_s": 2.0}}}
+    current = {"results": {"parse[10k]": {"median_s": 1.1}, "embed[10k]": {"median_s": 3.0},
+                           "retrieve[10k]": {"median_s": 5.0}}}
+
+    regressions = compare(current, baseline, threshold=0.2)
+
+    assert [r["benchmark"] for r in regressions] == ["embed[10k]"]
+    assert regressions[0]["change"] == 0.5
+
+def test_scale_labels():
+    assert parse_scale("10m") == 10_000_000
+    assert parse_scale("50k") == 50_000
+    assert parse_scale("2500") == 2500
+
+def test_load_report_percentiles():
+    from benchmarks.loadgen import LoadResult, parse_mix, percentile
+
+    values = [i / 100 for i in range(1, 101)]
+    assert percentile(values, 50) == 0.5
+    assert percentile(values, 99) == 0.99
+
+    result = LoadResult()
+    for v in values:
+        result.record("query", v, ok=v < 0.9)
+    result.elapsed = 10
+    report = result.report(concurrency=4)
+
+    assert report["endpoints"]["query"]["errors"] == 11
+    assert report["throughput_rps"] == 10.0
+    assert parse_mix("query=3,history") == {"query": 3.0, "history": 1.0}
@@ -0,0 +1,160 @@
+import sys
+import os
+import asyncio
+import json
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.api.coalesce import SingleFlight, StreamFlight, iterate_closing, request_key
+from rag.generate import Generator
+from rag.schema import StructuredParser
+from rag.session import GenerationSession
+
+def test_request_key_normalizes_query():
+    assert request_key("  2020-06-01 08:23:11\tMachine_3\tALM_3021 ", top_k=3) == \
+        request_key("2020-06-01 08:23:11 machine_3 alm_3021", top_k=3)
+    assert request_key("ALM_3021", top_k=3) != request_key("ALM_3021", top_k=5)
+
+def test_identical_requests_share_one_flight():
+    flights = SingleFlight("test")
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"summary": "Vacuum seal leak"}
+
+    async def main():
+        results = await asyncio.gather(*[flights.run("k", work) for _ in range(5)])
+        # Finished flights are not cached
+        await flights.run("k", work)
+        return results
+
+    results = asyncio.run(main())
+    assert len(calls) == 2
+    assert [shared for _, shared in results] == [False, True, True, True, True]
+    assert all(result is results[0][0] for result, _ in results)
+    assert flights.stats() == {"in_flight": 0, "coalesced": 4}
+
+def test_errors_reach_every_waiter():
+    flights = SingleFlight("test")
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("Ollama unreachable")
+
+    async def main():
+        return await asyncio.gather(*[flights.run("k", work) for _ in range(3)], return_exceptions=True)
+
+    assert all(isinstance(r, RuntimeError) for r in asyncio.run(main()))
+
+def test_late_subscribers_replay_the_stream():
+    flights = StreamFlight("test")
+    starts = []
+
+    async def tokens():
+        starts.append(1)
+        for token in ["{", '"summary"', ": ", '"leak"', "}"]:
+            await asyncio.sleep(0.01)
+            yield token
+
+    async def collect(delay):
+        await asyncio.sleep(delay)
+        return [t async for t in flights.subscribe("k", tokens)]
+
+    async def main():
+        return await asyncio.gather(collect(0), collect(0.025), collect(0.035))
+
+    first, second, third = asyncio.run(main())
+    assert starts == [1]
+    assert first == second == third == ["{", '"summary"', ": ", '"leak"', "}"]
+    assert flights.stats() == {"in_flight": 0, "coalesced": 2}
+
+def test_stream_producer_stops_when_everyone_leaves():
+    flights = StreamFlight("test")
+    produced = []
+
+    async def tokens():
+        for i in range(100):
+            await asyncio.sleep(0.005)
+            produced.append(i)
+            yield str(i)
+
+    async def main():
+        stream = flights.subscribe("k", tokens)
+        assert await stream.__anext__() == "0"
+        await stream.aclose()
+        await asyncio.sleep(0.05)
+
+    asyncio.run(main())
+    assert len(produced) < 10
+    assert flights.stats()["in_flight"] == 0
+
+class StreamingClient:
+    """Ollama client whose stream records whether it was closed."""
+
+    def __init__(self):
+        self.sent = 0
+        self.closed = False
+
+    def chat(self, **kwargs):
+        def chunks():
+            try:
+                for i in range(1000):
+                    time.sleep(0.005)
+                    self.sent += 1
+                    yield {"message": {"content": str(i)}}
+            finally:
+                self.closed = True
+        return chunks()
+
+def test_cancelled_stream_closes_the_model_stream():
+    flights = StreamFlight("test")
+    client = StreamingClient()
+    generator = Generator(model="mistral", session=GenerationSession(model="mistral", client=client))
+
+    async def tokens():
+        async for chunk in iterate_closing(generator.stream_structured("ALM_3021", [], StructuredParser())):
+            yield chunk
+
+    async def main():
+        stream = flights.subscribe("k", tokens)
+        assert await stream.__anext__() == "0"
+        await stream.aclose()
+        await asyncio.sleep(0.1)
+
+    asyncio.run(main())
+    assert client.closed
+    assert client.sent < 30
+
+def test_coalesced_stream_echoes_each_callers_query(monkeypatch):
+    import httpx
+    from backend.api import main
+    from rag.context import ContextAssembler
+
+    context = ContextAssembler().assemble("ALM_3021", [], max_tokens=100)
+    monkeypatch.setattr(main, "retrieve_context", lambda request: (context, {"mode": "hybrid", "scores": []}))
+
+    class FiniteClient(StreamingClient):
+        def chat(self, **kwargs):
+            chunks = super().chat(**kwargs)
+            return (chunk for chunk, _ in zip(chunks, range(10)))
+
+    monkeypatch.setattr(main, "Generator", lambda model: Generator(
+        model=model, session=GenerationSession(model=model, client=FiniteClient())))
+
+    async def ask(client, query, delay):
+        await asyncio.sleep(delay)
+        response = await client.post("/api/query/stream", json={"query": query})
+        return [json.loads(line) for line in response.text.splitlines()]
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(ask(client, "Machine_3 ALM_3021", 0), ask(client, "machine_3  alm_3021", 0.02))
+
+    first, second = asyncio.run(run())
+    assert first[-1]["type"] == second[-1]["type"] == "result"
+    assert first[-1]["query"] == "Machine_3 ALM_3021"
+    assert second[-1]["query"] == "machine_3  alm_3021"
+    assert main.stream_flights.stats()["coalesced"] >= 1
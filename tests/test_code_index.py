@@ -0,0 +1,79 @@
+import sys
+import os
+import threading
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_core.documents import Document
+from rag.codes import CodeIndex
+from rag.context import ContextAssembler
+
+MANUALS = os.path.join(os.path.dirname(__file__), '..', 'data', 'auto_faults', 'knowledge_base.json')
+
+def build(tmp_path):
+    index = CodeIndex(path=str(tmp_path / "code_index.json"))
+    index.add_manuals(MANUALS)
+    index.add_documents([Document(page_content="Check SOL_401 before resetting ALM_3021.",
+                                  metadata={"source": "soo.pdf", "page": 4})])
+    index.add_history({
+        "timestamp": "2026-01-31T15:00:30", "filename": "sample.csv",
+        "query": "2020-06-01 08:23:11\tMachine_3\tALM_3021",
+        "result": {"structured": {"summary": "Vacuum seal leak", "root_cause": "Worn seal"}},
+    })
+    return index
+
+def test_exact_code_lookup(tmp_path):
+    hits = build(tmp_path).lookup("Machine_3 triggered alm_3021")
+
+    assert hits.exact
+    assert hits.codes == ["ALM_3021"]
+    assert hits.manual[0].page_content.startswith("Fault Code: ALM_3021")
+    assert {d.metadata["content_type"] for d in hits.related} == {"knowledge_base", "history"}
+
+def test_machine_names_are_not_codes(tmp_path):
+    index = build(tmp_path)
+
+    assert index.lookup("Machine_3 stopped") is None
+    assert not index.lookup("SOL_401 stuck").exact
+
+def test_persisted_index_round_trips(tmp_path):
+    build(tmp_path).save()
+    reloaded = CodeIndex(path=str(tmp_path / "code_index.json"))
+
+    assert reloaded.load()
+    assert reloaded.stats()["manual_entries"] == 3
+
+def test_pinned_manual_survives_tiny_budget(tmp_path):
+    hits = build(tmp_path).lookup("ALM_3021")
+    context = ContextAssembler(max_tokens=10).assemble("ALM_3021", hits.related, pinned=hits.manual)
+
+    assert context.docs[0].startswith("Fault Code: ALM_3021")
+    assert context.dropped_budget == len(hits.related)
+
+def test_reprocessing_the_kb_adds_no_duplicate_mentions(tmp_path):
+    index = build(tmp_path)
+    before = index.stats()["kb_mentions"]
+    assert index.add_documents([Document(page_content="Check SOL_401 before resetting ALM_3021.",
+                                         metadata={"source": "soo.pdf", "page": 4})]) == 0
+    assert index.stats()["kb_mentions"] == before
+
+def test_lookups_run_alongside_ingest(tmp_path):
+    index = CodeIndex(path=str(tmp_path / "code_index.json"))
+    docs = [Document(page_content=f"ALM_{i} trips the conveyor.", metadata={"source": f"kb_{i}.pdf"})
+            for i in range(3000)]
+    errors = []
+
+    def read():
+        try:
+            for _ in range(300):
+                index.lookup("ALM_1 ALM_2999")
+                index.stats()
+        except RuntimeError as e:
+            errors.append(e)
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    for i in range(0, len(docs), 10):
+        index.add_documents(docs[i:i + 10])
+    reader.join()
+    assert not errors
+    assert index.stats()["codes"] == 3000
@@ -0,0 +1,36 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_core.documents import Document
+from rag.context import ContextAssembler
+
+def log(text):
+    return Document(page_content=text, metadata={"source": "log_history", "content_type": "log"})
+
+def test_near_duplicates_collapse():
+    docs = [
+        log("At 2020-06-01 08:23:11, Machine_3 triggered alarm ALM_3021."),
+        log("At 2020-06-01 10:00:00, Machine_3 triggered alarm ALM_3021."),
+        log("At 2020-06-01 08:45:00, Machine_1 triggered alarm ALM_1001."),
+    ]
+    context = ContextAssembler().assemble("Machine_3 ALM_3021", docs)
+
+    assert context.dropped_duplicates == 1
+    assert len(context.docs) == 2
+    assert context.docs[0].endswith("(and 1 similar entries)")
+
+def test_manual_outranks_logs_and_budget_is_respected():
+    manual = Document(
+        page_content="Fault Code: ALM_3021. Description: Pneumatic vacuum alarm.",
+        metadata={"source": "manual", "code": "ALM_3021"},
+    )
+    big_chunk = Document(page_content="Vacuum circuit notes. " * 400, metadata={"content_type": "knowledge_base"})
+    docs = [log("At 2020-06-01 08:23:11, Machine_3 triggered alarm ALM_3021."), big_chunk, manual]
+
+    context = ContextAssembler(max_tokens=150, max_chunk_tokens=100).assemble("ALM_3021 vacuum", docs)
+
+    assert context.docs[0].startswith("Fault Code: ALM_3021")
+    assert context.tokens_used <= 150
+    assert context.tokens_saved > 0
+    assert context.stats()["tokens_in"] == context.tokens_in
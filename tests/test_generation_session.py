@@ -0,0 +1,53 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from rag.session import GenerationSession
+from rag.generate import Generator, SYSTEM_PROMPT
+
+class RecordingClient:
+    def __init__(self):
+        self.calls = []
+
+    def chat(self, **kwargs):
+        self.calls.append(kwargs)
+        return {
+            "message": {"role": "assistant", "content": '{"summary": "ok"}'},
+            "load_duration": 0,
+            "prompt_eval_duration": 250_000_000,
+            "prompt_eval_count": 120,
+            "eval_duration": 1_500_000_000,
+            "eval_count": 60,
+            "total_duration": 1_750_000_000,
+        }
+
+    def generate(self, **kwargs):
+        self.calls.append(kwargs)
+        return {}
+
+def test_static_system_prompt_and_timings():
+    client = RecordingClient()
+    session = GenerationSession(model="mistral", client=client, keep_alive="10m")
+    generator = Generator(model="mistral", session=session)
+
+    generator.generate_explanation("Machine_3 ALM_3021", ["ctx one"])
+    generator.generate_explanation("Machine_1 ALM_1001", ["ctx two"])
+
+    first, second = client.calls
+    assert first["messages"][0] == {"role": "system", "content": SYSTEM_PROMPT}
+    assert second["messages"][0] == first["messages"][0]
+    assert first["keep_alive"] == "10m"
+    assert first["options"]["num_ctx"] == 2048
+    assert first["format"]["required"] == ["summary", "evidence", "root_cause", "actions", "confidence"]
+
+    assert session.last_timings["prompt_eval_s"] == 0.25
+    assert session.last_timings["eval_s"] == 1.5
+    assert session.stats()["requests"] == 2
+
+def test_context_only_grows():
+    session = GenerationSession(client=RecordingClient(), min_ctx=2048, max_ctx=8192, num_predict=512)
+    assert session.context_size(100) == 2048
+    assert session.context_size(3000) == 4096
+    # A smaller prompt keeps the larger window to avoid a model reload
+    assert session.context_size(100) == 4096
+    assert session.context_size(100_000) == 8192
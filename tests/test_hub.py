@@ -0,0 +1,146 @@
+import sys
+import os
+import json
+from datetime import datetime, timedelta
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pandas as pd
+import pytest
+
+from ingest.hub import SummaryHub
+from ingest.summary import CountMinSketch, HeavyHitters, LogSummary, export_site
+
+START = datetime(2024, 3, 1)
+
+def write_log(path, days, per_day, alarm, machine="Machine_1", follower=None):
+    """A CSV with `per_day` alarms a day; `follower` is raised a minute after each."""
+    rows = []
+    for day in range(days):
+        for i in range(per_day):
+            ts = START + timedelta(days=day, hours=8, minutes=10 * i)
+            rows.append({"timestamp": ts.isoformat(sep=" "), "machine": machine, "alarm": alarm})
+            if follower:
+                rows.append({"timestamp": (ts + timedelta(minutes=1)).isoformat(sep=" "),
+                             "machine": machine, "alarm": follower})
+    pd.DataFrame(rows).to_csv(path, index=False)
+    return str(path)
+
+def site_export(tmp_path, site, logs):
+    paths = [write_log(tmp_path / f"{site}_{i}.csv", **log) for i, log in enumerate(logs)]
+    return export_site(paths, site=site, cache_dir=str(tmp_path / "cache" / site))
+
+def test_sketches_merge_like_the_combined_stream():
+    a, b = CountMinSketch(width=256), CountMinSketch(width=256)
+    a.add("ALM_3021@2024-03-01", 5)
+    b.add("ALM_3021@2024-03-01", 2)
+    a.merge(CountMinSketch.from_dict(json.loads(json.dumps(b.to_dict()))))
+    assert a.estimate("ALM_3021@2024-03-01") >= 7
+    assert a.estimate("ALM_1001@2024-03-01") <= 1
+
+    heavy = HeavyHitters(k=2)
+    heavy.update({"M1|ALM_3021": 50, "M2|ALM_1001": 3})
+    other = HeavyHitters(k=2)
+    other.update({"M1|ALM_3021": 40, "M3|ALM_5521": 4, "M4|ALM_7034": 1})
+    heavy.merge(other)
+    assert heavy.top(1)[0][0] == "M1|ALM_3021" and heavy.total == 98
+
+def test_summary_of_chunks_matches_whole_file(tmp_path):
+    path = write_log(tmp_path / "line.csv", days=3, per_day=4, alarm="ALM_3021", follower="ALM_1001")
+    whole, chunked = LogSummary(), LogSummary()
+    whole.add_chunk(pd.read_csv(path))
+    for chunk in pd.read_csv(path, chunksize=5):
+        chunked.add_chunk(chunk)
+    assert whole.to_dict() == chunked.to_dict()
+    assert whole.alarms == {"ALM_3021": 12, "ALM_1001": 12}
+    # Followers come a minute after their alarm; the next alarm is outside the 5 minute window
+    assert whole.cooccurrence == {"ALM_1001|ALM_3021": 12}
+    assert sum(whole.machines["Machine_1"].values()) == 24
+
+def test_hub_merges_site_exports_incrementally(tmp_path):
+    hub = SummaryHub(str(tmp_path / "hub"))
+    north = site_export(tmp_path, "north", [
+        {"days": 14, "per_day": 2, "alarm": "ALM_3021", "follower": "ALM_1001"},
+        {"days": 1, "per_day": 1, "alarm": "ALM_5521", "machine": "Machine_2"},
+    ])
+    south = site_export(tmp_path, "south", [{"days": 14, "per_day": 1, "alarm": "ALM_3021", "machine": "M7"}])
+
+    assert hub.import_export(north) == {"site": "north", "added": 2, "replaced": 0, "unchanged": 0}
+    assert hub.import_export(south)["added"] == 1
+    assert hub.import_export(south)["unchanged"] == 1
+    assert hub.top_alarms(1) == [{"alarm": "ALM_3021", "count": 42, "sites": 2}]
+    assert hub.cooccurring("ALM_3021") == [{"alarm": "ALM_1001", "count": 28}]
+    assert hub.hotspots(1, site="north")[0]["machine"] == "Machine_1"
+    assert [d["count"] for d in hub.alarm_trend("ALM_3021", days=2)] == [3, 3]
+    assert hub.machine_histogram("south", "M7")[0]["count"] == 1
+
+    # A site re-exports after its log grew: the file's summary is replaced
+    grown = pd.DataFrame([{"timestamp": (START + timedelta(days=d, hours=9)).isoformat(sep=" "),
+                           "machine": "Machine_2", "alarm": "ALM_5521"} for d in [0] + list(range(7, 14))])
+    grown.to_csv(tmp_path / "north_1.csv", index=False)
+    north = export_site([str(tmp_path / "north_0.csv"), str(tmp_path / "north_1.csv")], site="north",
+                        cache_dir=str(tmp_path / "cache" / "north"))
+    assert hub.import_export(north) == {"site": "north", "added": 0, "replaced": 1, "unchanged": 1}
+    rising = hub.rising(days=7)
+    assert rising[0]["alarm"] == "ALM_5521" and rising[0]["recent"] == 7 and rising[0]["previous"] == 1
+
+    # Another worker sharing the directory sees the same state
+    assert SummaryHub(str(tmp_path / "hub")).stats() == hub.stats() == \
+        {"sites": 2, "files": 3, "rows": 78, "alarms": 3}
+
+def test_hub_rejects_unsafe_exports_before_writing(tmp_path):
+    hub = SummaryHub(str(tmp_path / "hub"))
+    export = site_export(tmp_path, "north", [{"days": 2, "per_day": 1, "alarm": "ALM_3021"}])
+
+    bad = [
+        {**export, "site": "../../etc"},
+        {**export, "site": ".."},
+        {**export, "files": [{**export["files"][0], "digest": "../../x"}]},
+        # The second entry is bad: the first must not be stored either
+        {**export, "files": [export["files"][0], {**export["files"][0], "file": "b.csv", "summary": {}}]},
+        {**export, "files": [export["files"][0], export["files"][0]]},
+    ]
+    for candidate in bad:
+        with pytest.raises(ValueError):
+            hub.import_export(candidate)
+    assert not os.path.exists(tmp_path / "hub" / "sites")
+    assert not os.path.exists(tmp_path / "etc")
+    assert hub.import_export(export)["added"] == 1
+
+def test_replaced_summary_is_never_listed_twice(tmp_path):
+    hub = SummaryHub(str(tmp_path / "hub"))
+    path = write_log(tmp_path / "line.csv", days=2, per_day=1, alarm="ALM_3021")
+    hub.import_export(export_site([path], site="north", cache_dir=str(tmp_path / "cache")))
+    reader = SummaryHub(str(tmp_path / "hub"))
+
+    write_log(tmp_path / "line.csv", days=3, per_day=1, alarm="ALM_3021")
+    hub.import_export(export_site([path], site="north", cache_dir=str(tmp_path / "cache")))
+    stored = os.listdir(tmp_path / "hub" / "sites" / "north")
+    assert len(stored) == 1 and stored[0].endswith(".json")
+    assert reader.refresh(max_age_s=0) == 1
+    assert reader.stats()["rows"] == hub.stats()["rows"] == 3
+
+def test_cooccurrence_does_not_depend_on_row_order():
+    rows = [{"timestamp": f"2024-03-01 08:0{m}:00", "machine": "M1", "alarm": alarm}
+            for m, alarm in [(0, "ALM_3021"), (1, "ALM_1001"), (9, "ALM_5521")]]
+    ordered, shuffled = LogSummary(), LogSummary()
+    ordered.add_chunk(pd.DataFrame(rows))
+    shuffled.add_chunk(pd.DataFrame(rows[::-1]))
+    assert shuffled.cooccurrence == ordered.cooccurrence == {"ALM_1001|ALM_3021": 1}
+
+def test_every_worker_reports_the_same_import_time(tmp_path):
+    hub = SummaryHub(str(tmp_path / "hub"))
+    hub.import_export(site_export(tmp_path, "north", [{"days": 1, "per_day": 1, "alarm": "ALM_3021"}]))
+    other = SummaryHub(str(tmp_path / "hub"))
+    assert hub.site_list()[0]["imported_at"] is not None
+    assert other.site_list()[0]["imported_at"] == hub.site_list()[0]["imported_at"]
+
+def test_summary_cache_is_keyed_by_layout(tmp_path, monkeypatch):
+    from ingest import summary
+
+    path = write_log(tmp_path / "line.csv", days=1, per_day=1, alarm="ALM_3021")
+    summary.summarize_file(path, cache_dir=str(tmp_path / "cache"))
+    summary.summarize_file(path, cache_dir=str(tmp_path / "cache"))
+    assert len(os.listdir(tmp_path / "cache")) == 1
+    monkeypatch.setattr(summary, "FORMAT_VERSION", summary.FORMAT_VERSION + 1)
+    summary.summarize_file(path, cache_dir=str(tmp_path / "cache"))
+    assert len(os.listdir(tmp_path / "cache")) == 2
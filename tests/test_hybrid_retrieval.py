@@ -0,0 +1,72 @@
+import sys
+import os
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_core.documents import Document
+from rag.hybrid import HybridRetriever
+
+CORPUS = [
+    Document(page_content="Fault Code: ALM_3021. Description: Pneumatic vacuum alarm.", id="m1"),
+    Document(page_content="Fault Code: ALM_1001. Description: Emergency Stop.", id="m2"),
+    Document(page_content="At 2020-06-01 08:23:11, Machine_3 triggered alarm ALM_3021.", id="l1"),
+    Document(page_content="Vacuum pump maintenance schedule and seal inspection.", id="k1"),
+]
+
+class SlowVectorStore:
+    """Returns fixed neighbours after a delay, standing in for Chroma."""
+
+    def __init__(self, ids, delay=0.2):
+        self.ids = ids
+        self.delay = delay
+
+    def similarity_search(self, query, k=4):
+        time.sleep(self.delay)
+        by_id = {d.id: d for d in CORPUS}
+        extra = Document(page_content="Newly indexed vacuum note.", id="new")
+        return [by_id.get(i, extra) for i in self.ids][:k]
+
+    def similarity_search_by_vector(self, embedding, k=4):
+        return self.similarity_search(None, k=k)
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return [[0.0] for _ in texts]
+
+def test_rrf_rewards_agreement_between_legs():
+    retriever = HybridRetriever(SlowVectorStore(["k1", "m1"], delay=0), CORPUS, ids=[d.id for d in CORPUS])
+    results = retriever.search("ALM_3021 vacuum", k=3)
+
+    assert results[0][0].id == "m1"
+    assert [score for _, score in results] == sorted((score for _, score in results), reverse=True)
+
+def test_unseen_vector_hits_are_appended():
+    retriever = HybridRetriever(SlowVectorStore(["new"], delay=0), CORPUS)
+    docs = retriever.invoke("vacuum", k=5)
+
+    assert any(d.id == "new" for d in docs)
+    assert len(retriever.documents) == len(CORPUS) + 1
+
+def test_legs_run_concurrently():
+    retriever = HybridRetriever(SlowVectorStore(["m1"], delay=0.2), CORPUS)
+    retriever.search("ALM_3021", k=2)
+    timings = retriever.last_timings
+
+    assert timings["vector_s"] >= 0.2
+    assert timings["total_s"] < timings["vector_s"] + 0.1
+    assert timings["keyword_hits"] == 2
+
+def test_batched_searches_embed_once_and_run_concurrently():
+    store = SlowVectorStore(["m1"], delay=0.2)
+    store.embeddings = CountingEmbeddings()
+    retriever = HybridRetriever(store, CORPUS)
+    t0 = time.perf_counter()
+    results = retriever.search_many(["ALM_3021", "ALM_1001", "vacuum", "seal"], k=2)
+
+    assert time.perf_counter() - t0 < 0.5
+    assert store.embeddings.calls == 1
+    assert "m2" in [doc.id for doc, _ in results[1]]
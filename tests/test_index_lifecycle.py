@@ -0,0 +1,156 @@
+import sys
+import os
+import json
+import sqlite3
+import threading
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+
+from rag.codes import CodeIndex
+from rag.lifecycle import IndexMaintenance, build_filter, collection_metadata, load_config, retention_filter
+
+class StoreStandIn:
+    """The parts of Indexer that snapshots touch, over a bare SQLite file."""
+
+    def __init__(self, persist_dir):
+        self.persist_dir = persist_dir
+        self.collection_name = "plc_logs"
+        self.collection_metadata = {"hnsw:M": 32}
+        self.lock = threading.RLock()
+        self.reopened = 0
+        os.makedirs(os.path.join(persist_dir, "segment"), exist_ok=True)
+        with open(os.path.join(persist_dir, "segment", "data_level0.bin"), "wb") as f:
+            f.write(b"\0" * 64)
+
+    def write(self, text):
+        with sqlite3.connect(os.path.join(self.persist_dir, "chroma.sqlite3")) as db:
+            db.execute("CREATE TABLE IF NOT EXISTS docs (text TEXT)")
+            db.execute("INSERT INTO docs VALUES (?)", (text,))
+
+    def read(self):
+        with sqlite3.connect(os.path.join(self.persist_dir, "chroma.sqlite3")) as db:
+            return [row[0] for row in db.execute("SELECT text FROM docs")]
+
+    def count(self):
+        return len(self.read())
+
+    def close(self):
+        pass
+
+    def reopen(self):
+        self.reopened += 1
+
+def test_retention_filters():
+    assert retention_filter({"source": "log_history", "max_age_days": 1}, now=86400 * 10) == \
+        {"$and": [{"source": "log_history"}, {"ingested_at": {"$lt": 86400 * 9}}]}
+    assert build_filter({"file": "line3.csv"}) == {"file": "line3.csv"}
+    with pytest.raises(ValueError):
+        retention_filter({"source": "log_history"})
+    with pytest.raises(ValueError):
+        build_filter({})
+
+def test_config_sets_hnsw_per_collection(tmp_path, monkeypatch):
+    path = tmp_path / "index_config.json"
+    path.write_text(json.dumps({"collections": {"plc_logs": {"hnsw": {"M": 32, "search_ef": 64}}}}))
+    monkeypatch.setenv("PLC_LOG_RETENTION_DAYS", "30")
+    config = load_config(str(path))
+
+    assert collection_metadata(config, "plc_logs") == {"hnsw:M": 32, "hnsw:search_ef": 64}
+    assert collection_metadata(config, "other") is None
+    assert config["retention"] == [{"source": "log_history", "max_age_days": 30.0}]
+    with pytest.raises(ValueError):
+        collection_metadata({"collections": {"plc_logs": {"hnsw": {"ef": 1}}}}, "plc_logs")
+
+def test_snapshot_and_restore_round_trip(tmp_path):
+    store = StoreStandIn(str(tmp_path / "chroma_db"))
+    store.write("At 08:00, Machine_1 triggered alarm ALM_3021.")
+    code_index = CodeIndex(path=str(tmp_path / "code_index.json"))
+    code_index.tags["PX_101"] = [{"text": "| Tag |\n| PX_101 |", "metadata": {}}]
+    manifest = tmp_path / "file_metadata.json"
+    manifest.write_text(json.dumps([{"filename": "sample.csv"}]))
+    changes = []
+    maintenance = IndexMaintenance(store, code_index=code_index, config={}, snapshot_dir=str(tmp_path / "snaps"),
+                                   manifests=[str(manifest)], on_change=lambda: changes.append(1))
+
+    info = maintenance.snapshot("before")
+    assert info["documents"] == 1 and info["hnsw"] == {"hnsw:M": 32}
+    assert [s["name"] for s in maintenance.snapshots()] == ["before"]
+    with pytest.raises(ValueError):
+        maintenance.snapshot("before")
+
+    store.write("At 09:00, Machine_2 triggered alarm ALM_1001.")
+    code_index.tags.clear()
+    manifest.write_text("[]")
+
+    result = maintenance.restore("before")
+    assert store.read() == ["At 08:00, Machine_1 triggered alarm ALM_3021."]
+    assert os.path.exists(result["previous"])
+    assert "PX_101" in code_index.tags
+    assert json.loads(manifest.read_text()) == [{"filename": "sample.csv"}]
+    assert store.reopened == 1 and changes == [1]
+    assert set(maintenance.last) == {"snapshot", "restore"}
+
+def test_snapshot_names_stay_inside_the_snapshot_dir(tmp_path):
+    store = StoreStandIn(str(tmp_path / "chroma_db"))
+    store.write("At 08:00, Machine_1 triggered alarm ALM_3021.")
+    maintenance = IndexMaintenance(store, config={}, snapshot_dir=str(tmp_path / "snaps"), manifests=[])
+    for name in ["../../x", "..", ".", "a/b", "snap shot"]:
+        with pytest.raises(ValueError):
+            maintenance.snapshot(name)
+        with pytest.raises(ValueError):
+            maintenance.restore(name)
+    assert not (tmp_path / "x").exists()
+    assert maintenance.snapshot("nightly-2024.05_01")["name"] == "nightly-2024.05_01"
+
+class HashEmbeddings:
+    """Deterministic 8-dimensional embeddings, so Chroma runs without a model."""
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        return [((hash(text) >> (i * 4)) % 16 + 1) / 16 for i in range(8)]
+
+def real_indexer(tmp_path, **kwargs):
+    pytest.importorskip("chromadb")
+    pytest.importorskip("langchain_chroma")
+    embed = pytest.importorskip("rag.embed")
+    return embed.Indexer(persist_dir=str(tmp_path / "chroma_db"), embeddings=HashEmbeddings(), **kwargs)
+
+def test_sweep_and_delete_on_a_real_collection(tmp_path):
+    indexer = real_indexer(tmp_path)
+    indexer.ingest_logs([f"Machine_1 alarm {i}" for i in range(5)], metadata={"file": "old.csv"})
+    indexer.ingest_logs([f"Machine_2 alarm {i}" for i in range(3)], metadata={"file": "new.csv"})
+    # Stored before ingested_at existed: the sweep backfills it and keeps the document
+    indexer.collection.add(ids=["legacy"], embeddings=[HashEmbeddings().embed_query("legacy")],
+                           documents=["legacy row"], metadatas=[{"source": "log_history"}])
+    maintenance = IndexMaintenance(indexer, config={}, snapshot_dir=str(tmp_path / "snaps"), manifests=[])
+
+    result = maintenance.sweep([{"source": "log_history", "max_age_days": 1}], now=time.time() + 2 * 86400)
+    assert result["deleted"] == 8
+    assert indexer.count() == 1 and maintenance.last["backfill"] == {"stamped": 1}
+
+    indexer.ingest_logs(["Machine_3 alarm"], metadata={"file": "line3.csv"})
+    assert maintenance.delete(file="line3.csv")["deleted"] == 1
+    stats = maintenance.stats()
+    assert stats["documents"] == 1 and stats["by_source"] == {"log_history": 1}
+
+def test_rebuild_and_restore_on_a_real_collection(tmp_path):
+    indexer = real_indexer(tmp_path)
+    indexer.ingest_logs([f"Machine_1 alarm {i}" for i in range(20)])
+    maintenance = IndexMaintenance(indexer, config={}, snapshot_dir=str(tmp_path / "snaps"), manifests=[])
+    maintenance.snapshot("before")
+    hits = [doc.page_content for doc in indexer.vector_store.similarity_search("Machine_1 alarm 7", k=1)]
+
+    result = maintenance.rebuild({"M": 32, "search_ef": 64})
+    assert result["documents"] == 20 and result["hnsw"] == {"hnsw:M": 32, "hnsw:search_ef": 64}
+    assert indexer.count() == 20
+    assert indexer.collection.metadata["hnsw:M"] == 32
+    assert [doc.page_content for doc in indexer.vector_store.similarity_search("Machine_1 alarm 7", k=1)] == hits
+    assert [getattr(c, "name", c) for c in indexer.vector_store._client.list_collections()] == ["plc_logs"]
+
+    indexer.ingest_logs(["after the snapshot"])
+    maintenance.restore("before")
+    assert indexer.count() == 20
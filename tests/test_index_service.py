@@ -0,0 +1,121 @@
+import sys
+import os
+import threading
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+
+from langchain_core.documents import Document
+from rag.codes import CodeIndex
+from rag.index_service import CodeIndexClient, IndexClient, IndexService, check_listen_address
+
+class MemoryIndexer:
+    def __init__(self):
+        self.texts = []
+        self.delay = 0
+
+    def ingest_logs(self, texts, metadata=None):
+        time.sleep(self.delay)
+        self.texts.extend(texts)
+
+class MemoryRetriever:
+    """Substring search over whatever was ingested when it was built."""
+
+    batch_sizes = []
+
+    def __init__(self, texts):
+        self.texts = list(texts)
+
+    def search_many(self, queries, k=5):
+        MemoryRetriever.batch_sizes.append(len(queries))
+        time.sleep(0.02)
+        return [[(Document(page_content=t), 1.0) for t in self.texts if q in t][:k] for q in queries]
+
+    def stats(self):
+        return {"documents": len(self.texts)}
+
+def start_service(tmp_path):
+    indexer = MemoryIndexer()
+    service = IndexService(indexer, lambda: MemoryRetriever(indexer.texts),
+                           CodeIndex(path=str(tmp_path / "codes.json")), batch_window_s=0.01)
+    address = str(tmp_path / "index.sock")
+    listener = service.listen(address)
+    threading.Thread(target=service.accept_loop, args=(listener,), daemon=True).start()
+    return service, address, listener
+
+def test_writes_are_visible_to_later_reads(tmp_path):
+    service, address, listener = start_service(tmp_path)
+    client = IndexClient(address)
+
+    assert client.query("ALM_3021") == []
+    client.ingest_logs(["At 08:23, Machine_3 triggered alarm ALM_3021."])
+    assert [d.page_content for d in client.query("ALM_3021")] == ["At 08:23, Machine_3 triggered alarm ALM_3021."]
+    assert client.stats()["documents"] == 1
+    listener.close()
+
+def test_concurrent_reads_are_batched(tmp_path):
+    service, address, listener = start_service(tmp_path)
+    client = IndexClient(address)
+    client.ingest_logs([f"ALM_{i}" for i in range(8)])
+    MemoryRetriever.batch_sizes.clear()
+
+    results = {}
+    def worker(i):
+        results[i] = client.query(f"ALM_{i}")
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert all(results[i][0].page_content == f"ALM_{i}" for i in range(8))
+    assert max(MemoryRetriever.batch_sizes) > 1
+    listener.close()
+
+def test_code_index_is_shared_through_the_service(tmp_path):
+    service, address, listener = start_service(tmp_path)
+    codes = CodeIndexClient(IndexClient(address))
+    codes.add_documents([Document(page_content="Reset ALM_3021 from the HMI.", metadata={"source": "soo.pdf"})])
+
+    hits = codes.lookup("machine_3 alm_3021")
+    assert hits.codes == ["ALM_3021"]
+    assert codes.stats()["kb_mentions"] == 1
+    listener.close()
+
+def test_reads_are_not_held_up_by_writes(tmp_path):
+    service, address, listener = start_service(tmp_path)
+    client = IndexClient(address)
+    client.ingest_logs(["ALM_3021"])
+    service.indexer.delay = 0.5
+
+    writer = threading.Thread(target=client.ingest_logs, args=(["ALM_1001"],))
+    writer.start()
+    time.sleep(0.05)
+    t0 = time.perf_counter()
+    assert client.query("ALM_3021")[0].page_content == "ALM_3021"
+    assert time.perf_counter() - t0 < 0.3
+    writer.join()
+    assert client.query("ALM_1001")[0].page_content == "ALM_1001"
+    listener.close()
+
+def test_tcp_needs_a_real_authkey():
+    with pytest.raises(ValueError):
+        check_listen_address("0.0.0.0:7070", b"plc-index")
+    check_listen_address("0.0.0.0:7070", b"a-long-random-secret")
+    check_listen_address("/run/plc-index/index.sock", b"plc-index")
+
+def test_streamed_writes_rebuild_the_keyword_index_at_most_once_per_interval(tmp_path):
+    service, address, listener = start_service(tmp_path)
+    client = IndexClient(address)
+    client.query("ALM")
+    built = service.retriever
+
+    for i in range(5):
+        client.ingest_logs([f"ALM_{i}"], max_staleness_s=0.3)
+        assert service.retriever is built
+    # The trailing rebuild makes the last batch searchable once the interval is up
+    time.sleep(0.45)
+    assert [d.page_content for d in client.query("ALM_4")] == ["ALM_4"]
+    assert service.retriever is not built
+    listener.close()
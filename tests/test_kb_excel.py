@@ -0,0 +1,96 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+
+from ingest.parse_kb import KnowledgeBaseIngestor
+from rag.codes import CodeIndex
+
+def io_list(n):
+    yield ("Project I/O List", None, None, None)
+    yield (None, None, None, None)
+    yield ("Tag", "PLC Address", "Description", None)
+    for i in range(n):
+        yield (f"PX_{100 + i}", f"%I{i // 8}.{i % 8}", f"Pressure switch {i} | line 2", None)
+
+def test_sheet_rows_become_chunks_with_header():
+    ingestor = KnowledgeBaseIngestor(chunk_size=600)
+    docs = list(ingestor.sheet_documents(io_list(500), "IO", "io_list.xlsx"))
+
+    assert len(docs) > 10
+    rows = 0
+    for doc in docs:
+        lines = doc.page_content.splitlines()
+        assert lines[0].startswith("Sheet: IO (rows ") and lines[0].endswith(" - Project I/O List")
+        assert lines[2] == "| Tag | PLC Address | Description |"
+        assert "Pressure switch 0 \\| line 2" in docs[0].page_content
+        rows += len(lines) - 4
+        assert len(doc.page_content) <= 600 + 120
+        assert doc.metadata["sheet"] == "IO" and doc.metadata["type"] == "excel"
+    assert rows == 500
+    assert docs[0].metadata["row_start"] == 4
+    assert docs[-1].metadata["row_end"] == 503
+
+def test_tag_columns_are_indexed_for_exact_lookup(tmp_path):
+    rows = [("Tag", "PLC Address", "Description")] + \
+           [(f"PX_{100 + i}", f"%I{i // 8}.{i % 8}", f"Pressure switch {i}") for i in range(200)] + \
+           [("SPARE", "%I99.0", "")]
+    docs = list(KnowledgeBaseIngestor().sheet_documents(iter(rows), "IO", "io_list.xlsx"))
+    assert docs[0].metadata["tag_columns"] == "Tag,PLC Address"
+
+    index = CodeIndex(path=str(tmp_path / "code_index.json"))
+    index.add_documents(docs)
+    index.save()
+    index = CodeIndex(path=str(tmp_path / "code_index.json"))
+    index.load()
+
+    hits = index.lookup("Why is %I18.3 not switching?")
+    assert hits.tags == ["%I18.3"]
+    assert not hits.exact
+    assert hits.related[0].page_content == \
+        "| Tag | PLC Address | Description |\n| PX_247 | %I18.3 | Pressure switch 147 |"
+    assert index.lookup("px_247, again").related[0].metadata["tag"] == "PX_247"
+    assert index.lookup("check the spare input") is None
+    assert index.stats()["tags"] == 401
+
+def test_parse_excel_streams_workbook(tmp_path):
+    openpyxl = pytest.importorskip("openpyxl")
+    path = tmp_path / "io_list.xlsx"
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("Rack1")
+    for row in io_list(300):
+        sheet.append(row)
+    workbook.save(path)
+
+    docs = KnowledgeBaseIngestor().process_file(str(path))
+    assert all(d.metadata["sheet"] == "Rack1" for d in docs)
+    assert sum(len(d.page_content.splitlines()) - 4 for d in docs) == 300
+
+def test_single_column_sheets_keep_their_rows():
+    rows = [("Alarm text",), ("Motor overload",), ("Door open",), (None,), ("E-stop pressed",)]
+    docs = list(KnowledgeBaseIngestor().sheet_documents(iter(rows), "Texts", "texts.xlsx"))
+    assert len(docs) == 1
+    assert docs[0].page_content.splitlines() == [
+        "Sheet: Texts (rows 2-5)", "",
+        "| Alarm text |", "| --- |", "| Motor overload |", "| Door open |", "| E-stop pressed |"]
+
+    rows = [(f"Line {i}",) for i in range(20)]
+    docs = list(KnowledgeBaseIngestor().sheet_documents(iter(rows), "Texts", "texts.xlsx"))
+    assert sum(len(d.page_content.splitlines()) - 4 for d in docs) == 19
+    assert docs[0].page_content.splitlines()[2] == "| Line 0 |"
+
+def test_cells_past_the_header_get_their_own_columns():
+    rows = [("Tag", "Description"), ("PX_100", "Pressure switch"), ("PX_101", "Level switch", "spare since 2019")]
+    docs = list(KnowledgeBaseIngestor().sheet_documents(iter(rows), "IO", "io_list.xlsx"))
+    assert [d.metadata["row_start"] for d in docs] == [2, 3]
+    assert docs[1].page_content.splitlines()[2:] == [
+        "| Tag | Description | Column 3 |", "| --- | --- | --- |",
+        "| PX_101 | Level switch | spare since 2019 |"]
+
+def test_directory_is_yielded_in_batches(tmp_path):
+    from ingest.parse_kb import batched
+
+    docs = KnowledgeBaseIngestor().process_directory(str(tmp_path))
+    assert not isinstance(docs, list)
+    assert [len(b) for b in batched(iter(range(600)), 256)] == [256, 256, 88]
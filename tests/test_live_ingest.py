@@ -0,0 +1,101 @@
+import sys
+import os
+import threading
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi.testclient import TestClient
+
+from ingest.live import InProcessPublisher, LiveIngestor, parse_ndjson
+
+EVENTS = [{"timestamp": f"2026-01-01 08:00:{i:02d}", "machine": "Machine_1", "alarm": f"ALM_{3000 + i}"}
+          for i in range(20)]
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+def test_published_events_are_indexed_in_batches():
+    indexed = []
+    ingestor = LiveIngestor(indexed.extend, batch_size=8, batch_window_s=0.05)
+    ingestor.start()
+    publisher = InProcessPublisher(ingestor, timeout=1)
+    publisher.replay(EVENTS + [{"machine": "Machine_2"}], batch=5)
+
+    assert wait_for(lambda: len(indexed) == 20)
+    publisher.stop()
+    ingestor.stop()
+    assert indexed[0] == "At 2026-01-01 08:00:00, Machine_1 triggered alarm ALM_3000."
+    stats = ingestor.stats()
+    assert stats["indexed"] == 20 and stats["invalid"] == 1 and stats["dropped"] == 0
+    assert 1 < stats["batches"] <= 20
+
+def test_full_queue_applies_backpressure():
+    release = threading.Event()
+    indexed = []
+
+    def slow_sink(texts):
+        release.wait()
+        indexed.extend(texts)
+
+    ingestor = LiveIngestor(slow_sink, max_queue=5, batch_size=1, batch_window_s=0)
+    ingestor.start()
+    assert ingestor.offer([EVENTS[0]]) == (1, 0)
+    # The worker is now stuck in the sink with one event; five more fill the queue
+    assert wait_for(lambda: ingestor.stats()["queue_depth"] == 0)
+    assert ingestor.offer(EVENTS[1:10]) == (5, 4)
+
+    release.set()
+    ingestor.stop()
+    assert len(indexed) == 6
+    assert ingestor.stats()["dropped"] == 4
+
+def test_ndjson_endpoint_answers_429_when_full():
+    from backend.api import deps
+    from backend.api.main import app
+
+    ingestor = LiveIngestor(lambda texts: None, max_queue=3)
+    deps._cache["live_ingestor"] = ingestor
+    try:
+        client = TestClient(app)
+        body = "\n".join(['{"alarm": "ALM_1"}', "not json", '{"alarm": "ALM_2"}'])
+        response = client.post("/api/ingest/events", content=body)
+        assert response.status_code == 200
+        assert response.json() == {"accepted": 2, "dropped": 0, "invalid": 1, "truncated": False, "queue_depth": 2}
+
+        response = client.post("/api/ingest/events", content='{"alarm": "ALM_3"}\n{"alarm": "ALM_4"}\n')
+        assert response.status_code == 429
+        assert response.json()["dropped"] == 1 and response.json()["truncated"]
+
+        # A full queue is refused before the body is read
+        def body():
+            yield b'{"alarm": "ALM_9"}\n'
+            raise AssertionError("body was read")
+        response = client.post("/api/ingest/events", content=body())
+        assert response.status_code == 429 and response.json()["accepted"] == 0
+
+        with client.websocket_connect("/api/ingest/ws") as ws:
+            ingestor.drain()
+            ws.send_text('{"alarm": "ALM_5", "state": "FAULT"}')
+            assert ws.receive_json()["accepted"] == 1
+    finally:
+        deps._cache.pop("live_ingestor", None)
+
+def test_parse_ndjson_maps_alternate_columns():
+    events, invalid = parse_ndjson(['{"alarm_code": "E-17", "machine_id": "Press_2"}', "[1, 2]", ""])
+    assert invalid == 1
+    assert events[0]["alarm"] == "E-17" and events[0]["machine"] == "Press_2"
+
+def test_mixed_state_events_are_textualized_without_nan():
+    indexed = []
+    ingestor = LiveIngestor(indexed.extend, batch_size=8, batch_window_s=0.05)
+    ingestor.start()
+    events, invalid = parse_ndjson(['{"timestamp": "08:00", "machine": "M1", "alarm": "ALM_1", "state": "FAULT"}',
+                                    '{"timestamp": "08:01", "machine": "M1", "alarm": "ALM_2"}'])
+    ingestor.offer(events)
+    assert wait_for(lambda: len(indexed) == 2)
+    ingestor.stop()
+    assert indexed == ["At 08:00, M1 triggered alarm ALM_1. The machine state was recorded as 'FAULT'.",
+                       "At 08:01, M1 triggered alarm ALM_2."]
@@ -0,0 +1,136 @@
+import sys
+import os
+import json
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+
+from ingest.follow import LogFollower
+
+HEADER = "timestamp,machine,alarm\n"
+
+def follower(tmp_path, path, batches):
+    return LogFollower(str(path), sink=batches.append, state_dir=str(tmp_path / "state"), batch_rows=2)
+
+def test_follow_reads_only_appended_rows(tmp_path):
+    path = tmp_path / "line.csv"
+    path.write_text(HEADER + "2026-01-01 08:00:00,Machine_1,ALM_3021\n")
+    batches = []
+    f = follower(tmp_path, path, batches)
+
+    assert f.poll() == 1
+    with open(path, "a") as out:
+        out.write("2026-01-01 08:00:05,Machine_2,ALM_1001\n2026-01-01 08:00:09,Machine_3,ALM_")
+    # The half-written last row waits for its newline
+    assert f.poll() == 1
+    assert batches[-1] == ["At 2026-01-01 08:00:05, Machine_2 triggered alarm ALM_1001."]
+    assert f.lag()["bytes"] > 0
+
+    with open(path, "a") as out:
+        out.write("2002\n")
+    assert f.poll() == 1
+    assert batches[-1] == ["At 2026-01-01 08:00:09, Machine_3 triggered alarm ALM_2002."]
+    assert f.lag()["bytes"] == 0
+    assert f.poll() == 0
+
+def test_follow_resumes_from_saved_offset(tmp_path):
+    path = tmp_path / "line.csv"
+    path.write_text(HEADER + "2026-01-01 08:00:00,Machine_1,ALM_3021\n")
+    follower(tmp_path, path, []).poll()
+    with open(path, "a") as out:
+        out.write("2026-01-01 08:01:00,Machine_1,ALM_3022\n")
+
+    batches = []
+    assert follower(tmp_path, path, batches).poll() == 1
+    assert batches == [["At 2026-01-01 08:01:00, Machine_1 triggered alarm ALM_3022."]]
+
+def test_follow_handles_rotation_and_truncation(tmp_path):
+    path = tmp_path / "line.csv"
+    path.write_text(HEADER + "2026-01-01 08:00:00,Machine_1,ALM_3021\n")
+    batches = []
+    f = follower(tmp_path, path, batches)
+    f.poll()
+
+    # Rows written just before rotation are still read from the old file
+    with open(path, "a") as out:
+        out.write("2026-01-01 08:00:01,Machine_1,ALM_3022\n")
+    os.rename(path, tmp_path / "line.csv.1")
+    path.write_text(HEADER + "2026-01-01 09:00:00,Machine_2,ALM_4000\n")
+    assert f.poll() == 2
+    assert f.state["rotations"] == 1
+
+    path.write_text(HEADER)
+    assert f.poll() == 0
+    assert f.state["truncations"] == 1
+    with open(path, "a") as out:
+        out.write("2026-01-01 10:00:00,Machine_4,ALM_5000\n")
+    assert f.poll() == 1
+    assert batches[-1] == ["At 2026-01-01 10:00:00, Machine_4 triggered alarm ALM_5000."]
+    f.stop()
+
+def test_one_process_follows_a_file_and_others_can_stop_it(tmp_path):
+    path = tmp_path / "line.csv"
+    path.write_text(HEADER + "2026-01-01 08:00:00,Machine_1,ALM_3021\n")
+    owner = follower(tmp_path, path, [])
+    owner.poll_interval = 0.05
+    other = follower(tmp_path, path, [])
+
+    assert owner.start()
+    assert not other.start()
+    assert other.status()["running"]
+
+    other.request_stop()
+    owner._thread.join(timeout=2)
+    assert not owner.running
+    assert not other.status()["running"]
+    assert other.start()
+    other.stop()
+
+def test_lag_grows_while_the_follower_is_behind(tmp_path):
+    path = tmp_path / "line.csv"
+    path.write_text(HEADER + "2026-01-01 08:00:00,Machine_1,ALM_3021\n")
+    f = follower(tmp_path, path, [])
+    f.poll()
+    assert f.lag() == {"bytes": 0, "seconds": 0.0}
+
+    f.state["caught_up_at"] -= 30
+    with open(path, "a") as out:
+        out.write("2026-01-01 08:00:05,Machine_2,ALM_1001\n")
+    assert f.lag()["seconds"] >= 30
+
+def test_last_streamed_batch_becomes_searchable(monkeypatch):
+    import time
+    from backend.api import deps
+
+    monkeypatch.setattr(deps, "INDEX_SERVICE", None)
+    monkeypatch.setitem(deps._cache, "retriever", object())
+    monkeypatch.setitem(deps._built, "retriever", time.monotonic())
+    deps.invalidate_retriever(max_staleness_s=0.1)
+    assert "retriever" in deps._cache
+    # No further writes arrive, yet the stale keyword index is still dropped
+    time.sleep(0.3)
+    assert "retriever" not in deps._cache
+
+def test_rows_survive_a_failing_sink_and_bad_lines(tmp_path):
+    path = tmp_path / "line.ndjson"
+    rows = [{"timestamp": f"2026-01-01 08:00:0{i}", "machine": "Machine_1", "alarm": f"ALM_{i}"} for i in range(5)]
+    lines = [json.dumps(r) for r in rows]
+    path.write_text("\n".join(lines[:3] + ['{"timestamp": "broken'] + lines[3:]) + "\n")
+    batches, calls = [], []
+
+    def flaky(texts):
+        calls.append(texts)
+        if len(calls) == 2:
+            raise ConnectionError("index service unreachable")
+        batches.append(texts)
+
+    f = LogFollower(str(path), sink=flaky, state_dir=str(tmp_path / "state"), batch_rows=2)
+    with pytest.raises(ConnectionError):
+        f.poll()
+    # A restarted follower resumes from the last batch that reached the sink
+    f = LogFollower(str(path), sink=flaky, state_dir=str(tmp_path / "state"), batch_rows=2)
+    f.poll()
+    texts = [t for batch in batches for t in batch]
+    assert texts == [f"At 2026-01-01 08:00:0{i}, Machine_1 triggered alarm ALM_{i}." for i in range(5)]
+    assert f.status()["bad_lines"] == 1
+    assert f.lag()["bytes"] == 0
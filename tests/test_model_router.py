@@ -0,0 +1,48 @@
+import sys
+import os
+import json
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from rag.router import RRF_MAX, ModelRouter, easiness, feedback_stats, retrieval_features
+
+def test_exact_code_hit_with_short_context_is_easy():
+    features = retrieval_features({"mode": "code_index", "codes": ["ALM_3021"]}, context_tokens=300)
+    assert features == {"exact": True, "top_share": 1.0, "margin": 1.0, "context_tokens": 300}
+    assert easiness(features) == 1.0
+    # Long context pulls even an exact hit towards the large model
+    assert easiness({**features, "context_tokens": 2400}, long_context_tokens=1200) == 0.5
+
+def test_hybrid_scores_use_share_and_margin():
+    dominant = retrieval_features({"mode": "hybrid", "scores": [RRF_MAX, 0.1 * RRF_MAX]}, 400)
+    close = retrieval_features({"mode": "hybrid", "scores": [RRF_MAX, 0.98 * RRF_MAX]}, 400)
+    assert dominant["margin"] == 0.9 and close["margin"] == 0.02
+    assert easiness(dominant) > 0.6 > easiness(close)
+    assert easiness(retrieval_features({"mode": "hybrid", "scores": []}, 400)) == 0.0
+
+def test_router_sends_easy_queries_to_the_small_model():
+    router = ModelRouter(large_model="mistral", small_model="llama3.2:3b", threshold=0.6)
+    easy = router.decide({"mode": "code_index"}, 200)
+    hard = router.decide({"mode": "hybrid", "scores": [0.01, 0.0099]}, 200)
+    assert (easy.route, easy.model) == ("small", "llama3.2:3b")
+    assert (hard.route, hard.model) == ("large", "mistral")
+
+    router.record(easy, 1.0)
+    router.record(easy, 3.0)
+    routes = router.latency_stats()
+    assert routes["small"]["decisions"] == 1 and routes["small"]["avg_s"] == 2.0
+    assert routes["large"] == {"decisions": 1, "generations": 0}
+
+    # Without a small model everything is scored but stays on the large one
+    assert ModelRouter(large_model="mistral", small_model=None).decide({"mode": "code_index"}, 200).route == "large"
+
+def test_feedback_stats_per_route(tmp_path):
+    path = tmp_path / "feedback_logs.json"
+    path.write_text(json.dumps([
+        {"query": "ALM_3021", "response": "{}", "rating": "Good"},
+        {"query": "ALM_3021", "response": "{}", "rating": "good", "route": "small", "model": "llama3.2:3b"},
+        {"query": "ALM_1001", "response": "{}", "rating": "Bad", "route": "small", "model": "llama3.2:3b"},
+    ]))
+    stats = feedback_stats(str(path))
+    assert stats["unrouted"] == {"total": 1, "ratings": {"good": 1}, "good_share": 1.0}
+    assert stats["small"]["good_share"] == 0.5
+    assert feedback_stats(str(tmp_path / "missing.json")) == {}
@@ -0,0 +1,114 @@
+import sys
+import os
+import threading
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.api import profiling
+
+def busy_parse(seconds):
+    end = time.perf_counter() + seconds
+    rows = []
+    while time.perf_counter() < end:
+        rows.append(str(len(rows)) * 10)
+    return rows
+
+def test_profile_records_stages_cpu_and_memory():
+    profile = profiling.RequestProfile("POST", "/api/process")
+    profile.start()
+    with profiling.active(profile):
+        with profiling.stage("parse"):
+            worker = threading.Thread(target=busy_parse, args=(0.15,))
+            worker.start()
+            worker.join()
+        with profiling.stage("index"):
+            time.sleep(0.01)
+    capture = profile.finish(200)
+
+    assert [s["stage"] for s in capture["stages"]] == ["parse", "index"]
+    assert capture["cpu"]["samples"] > 5
+    assert any(f["function"] == "test_profiling.py:busy_parse" for f in capture["cpu"]["cumulative"])
+    assert "test_profiling.py:busy_parse" in capture["_folded"]
+    assert capture["memory"]["peak_traced_bytes"] > 0
+    # Outside a profiled request, stages cost nothing and record nothing
+    with profiling.stage("parse"):
+        pass
+    assert profile.stage_counts["parse"] == 1
+
+def test_saved_captures_are_summarized_slowest_first(tmp_path):
+    for i, duration in enumerate([0.5, 2.0, 1.0]):
+        profile = profiling.RequestProfile("POST", "/api/kb/process")
+        profile.id += f"-{i}"
+        profile.start()
+        capture = profile.finish(200)
+        capture["duration_s"] = duration
+        profiling.save(capture, directory=str(tmp_path), keep=2)
+
+    rows = profiling.summary(directory=str(tmp_path))
+    assert [r["duration_s"] for r in rows] == [2.0, 1.0]
+    assert len(list(tmp_path.iterdir())) == 4
+    assert profiling.load(rows[0]["id"], directory=str(tmp_path))["path"] == "/api/kb/process"
+
+def test_profile_flag_on_requests(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    from backend.api.main import app
+
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    client = TestClient(app)
+
+    assert "x-profile-id" not in client.get("/api/health").headers
+    profile_id = client.get("/api/health", headers={"X-Profile": "1"}).headers["x-profile-id"]
+    assert os.path.exists(tmp_path / f"{profile_id}.json")
+    assert profiling.requested({}, {"profile": "true"})
+    assert not profiling.requested({"x-profile": "0"}, {})
+
+def test_overlapping_captures_do_not_reset_each_others_peak():
+    first = profiling.RequestProfile("POST", "/api/kb/process")
+    first.start()
+    rows = busy_parse(0.05)
+    second = profiling.RequestProfile("GET", "/api/health")
+    second.start()
+    second_capture = second.finish(200)
+    del rows
+    first_capture = first.finish(200)
+
+    assert first_capture["memory"]["peak_traced_bytes"] > 100_000
+    assert second_capture["memory"]["peak_traced_bytes"] is None
+
+def test_middleware_passes_unprofiled_requests_through(tmp_path, monkeypatch):
+    import asyncio
+
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    calls = []
+
+    async def app(scope, receive, send):
+        calls.append(send)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        for chunk in (b"a", b"b"):
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def request(middleware, query_string=b"", headers=()):
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+        scope = {"type": "http", "method": "GET", "path": "/api/query/stream", "headers": list(headers),
+                 "query_string": query_string}
+        await middleware(scope, None, send)
+        return sent
+
+    middleware = profiling.ProfilingMiddleware(app)
+    plain = asyncio.run(request(middleware))
+    # The app got the server's own send, not a wrapper
+    assert calls[-1].__name__ == "send" and plain[0]["headers"] == []
+    assert not os.listdir(tmp_path)
+
+    profiled = asyncio.run(request(middleware, query_string=b"top_k=3&profile=1"))
+    profile_id = dict(profiled[0]["headers"])[b"x-profile-id"].decode()
+    assert len(profiled) == 4
+    assert profiling.load(profile_id, directory=str(tmp_path))["status"] == 200
+    assert not dict(asyncio.run(request(middleware, headers=[(b"x-profile", b"0")]))[0]["headers"])
+
+    sampled = asyncio.run(request(profiling.ProfilingMiddleware(app, sample_rate=1.0)))
+    assert b"x-profile-id" in dict(sampled[0]["headers"])
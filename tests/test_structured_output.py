@@ -0,0 +1,34 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from rag.schema import FIELDS, StructuredParser, parse
+
+CLEAN = '{"summary": "Vacuum lost", "evidence": "ALM_3021 x2", "root_cause": "Seal {leak}", "actions": "1. Check seals", "confidence": "High"}'
+
+def test_streamed_chunks_complete_once_object_closes():
+    parser = StructuredParser()
+    chunks = [CLEAN[i:i + 7] for i in range(0, len(CLEAN), 7)]
+    done = [parser.feed(c) for c in chunks]
+
+    assert done[-1] and not any(done[:-1])
+    result = parser.result()
+    assert parser.outcome == "clean"
+    assert result["root_cause"] == "Seal {leak}"
+
+def test_truncated_fenced_output_is_repaired():
+    result = parse('```json\n{"summary": "Vacuum lost", "actions": ["Check seals", "Inspect pump"], "evidence": "ALM')
+
+    assert set(result) == set(FIELDS)
+    assert result["summary"] == "Vacuum lost"
+    assert result["actions"] == "1. Check seals\n2. Inspect pump"
+    assert result["evidence"] == "ALM"
+    assert result["confidence"] == "Low"
+
+def test_prose_is_kept_rather_than_discarded():
+    parser = StructuredParser()
+    parser.feed("The alarm indicates a vacuum failure.")
+    result = parser.result()
+
+    assert parser.outcome == "failed"
+    assert result["summary"] == "The alarm indicates a vacuum failure."